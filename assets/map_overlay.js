@@ -0,0 +1,246 @@
+// Packed overlays pushed from Python (MapBridge.set_layer, see map_overlay.py).
+//
+// Each message carries base64 typed arrays: float32 lat/lon offsets from a
+// float64 origin, int32 feature ids and, for polylines/polygons, uint32
+// offsets of each feature's first vertex. Features are projected to Web
+// Mercator once on arrival and drawn on one canvas per layer; redraws are
+// coalesced to one per animation frame.
+(function () {
+  const MAX_LAT = 85.0511287798;
+
+  function decode(b64, Type) {
+    const bin = atob(b64);
+    const n = bin.length;
+    const bytes = new Uint8Array(n);
+    for (let i = 0; i < n; i++) bytes[i] = bin.charCodeAt(i);
+    return new Type(bytes.buffer);
+  }
+
+  // lat/lon offsets -> Web Mercator world coordinates in [0, 1)
+  function project(coords, origin) {
+    const n = coords.length >> 1;
+    const xs = new Float64Array(n);
+    const ys = new Float64Array(n);
+    const d = Math.PI / 180;
+    for (let i = 0; i < n; i++) {
+      const lat = Math.max(-MAX_LAT, Math.min(MAX_LAT, origin[0] + coords[2 * i]));
+      const s = Math.sin(lat * d);
+      xs[i] = (origin[1] + coords[2 * i + 1] + 180) / 360;
+      ys[i] = 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+    }
+    return { xs: xs, ys: ys };
+  }
+
+  const PackedLayer = L.Layer.extend({
+    initialize: function (style) {
+      this._style = {};
+      this.setStyle(style);
+      // batches of features as they arrived; id -> [chunk, feature index]
+      this._chunks = [];
+      this._index = new Map();
+      this._frame = null;
+    },
+
+    setStyle: function (style) {
+      this._style = Object.assign(
+        { color: "#3388ff", radius: 3, weight: 2, opacity: 1, fillOpacity: 0.2 },
+        this._style,
+        style || {}
+      );
+      this.redraw();
+    },
+
+    onAdd: function (map) {
+      // leaflet-zoom-hide: hidden during the zoom animation, redrawn on zoomend
+      this._canvas = L.DomUtil.create("canvas", "leaflet-zoom-hide");
+      this.getPane().appendChild(this._canvas);
+      map.on("moveend zoomend viewreset resize", this.redraw, this);
+      this._draw();
+    },
+
+    onRemove: function (map) {
+      map.off("moveend zoomend viewreset resize", this.redraw, this);
+      L.DomUtil.remove(this._canvas);
+      this._canvas = null;
+    },
+
+    addFeatures: function (msg) {
+      const ids = decode(msg.ids, Int32Array);
+      const p = project(decode(msg.coords, Float32Array), msg.origin);
+      const chunk = {
+        kind: msg.kind,
+        ids: ids,
+        xs: p.xs,
+        ys: p.ys,
+        parts: msg.parts ? decode(msg.parts, Uint32Array) : null,
+        alive: new Uint8Array(ids.length).fill(1),
+        live: ids.length,
+      };
+      for (let i = 0; i < ids.length; i++) {
+        this._drop(ids[i]);
+        this._index.set(ids[i], [chunk, i]);
+      }
+      this._chunks.push(chunk);
+      this._prune();
+      this.redraw();
+    },
+
+    removeFeatures: function (ids) {
+      for (let i = 0; i < ids.length; i++) this._drop(ids[i]);
+      this._prune();
+      this.redraw();
+    },
+
+    clearFeatures: function () {
+      this._chunks = [];
+      this._index.clear();
+      this.redraw();
+    },
+
+    featureCount: function () {
+      return this._index.size;
+    },
+
+    _drop: function (id) {
+      const entry = this._index.get(id);
+      if (!entry) return;
+      entry[0].alive[entry[1]] = 0;
+      entry[0].live--;
+      this._index.delete(id);
+    },
+
+    _prune: function () {
+      this._chunks = this._chunks.filter(function (c) {
+        return c.live > 0;
+      });
+    },
+
+    redraw: function () {
+      if (this._map && this._frame === null) {
+        this._frame = L.Util.requestAnimFrame(this._draw, this);
+      }
+      return this;
+    },
+
+    _draw: function () {
+      this._frame = null;
+      const map = this._map;
+      if (!map || !this._canvas) return;
+      const size = map.getSize();
+      const ratio = window.devicePixelRatio || 1;
+      const canvas = this._canvas;
+      if (canvas.width !== size.x * ratio || canvas.height !== size.y * ratio) {
+        canvas.width = size.x * ratio;
+        canvas.height = size.y * ratio;
+        canvas.style.width = size.x + "px";
+        canvas.style.height = size.y + "px";
+      }
+      L.DomUtil.setPosition(canvas, map.containerPointToLayerPoint([0, 0]));
+      const ctx = canvas.getContext("2d");
+      ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+      ctx.clearRect(0, 0, size.x, size.y);
+      // world [0, 1) -> container pixels
+      const view = {
+        scale: map.options.crs.scale(map.getZoom()),
+        left: map.getPixelBounds().min.x,
+        top: map.getPixelBounds().min.y,
+        w: size.x,
+        h: size.y,
+      };
+      const st = this._style;
+      ctx.strokeStyle = st.color;
+      ctx.fillStyle = st.fillColor || st.color;
+      ctx.lineWidth = st.weight;
+      ctx.lineJoin = "round";
+      for (const chunk of this._chunks) {
+        if (chunk.kind === "points") this._drawPoints(ctx, chunk, view, st);
+        else this._drawParts(ctx, chunk, view, st, chunk.kind === "polygons");
+      }
+    },
+
+    _drawPoints: function (ctx, c, v, st) {
+      const r = st.radius;
+      ctx.globalAlpha = st.opacity;
+      ctx.fillStyle = st.color;
+      ctx.beginPath();
+      for (let i = 0; i < c.ids.length; i++) {
+        if (!c.alive[i]) continue;
+        const x = c.xs[i] * v.scale - v.left;
+        const y = c.ys[i] * v.scale - v.top;
+        if (x < -r || y < -r || x > v.w + r || y > v.h + r) continue;
+        if (r <= 1.5) {
+          ctx.rect(x - r, y - r, 2 * r, 2 * r);
+        } else {
+          ctx.moveTo(x + r, y);
+          ctx.arc(x, y, r, 0, 2 * Math.PI);
+        }
+      }
+      ctx.fill();
+    },
+
+    _drawParts: function (ctx, c, v, st, closed) {
+      ctx.beginPath();
+      for (let f = 0; f < c.ids.length; f++) {
+        if (!c.alive[f]) continue;
+        const start = c.parts[f];
+        const end = c.parts[f + 1];
+        for (let i = start; i < end; i++) {
+          const x = c.xs[i] * v.scale - v.left;
+          const y = c.ys[i] * v.scale - v.top;
+          if (i === start) ctx.moveTo(x, y);
+          else ctx.lineTo(x, y);
+        }
+        if (closed) ctx.closePath();
+      }
+      if (closed) {
+        ctx.globalAlpha = st.fillOpacity;
+        ctx.fillStyle = st.fillColor || st.color;
+        ctx.fill();
+      }
+      ctx.globalAlpha = st.opacity;
+      ctx.stroke();
+    },
+  });
+
+  const layers = {};
+
+  function handle(map, text) {
+    const t0 = performance.now();
+    const msg = JSON.parse(text);
+    let layer = layers[msg.layer];
+    if (msg.op === "set" || msg.op === "add") {
+      if (!layer) layer = layers[msg.layer] = new PackedLayer(msg.style).addTo(map);
+      else if (msg.style && Object.keys(msg.style).length) layer.setStyle(msg.style);
+      if (msg.op === "set") layer.clearFeatures();
+      layer.addFeatures(msg);
+    } else if (msg.op === "remove") {
+      if (layer) layer.removeFeatures(decode(msg.ids, Int32Array));
+    } else if (msg.op === "clear") {
+      if (layer) {
+        map.removeLayer(layer);
+        delete layers[msg.layer];
+      }
+    }
+    console.debug(
+      "overlay",
+      msg.op,
+      msg.layer,
+      msg.count || "",
+      (performance.now() - t0).toFixed(1) + " ms"
+    );
+  }
+
+  window.GeoOverlay = {
+    PackedLayer: PackedLayer,
+    layers: layers,
+    decode: decode,
+    handle: handle,
+    // connect to MapBridge.overlayMessage (queued messages follow pyBridge.fromJs_ready)
+    install: function (map, bridge) {
+      if (!bridge.overlayMessage) return;
+      bridge.overlayMessage.connect(function (text) {
+        handle(map, text);
+      });
+    },
+  };
+})();
@@ -0,0 +1,69 @@
+// Linked navigation with the 3D view (view_sync.py).
+//
+// While linked, map moves are reported to Python at most once per animation
+// frame (pyBridge.fromJs_mapMoved(lat, lon, groundWidthMetres)), and camera
+// messages from Python recenter the map and redraw the view cone; only the
+// latest pending camera message is applied per frame, and the map moves it
+// causes are not reported back.
+(function () {
+  // metres per pixel at zoom 0 on the equator (256 px tiles)
+  const EQUATOR_MPP = 156543.03392;
+
+  window.ViewSync = {
+    install: function (map, bridge) {
+      if (!bridge.viewSyncMessage) return;
+      let linked = false;
+      let applying = false;
+      let cone = null;
+      let pendingCamera = null;
+      let cameraFrame = null;
+      let moveFrame = null;
+
+      function sendMove() {
+        moveFrame = null;
+        const c = map.getCenter();
+        const b = map.getBounds();
+        const width = map.distance(L.latLng(c.lat, b.getWest()), L.latLng(c.lat, b.getEast()));
+        bridge.fromJs_mapMoved(c.lat, c.lng, width);
+      }
+
+      function applyCamera() {
+        cameraFrame = null;
+        const msg = pendingCamera;
+        pendingCamera = null;
+        if (!msg || !linked) return;
+        const lat = msg.center[0];
+        const px = Math.max(map.getSize().x, 1);
+        const zoom = Math.log2((EQUATOR_MPP * Math.cos((lat * Math.PI) / 180) * px) / Math.max(msg.width_m, 1e-3));
+        applying = true;
+        try {
+          map.setView(msg.center, zoom, { animate: false });
+        } finally {
+          applying = false;
+        }
+        if (cone) cone.setLatLngs(msg.cone);
+        else cone = L.polygon(msg.cone, { color: "#e0245e", weight: 1, fillOpacity: 0.15 }).addTo(map);
+      }
+
+      map.on("move", function () {
+        if (linked && !applying && moveFrame === null) {
+          moveFrame = L.Util.requestAnimFrame(sendMove);
+        }
+      });
+
+      bridge.viewSyncMessage.connect(function (text) {
+        const msg = JSON.parse(text);
+        if (msg.op === "link") {
+          linked = msg.enabled;
+          if (!linked && cone) {
+            map.removeLayer(cone);
+            cone = null;
+          }
+        } else if (msg.op === "camera") {
+          pendingCamera = msg;
+          if (cameraFrame === null) cameraFrame = L.Util.requestAnimFrame(applyCamera);
+        }
+      });
+    },
+  };
+})();
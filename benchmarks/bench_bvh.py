@@ -0,0 +1,65 @@
+"""Compare BVH picking against the brute-force reference on a synthetic height field.
+
+Usage:
+  python benchmarks/bench_bvh.py --tris 2000000 --rays 200
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bvh import TriangleBVH, intersect_brute_force  # noqa: E402
+
+
+def height_field(ntris):
+    side = max(2, int(np.sqrt(ntris / 2)) + 1)
+    ys, xs = np.mgrid[0:side, 0:side].astype(np.float32)
+    zs = np.sin(xs * 0.05) * np.cos(ys * 0.05) * 5.0
+    verts = np.column_stack([xs.ravel(), ys.ravel(), zs.ravel()]).astype(np.float32)
+    ids = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)).ravel().astype(np.uint32)
+    faces = np.concatenate([np.column_stack([ids, ids + 1, ids + side + 1]),
+                            np.column_stack([ids, ids + side + 1, ids + side])])
+    return verts, faces
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tris', type=int, default=2_000_000)
+    p.add_argument('--rays', type=int, default=200)
+    p.add_argument('--brute-rays', type=int, default=20, help='rays also checked by brute force')
+    args = p.parse_args()
+
+    verts, faces = height_field(args.tris)
+    print(f'{len(faces)} triangles')
+    t0 = time.perf_counter()
+    bvh = TriangleBVH.build(verts, faces)
+    print(f'build          : {time.perf_counter() - t0:8.3f} s ({len(bvh.levels)} levels)')
+
+    rng = np.random.default_rng(0)
+    lo, hi = verts.min(axis=0), verts.max(axis=0)
+    origins = np.column_stack([rng.uniform(lo[0], hi[0], args.rays), rng.uniform(lo[1], hi[1], args.rays),
+                               np.full(args.rays, hi[2] + 50.0)])
+    dirs = rng.normal(size=(args.rays, 3))
+    dirs[:, 2] = -np.abs(dirs[:, 2]) - 1.0
+
+    t0 = time.perf_counter()
+    hits = [bvh.intersect(o, d) for o, d in zip(origins, dirs)]
+    t_bvh = (time.perf_counter() - t0) / args.rays
+    print(f'BVH pick       : {t_bvh * 1e3:8.3f} ms/ray ({sum(h is not None for h in hits)}/{args.rays} hits)')
+
+    n = min(args.brute_rays, args.rays)
+    t0 = time.perf_counter()
+    refs = [intersect_brute_force(verts, faces, o, d) for o, d in zip(origins[:n], dirs[:n])]
+    t_bf = (time.perf_counter() - t0) / max(n, 1)
+    print(f'brute force    : {t_bf * 1e3:8.3f} ms/ray')
+    print(f'speedup        : {t_bf / t_bvh:.0f}x')
+    agree = all((h is None and r is None) or (h is not None and r is not None and abs(h[1] - r[1]) < 1e-6)
+                for h, r in zip(hits[:n], refs))
+    print('results agree' if agree else 'RESULT MISMATCH')
+
+
+if __name__ == '__main__':
+    main()
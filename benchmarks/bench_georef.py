@@ -0,0 +1,42 @@
+"""Throughput of the georeference transforms, with the round trip error local -> WGS84 -> local.
+
+The accuracy against reference points is tested in tests/test_georef.py.
+
+Usage:
+  python benchmarks/bench_georef.py --points 5000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from georef import Georeference  # noqa: E402
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--points', type=int, default=5_000_000)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.points
+    g = Georeference((31.11, 121.07, 12.0))
+    points = rng.uniform(-5000.0, 5000.0, (n, 3))
+    points[:, 2] *= 0.02
+
+    t0 = time.perf_counter()
+    lat, lon, alt = g.local_to_wgs84(points)
+    t_fwd = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    again = g.wgs84_to_local(lat, lon, alt)
+    t_inv = time.perf_counter() - t0
+    print(f'local -> WGS84          : {n / t_fwd / 1e6:8.1f} M points/s')
+    print(f'WGS84 -> local          : {n / t_inv / 1e6:8.1f} M points/s')
+    print(f'round trip error        : {np.abs(again - points).max():.2e} m')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Peak RSS of loading a mesh and preparing it for display, old vs new array pipeline.
+
+Each pipeline runs in a fresh subprocess so ru_maxrss is not shared:
+  legacy  - the original per-line parser (float64/int64) followed by the
+            former set_mesh copies: np.array, normalized float64 copy, and
+            the float32/uint32 conversion pyqtgraph makes for GL
+  current - ObjLoader (float32/uint32) followed by what set_mesh now does:
+            bounds, normalization as a transform and spatial chunking
+
+Usage:
+  python benchmarks/bench_memory.py --verts 10000000
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+
+def run_legacy(path):
+    import numpy as np
+    from bench_obj_loader import legacy_load
+    verts, faces = legacy_load(path)
+    v = np.array(verts)
+    f = np.array(faces)
+    minv = v.min(axis=0)
+    maxv = v.max(axis=0)
+    center = (minv + maxv) / 2.0
+    scale = (maxv - minv).max()
+    v2 = (v - center) / scale * 10.0
+    gl_verts = np.ascontiguousarray(v2, dtype=np.float32)
+    gl_faces = f.astype(np.uint32)
+    return gl_verts, gl_faces
+
+
+def run_current(path):
+    from obj_loader import ObjLoader
+    from spatial import normalization, split_into_chunks
+    verts, faces = ObjLoader().parse(path)
+    normalization(verts.min(axis=0), verts.max(axis=0))
+    return split_into_chunks(verts, faces)
+
+
+def child(mode, path):
+    (run_legacy if mode == 'legacy' else run_current)(path)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(peak_kb)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--verts', type=int, default=10_000_000)
+    p.add_argument('--file', type=str, default=None)
+    p.add_argument('--skip-legacy', action='store_true')
+    p.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    from bench_obj_loader import write_grid_obj
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.file) if args.file else Path(tmp) / 'bench.obj'
+        if not args.file:
+            write_grid_obj(path, args.verts)
+        print(f'{path.name}: {path.stat().st_size / 1e6:.1f} MB')
+        modes = ['current'] if args.skip_legacy else ['legacy', 'current']
+        for mode in modes:
+            out = subprocess.run([sys.executable, __file__, '--child', mode, str(path)],
+                                 capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f'{mode:8s}: failed ({out.stderr.strip().splitlines()[-1:]})')
+                continue
+            print(f'{mode:8s}: peak RSS {int(out.stdout.split()[-1]) / 1024:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compare the block-based ObjLoader against the previous line-by-line parser.
+
+Usage:
+  python benchmarks/bench_obj_loader.py --verts 1000000
+  python benchmarks/bench_obj_loader.py --file path/to/model.obj
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from obj_loader import ObjLoader  # noqa: E402
+
+
+def legacy_load(path):
+    """The original per-line parser, kept here as the baseline."""
+    verts = []
+    faces = []
+    with Path(path).open('r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if line.startswith('v '):
+                parts = line.strip().split()
+                if len(parts) >= 4:
+                    verts.append([float(parts[1]), float(parts[2]), float(parts[3])])
+            elif line.startswith('f '):
+                parts = line.strip().split()[1:]
+                face = [int(p.split('/')[0]) - 1 for p in parts if p]
+                if len(face) >= 3:
+                    for i in range(1, len(face)-1):
+                        faces.append([face[0], face[i], face[i+1]])
+    return np.array(verts), np.array(faces)
+
+
+def write_grid_obj(path, nverts):
+    """Write a height-field grid with ~nverts vertices, mixing quads and `v/vt/vn` triangles."""
+    side = max(2, int(np.sqrt(nverts)))
+    ys, xs = np.mgrid[0:side, 0:side]
+    zs = np.sin(xs * 0.05) * np.cos(ys * 0.05)
+    with Path(path).open('w') as f:
+        np.savetxt(f, np.column_stack([xs.ravel(), ys.ravel(), zs.ravel()]), fmt='v %.6f %.6f %.6f')
+        ids = (ys[:-1, :-1] * side + xs[:-1, :-1]).ravel() + 1
+        quads = np.column_stack([ids, ids + 1, ids + side + 1, ids + side])
+        half = len(quads) // 2
+        np.savetxt(f, quads[:half], fmt='f %d %d %d %d')
+        tris = quads[half:, [0, 1, 2]]
+        np.savetxt(f, np.repeat(tris, 2, axis=1), fmt='f %d/%d/1 %d/%d/1 %d/%d/1')
+
+
+def timed(fn, path, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(path)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--verts', type=int, default=1_000_000, help='vertices in the synthetic mesh')
+    p.add_argument('--file', type=str, default=None, help='benchmark an existing OBJ instead')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--skip-legacy', action='store_true', help='only time the new loader')
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.file) if args.file else Path(tmp) / 'bench.obj'
+        if not args.file:
+            write_grid_obj(path, args.verts)
+        mb = path.stat().st_size / 1e6
+        print(f'{path.name}: {mb:.1f} MB')
+
+        t_new, (v, f) = timed(ObjLoader().load, path, args.repeat)
+        print(f'ObjLoader.load : {t_new:7.3f} s  {mb / t_new:8.1f} MB/s  ({len(v)} verts, {len(f)} tris)')
+        if args.skip_legacy:
+            return
+        t_old, (v0, f0) = timed(legacy_load, path, args.repeat)
+        print(f'legacy loader  : {t_old:7.3f} s  {mb / t_old:8.1f} MB/s')
+        print(f'speedup        : {t_old / t_new:.1f}x')
+        # ObjLoader returns float32 / uint32; the legacy loader float64 / int64
+        same = (v.dtype == np.float32 and f.dtype == np.uint32
+                and np.array_equal(v, np.asarray(v0, np.float32)) and np.array_equal(f, np.asarray(f0, np.uint32)))
+        print('outputs identical' if same else 'OUTPUT MISMATCH')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Effect of mesh_optimize on a photogrammetry-like mesh: what is removed, memory, load and draw cost.
+
+The synthetic mesh is a height field cut into texture charts. Every chart
+has its own copy of its border vertices (seam duplicates), the charts
+are written in shuffled order (poor locality), and a share of unused
+vertices and zero-area faces is added.
+
+Draw cost is estimated without a GL context:
+  acmr        average post-transform vertex cache misses per triangle (FIFO of 32
+              entries; 0.5 is ideal for a regular grid, 3.0 is no reuse)
+  display     split_into_chunks plus the per-corner expansion GLMeshItem does for
+              flat shading (the CPU work between loading and drawing)
+
+Usage:
+  python benchmarks/bench_optimize.py --verts 2000000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mesh_optimize import format_report, optimize_mesh  # noqa: E402
+from obj_loader import ObjLoader  # noqa: E402
+from spatial import split_into_chunks  # noqa: E402
+
+
+def seamed_mesh(nverts, chart=64, unused=0.02, degenerate=0.01, seed=0):
+    """(verts, faces) of a height field with one vertex copy per chart, shuffled charts and some junk."""
+    rng = np.random.default_rng(seed)
+    side = max(chart + 1, int(np.sqrt(nverts)))
+    cells = side - 1
+    verts = []
+    faces = []
+    n = 0
+    charts = [(cx, cy) for cx in range(0, cells, chart) for cy in range(0, cells, chart)]
+    for i in rng.permutation(len(charts)):
+        cx, cy = charts[i]
+        w = min(chart, cells - cx)
+        h = min(chart, cells - cy)
+        ys, xs = np.mgrid[cy:cy + h + 1, cx:cx + w + 1].astype(np.float32)
+        zs = np.sin(xs * 0.05) * np.cos(ys * 0.05) * 5.0
+        verts.append(np.column_stack([xs.ravel(), ys.ravel(), zs.ravel()]))
+        ids = (np.arange(h)[:, None] * (w + 1) + np.arange(w)).ravel() + n
+        faces.append(np.column_stack([ids, ids + 1, ids + w + 2]))
+        faces.append(np.column_stack([ids, ids + w + 2, ids + w + 1]))
+        n += (w + 1) * (h + 1)
+    verts = np.concatenate(verts).astype(np.float32)
+    faces = np.concatenate(faces).astype(np.uint32)
+    junk = rng.uniform(verts.min(axis=0), verts.max(axis=0), (int(len(verts) * unused), 3)).astype(np.float32)
+    k = int(len(faces) * degenerate)
+    pick = rng.integers(0, len(faces), k)
+    bad = faces[pick].copy()
+    bad[: k // 2, 2] = bad[: k // 2, 0]  # repeated vertex
+    bad[k // 2:, 2] = bad[k // 2:, 1]
+    return np.concatenate([verts, junk]), np.concatenate([faces, bad])
+
+
+def write_obj(path, verts, faces):
+    with Path(path).open('w') as f:
+        np.savetxt(f, verts, fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, faces.astype(np.int64) + 1, fmt='f %d %d %d')
+
+
+def acmr(faces, cache_size=32, sample=300_000):
+    """Vertex cache misses per triangle over the first sample faces (FIFO cache)."""
+    cache = deque(maxlen=cache_size)
+    members = set()
+    misses = 0
+    f = faces[:sample]
+    for v in f.ravel().tolist():
+        if v in members:
+            continue
+        misses += 1
+        if len(cache) == cache_size:
+            members.discard(cache[0])
+        cache.append(v)
+        members.add(v)
+    return misses / max(len(f), 1)
+
+
+def display_prep(verts, faces):
+    t0 = time.perf_counter()
+    for v, f, _, _ in split_into_chunks(verts, faces):
+        v[f]
+    return time.perf_counter() - t0
+
+
+def surface_area(verts, faces):
+    v = verts.astype(np.float64)
+    return float(np.linalg.norm(np.cross(v[faces[:, 1]] - v[faces[:, 0]], v[faces[:, 2]] - v[faces[:, 0]]),
+                                axis=1).sum() / 2)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--verts', type=int, default=2_000_000)
+    p.add_argument('--tolerance', type=float, default=0.0, help='weld tolerance (default: equal positions)')
+    args = p.parse_args()
+
+    verts, faces = seamed_mesh(args.verts)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'seamed.obj'
+        write_obj(path, verts, faces)
+        print(f'{path.stat().st_size / 1e6:.0f} MB OBJ, {len(verts):,} vertices, {len(faces):,} faces')
+        t0 = time.perf_counter()
+        v0, f0 = ObjLoader().load(path)
+        t_plain = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        v1, f1 = ObjLoader(optimize=True, weld_tolerance=args.tolerance).load(path)
+        t_opt = time.perf_counter() - t0
+    _, _, report = optimize_mesh(v0, f0, args.tolerance)
+    print(format_report(report))
+    for step, seconds in report['seconds'].items():
+        print(f'  {step:14s} {seconds:8.3f} s')
+    print(f'{"":16s}{"plain":>12s}{"optimized":>12s}')
+    print(f'{"load s":16s}{t_plain:12.3f}{t_opt:12.3f}')
+    print(f'{"memory MB":16s}{(v0.nbytes + f0.nbytes) / 2 ** 20:12.1f}{(v1.nbytes + f1.nbytes) / 2 ** 20:12.1f}')
+    print(f'{"display prep s":16s}{min(display_prep(v0, f0) for _ in range(3)):12.3f}'
+          f'{min(display_prep(v1, f1) for _ in range(3)):12.3f}')
+    print(f'{"acmr":16s}{acmr(f0):12.3f}{acmr(f1):12.3f}')
+    a0, a1 = surface_area(v0, f0), surface_area(v1, f1)
+    print(f'surface area {"unchanged" if abs(a0 - a1) <= 1e-6 * a0 else "CHANGED"} ({a0:.1f} vs {a1:.1f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Cost of packing map overlays into one message (Python side of MapBridge.set_layer).
+
+Also checks the float32-offset encoding precision by decoding the message
+the way assets/map_overlay.js does.
+
+Usage:
+  python benchmarks/bench_overlay.py --points 100000
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from map_overlay import pack_features  # noqa: E402
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--points', type=int, default=100_000)
+    p.add_argument('--lines', type=int, default=10_000, help='polylines of 20 vertices')
+    args = p.parse_args()
+
+    rng = np.random.default_rng(0)
+    points = np.column_stack([31.11 + rng.normal(0.0, 0.5, args.points),
+                              121.07 + rng.normal(0.0, 0.5, args.points)])
+    t0 = time.perf_counter()
+    text = json.dumps(pack_features('points', points))
+    t_points = time.perf_counter() - t0
+
+    msg = json.loads(text)
+    offsets = np.frombuffer(base64.b64decode(msg['coords']), '<f4').reshape(-1, 2)
+    err = np.abs(offsets.astype(np.float64) + msg['origin'] - points).max()
+
+    lines = list(points[:args.lines * 20].reshape(-1, 20, 2))
+    t0 = time.perf_counter()
+    line_text = json.dumps(pack_features('polylines', lines))
+    t_lines = time.perf_counter() - t0
+
+    print(f'{args.points} points      : {1e3 * t_points:8.1f} ms, {len(text) / 1e6:.2f} MB')
+    print(f'{len(lines)} polylines   : {1e3 * t_lines:8.1f} ms, {len(line_text) / 1e6:.2f} MB')
+    print(f'max coordinate error   : {err:.2e} deg ({err * 111e3 * 1e3:.2f} mm)')
+
+
+if __name__ == '__main__':
+    main()
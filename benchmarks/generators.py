@@ -0,0 +1,127 @@
+"""Synthetic inputs for the benchmarks: OBJ meshes, PLY point clouds and tile trees.
+
+Usage (from other benchmark scripts, with benchmarks/ on sys.path):
+  from generators import write_obj, write_ply, write_tile_tree
+  write_obj('mesh.obj', 1_000_000, mix={'tri': 0.5, 'quad': 0.3, 'ngon': 0.2})
+  write_ply('cloud.ply', 20_000_000)
+  write_tile_tree(DirectoryStore('tiles'), 14, 5000)
+"""
+from pathlib import Path
+
+import numpy as np
+
+# face record styles: plain indices, v/vt/vn and v//vn
+FACE_STYLES = ('v', 'v/vt/vn', 'v//vn')
+
+
+def _face_fmt(n, style):
+    one = {'v': '%d', 'v/vt/vn': '%d/%d/%d', 'v//vn': '%d//%d'}[style]
+    return 'f ' + ' '.join([one] * n)
+
+
+def _style_columns(faces, style):
+    # repeat each vertex index for its vt/vn slots
+    reps = {'v': 1, 'v/vt/vn': 3, 'v//vn': 2}[style]
+    return np.repeat(faces, reps, axis=1) if reps > 1 else faces
+
+
+def write_obj(path, nverts, mix=None, styles=FACE_STYLES, seed=0):
+    """Write a height-field grid with ~nverts vertices; returns (vertex count, triangle count).
+
+    mix gives the share of grid cell pairs written as triangles ('tri', two
+    per cell), quads ('quad', one per cell) and hexagons ('ngon', one per
+    pair of cells). Face records rotate through styles.
+    """
+    mix = mix or {'tri': 0.4, 'quad': 0.4, 'ngon': 0.2}
+    kinds = ('tri', 'quad', 'ngon')
+    p = np.array([float(mix.get(k, 0.0)) for k in kinds])
+    p /= p.sum()
+    rng = np.random.default_rng(seed)
+    side = max(3, int(np.sqrt(nverts)))
+    ys, xs = np.mgrid[0:side, 0:side]
+    zs = np.sin(xs * 0.05) * np.cos(ys * 0.05) + rng.normal(0.0, 0.01, xs.shape)
+    # cell pairs: cells (x, y) and (x + 1, y) for even x
+    px, py = np.meshgrid(np.arange(0, side - 2, 2), np.arange(side - 1))
+    a = (py * side + px).ravel() + 1
+    kind = rng.choice(3, size=len(a), p=p)
+    groups = []
+    t = a[kind == 0]
+    tris = np.concatenate([np.column_stack([c, c + 1, c + side + 1]) for c in (t, t + 1)]
+                          + [np.column_stack([c, c + side + 1, c + side]) for c in (t, t + 1)])
+    groups.append(tris)
+    q = a[kind == 1]
+    groups.append(np.concatenate([np.column_stack([c, c + 1, c + side + 1, c + side]) for c in (q, q + 1)]))
+    h = a[kind == 2]
+    groups.append(np.column_stack([h, h + 1, h + 2, h + side + 2, h + side + 1, h + side]))
+    ntris = 0
+    with Path(path).open('w') as f:
+        np.savetxt(f, np.column_stack([xs.ravel(), ys.ravel(), zs.ravel()]), fmt='v %.6f %.6f %.6f')
+        for faces in groups:
+            if not len(faces):
+                continue
+            n = faces.shape[1]
+            ntris += len(faces) * (n - 2)
+            for i, style in enumerate(styles):
+                part = faces[i::len(styles)]
+                if len(part):
+                    np.savetxt(f, _style_columns(part, style), fmt=_face_fmt(n, style))
+    return side * side, ntris
+
+
+def write_ply(path, npoints, big_endian=False, block=1 << 22, seed=0):
+    """Write a binary PLY cloud of npoints colored points on a wavy surface (float xyz, uchar rgb)."""
+    order = '>' if big_endian else '<'
+    dtype = np.dtype([('x', order + 'f4'), ('y', order + 'f4'), ('z', order + 'f4'),
+                      ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    header = (f'ply\nformat binary_{"big" if big_endian else "little"}_endian 1.0\n'
+              f'comment synthetic\nelement vertex {npoints}\n'
+              'property float x\nproperty float y\nproperty float z\n'
+              'property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n')
+    rng = np.random.default_rng(seed)
+    with Path(path).open('wb') as f:
+        f.write(header.encode('ascii'))
+        for start in range(0, npoints, block):
+            n = min(block, npoints - start)
+            rec = np.empty(n, dtype=dtype)
+            # denser in the middle, like a scan around its station
+            x = rng.normal(0.0, 150.0, n)
+            y = rng.normal(0.0, 150.0, n)
+            rec['x'] = x
+            rec['y'] = y
+            rec['z'] = 5.0 * np.sin(x / 20.0) * np.cos(y / 25.0) + rng.normal(0.0, 0.05, n)
+            shade = np.clip(128 + 100 * np.sin(x / 20.0), 0, 255).astype(np.uint8)
+            rec['red'] = shade
+            rec['green'] = 255 - shade
+            rec['blue'] = 128
+            f.write(rec.tobytes())
+    return Path(path).stat().st_size
+
+
+def synthetic_tile(z, x, y, size=2000, distinct=True):
+    """Deterministic tile-like bytes (PNG signature + payload); identical for all tiles when not distinct."""
+    rng = np.random.default_rng((z << 40) | (x << 20) | y if distinct else 0)
+    return b'\x89PNG\r\n\x1a\n' + rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def tile_block(zoom, count, x0=None, y0=None):
+    """(z, x, y) of about count tiles in a square block at zoom."""
+    side = max(1, int(np.ceil(np.sqrt(count))))
+    n = 1 << zoom
+    x0 = n // 2 if x0 is None else x0
+    y0 = n // 2 if y0 is None else y0
+    tiles = [(zoom, x0 + i, y0 + j) for i in range(side) for j in range(side)]
+    return [t for t in tiles[:count] if t[1] < n and t[2] < n]
+
+
+def write_tile_tree(store, zoom, count, size=2000, blank_fraction=0.2, seed=0):
+    """Fill a tile store with about count synthetic tiles at zoom; returns the tiles written.
+
+    A blank_fraction share of the tiles are identical (like blank or ocean tiles).
+    """
+    rng = np.random.default_rng(seed)
+    tiles = tile_block(zoom, count)
+    blank = rng.random(len(tiles)) < blank_fraction
+    for (z, x, y), is_blank in zip(tiles, blank):
+        store.put(z, x, y, synthetic_tile(z, x, y, size, distinct=not is_blank))
+    store.flush()
+    return tiles
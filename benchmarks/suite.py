@@ -0,0 +1,260 @@
+"""Benchmark suite with JSON results and regression checks.
+
+Runs the hot paths on synthetic data (see generators.py) and writes one
+JSON file per run; `compare` flags metrics that got worse than a baseline
+by more than a threshold and exits with status 1 if any did.
+
+Benchmarks:
+  obj_load       ObjLoader.load of a generated OBJ (no cache), and a warm MeshCache hit
+  normalize      the array work of ModelViewer.set_mesh without a GL context
+                 (bounds, normalization, spatial chunking)
+  point_cloud    PointCloud open (memory map), overview sample and zoomed-in region sample of a binary PLY
+  deg2num        download_tiles.deg2num calls and vectorized tile_planner.lonlat_to_tile
+  tile_store     TileIndex scan and random reads of a generated tile tree (directory, MBTiles)
+  tile_download  TileDownloader against a local HTTP server
+
+Usage:
+  python benchmarks/suite.py run -o results/base.json
+  python benchmarks/suite.py run -o results/new.json --quick --only obj_load normalize
+  python benchmarks/suite.py compare results/base.json results/new.json --threshold 0.15
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from generators import synthetic_tile, tile_block, write_obj, write_ply, write_tile_tree  # noqa: E402
+
+# default and --quick problem sizes
+SIZES = {
+    'verts': (2_000_000, 200_000),
+    'points': (20_000_000, 2_000_000),
+    'deg2num_calls': (200_000, 20_000),
+    'tiles': (5000, 500),
+    'downloads': (1000, 200),
+}
+
+
+def best_of(fn, repeat):
+    """Smallest wall time of repeat calls to fn, and its last result."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def metric(value, unit, better):
+    return {'value': float(value), 'unit': unit, 'better': better}
+
+
+def bench_obj_load(tmp, quick, repeat):
+    from obj_loader import MeshCache, ObjLoader
+    path = Path(tmp) / 'bench.obj'
+    write_obj(path, SIZES['verts'][quick])
+    mb = path.stat().st_size / 1e6
+    t, (v, f) = best_of(lambda: ObjLoader().load(path), repeat)
+    cached = ObjLoader(cache=MeshCache(Path(tmp) / 'cache'))
+    cached.load(path)
+    t_hit, _ = best_of(lambda: cached.load(path), repeat)
+    return {'load_s': metric(t, 's', 'lower'), 'load_mb_per_s': metric(mb / t, 'MB/s', 'higher'),
+            'cache_hit_s': metric(t_hit, 's', 'lower'), 'triangles': metric(len(f), 'count', 'info')}
+
+
+def bench_normalize(tmp, quick, repeat):
+    from obj_loader import ObjLoader
+    from spatial import normalization, split_into_chunks
+    path = Path(tmp) / 'normalize.obj'
+    write_obj(path, SIZES['verts'][quick])
+    v, f = ObjLoader().load(path)
+
+    def prepare():
+        normalization(v.min(axis=0), v.max(axis=0))
+        return split_into_chunks(v, f)
+
+    t, _ = best_of(prepare, repeat)
+    return {'prepare_s': metric(t, 's', 'lower'), 'mtris_per_s': metric(len(f) / t / 1e6, 'M tris/s', 'higher')}
+
+
+def bench_point_cloud(tmp, quick, repeat):
+    from ply_loader import PointCloud
+    path = Path(tmp) / 'cloud.ply'
+    write_ply(path, SIZES['points'][quick])
+    budget = SIZES['points'][quick] // 20
+    t_open, cloud = best_of(lambda: PointCloud(path), repeat)
+    t_overview, _ = best_of(lambda: cloud.sample(budget), repeat)
+    # a box around the center, as after zooming in
+    t_region, _ = best_of(lambda: cloud.sample(budget, lo=(-50.0, -50.0, -10.0), hi=(50.0, 50.0, 10.0)), repeat)
+    return {'open_s': metric(t_open, 's', 'lower'), 'overview_s': metric(t_overview, 's', 'lower'),
+            'region_s': metric(t_region, 's', 'lower'),
+            'scan_mpoints_per_s': metric(len(cloud) / t_region / 1e6, 'M points/s', 'higher')}
+
+
+def bench_deg2num(tmp, quick, repeat):
+    from download_tiles import deg2num
+    from tile_planner import lonlat_to_tile
+    n = SIZES['deg2num_calls'][quick]
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-80.0, 80.0, n)
+    lon = rng.uniform(-180.0, 180.0, n)
+    pairs = list(zip(lat.tolist(), lon.tolist()))
+    t, _ = best_of(lambda: [deg2num(a, b, 16) for a, b in pairs], repeat)
+    t_vec, _ = best_of(lambda: lonlat_to_tile(lon, lat, 16), repeat)
+    return {'deg2num_calls_per_s': metric(n / t, 'calls/s', 'higher'),
+            'lonlat_to_tile_per_s': metric(n / t_vec, 'points/s', 'higher')}
+
+
+def bench_tile_store(tmp, quick, repeat):
+    from tile_planner import TileIndex
+    from tile_store import DirectoryStore, MBTiles
+    n = SIZES['tiles'][quick]
+    out = {}
+    for name, store in (('dir', DirectoryStore(Path(tmp) / 'tiles')),
+                        ('mbtiles', MBTiles(Path(tmp) / 'tiles.mbtiles', 'w'))):
+        tiles = write_tile_tree(store, 14, n)
+        t_scan, _ = best_of(lambda: TileIndex.scan(store), repeat)
+        sample = random.Random(0).sample(tiles, min(len(tiles), 1000))
+        t_get, _ = best_of(lambda: [store.get(*t) for t in sample], repeat)
+        out[f'{name}_scan_s'] = metric(t_scan, 's', 'lower')
+        out[f'{name}_reads_per_s'] = metric(len(sample) / t_get, 'tiles/s', 'higher')
+        store.close()
+    return out
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        try:
+            z, x, y = (int(p.split('.')[0]) for p in self.path.strip('/').split('/'))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        body = synthetic_tile(z, x, y, 2000)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def bench_tile_download(tmp, quick, repeat):
+    from tile_downloader import TileDownloader
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    template = f'http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png'
+    tiles = tile_block(14, SIZES['downloads'][quick])
+    runs = itertools.count()
+    try:
+        def download():
+            # a fresh output per repetition so every tile is fetched
+            dl = TileDownloader(template, Path(tmp) / f'download{next(runs)}', rate=0, workers=8)
+            try:
+                return dl.run(tiles, check_existing=False)
+            finally:
+                dl.close()
+        t, stats = best_of(download, repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+    if stats['ok'] != len(tiles):
+        raise RuntimeError(f'download incomplete: {stats}')
+    return {'tiles_per_s': metric(len(tiles) / t, 'tiles/s', 'higher')}
+
+
+BENCHMARKS = {
+    'obj_load': bench_obj_load,
+    'normalize': bench_normalize,
+    'point_cloud': bench_point_cloud,
+    'deg2num': bench_deg2num,
+    'tile_store': bench_tile_store,
+    'tile_download': bench_tile_download,
+}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(),
+            'numpy': np.__version__, 'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run(args):
+    names = args.only or list(BENCHMARKS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            print(f'{name} ...', flush=True)
+            results[name] = BENCHMARKS[name](tmp, int(args.quick), args.repeat)
+            for key, m in results[name].items():
+                print(f'  {key:24s} {m["value"]:14.4g} {m["unit"]}')
+    doc = {'environment': environment(), 'quick': args.quick, 'results': results}
+    if args.output:
+        out = Path(args.output)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(doc, indent=2), encoding='utf-8')
+        print(f'Results written to {out}')
+    return 0
+
+
+def compare(args):
+    base = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    new = json.loads(Path(args.current).read_text(encoding='utf-8'))
+    if base.get('quick') != new.get('quick'):
+        print('warning: comparing a --quick run with a full run')
+    regressions = 0
+    for name, metrics in new['results'].items():
+        for key, m in metrics.items():
+            old = base['results'].get(name, {}).get(key)
+            if old is None or m['better'] not in ('lower', 'higher') or old['value'] <= 0 or m['value'] <= 0:
+                continue
+            # change of the value itself (a 50% throughput drop prints -50.0%); the
+            # printed change is what the threshold is tested against
+            delta = m['value'] / old['value'] - 1.0
+            worse = delta if m['better'] == 'lower' else -delta
+            flag = 'REGRESSION' if worse > args.threshold else ''
+            regressions += bool(flag)
+            print(f'{name + "." + key:36s} {old["value"]:12.4g} -> {m["value"]:12.4g} {m["unit"]:9s} '
+                  f'{100 * delta:+7.1f}% {flag}')
+    print(f'{regressions} regression(s) beyond {100 * args.threshold:.0f}%')
+    return 1 if regressions else 0
+
+
+def main():
+    p = argparse.ArgumentParser(description='GeoReconViewer benchmark suite.')
+    sub = p.add_subparsers(dest='command', required=True)
+    r = sub.add_parser('run', help='run benchmarks and write JSON results')
+    r.add_argument('-o', '--output', type=str, default=None, help='results JSON file')
+    r.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='benchmarks to run (default: all)')
+    r.add_argument('--quick', action='store_true', help='smaller inputs for a fast smoke run')
+    r.add_argument('--repeat', type=int, default=3, help='repetitions; the best time counts')
+    c = sub.add_parser('compare', help='compare two result files')
+    c.add_argument('baseline')
+    c.add_argument('current')
+    c.add_argument('--threshold', type=float, default=0.10,
+                   help='flag metrics worse than the baseline by more than this fraction (default 0.10)')
+    args = p.parse_args()
+    sys.exit(run(args) if args.command == 'run' else compare(args))
+
+
+if __name__ == '__main__':
+    main()
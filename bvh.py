@@ -0,0 +1,196 @@
+import logging
+
+import numpy as np
+
+from spatial import morton_codes
+
+logger = logging.getLogger(__name__)
+
+
+def ray_triangles(origin, direction, v0, v1, v2):
+    """Möller–Trumbore intersection of one ray with many triangles.
+
+    Returns the hit distance along direction for every triangle, inf where
+    the ray misses.
+    """
+    origin = np.asarray(origin, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+    v0 = np.asarray(v0, dtype=np.float64)
+    e1 = np.asarray(v1, dtype=np.float64) - v0
+    e2 = np.asarray(v2, dtype=np.float64) - v0
+    p = np.cross(direction, e2)
+    det = np.einsum('ij,ij->i', e1, p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = 1.0 / det
+        s = origin - v0
+        u = np.einsum('ij,ij->i', s, p) * inv
+        q = np.cross(s, e1)
+        v = (q @ direction) * inv
+        t = np.einsum('ij,ij->i', e2, q) * inv
+    hit = (det != 0) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+def intersect_brute_force(verts, faces, origin, direction, batch=1 << 20):
+    """Reference picking: test the ray against every triangle.
+
+    Returns (triangle index, t) of the nearest hit or None.
+    """
+    verts = np.asarray(verts)
+    faces = np.asarray(faces)
+    best_t = np.inf
+    best = -1
+    for start in range(0, len(faces), batch):
+        f = faces[start:start + batch]
+        t = ray_triangles(origin, direction, verts[f[:, 0]], verts[f[:, 1]], verts[f[:, 2]])
+        i = int(np.argmin(t))
+        if t[i] < best_t:
+            best_t = float(t[i])
+            best = start + i
+    return None if best < 0 else (best, best_t)
+
+
+def _slab(origin, inv_dir, mins, maxs):
+    """Ray/AABB slab test against many boxes; the ray starts at origin (t >= 0).
+
+    Returns the hit mask and the entry distance of every box.
+    """
+    with np.errstate(invalid='ignore'):
+        t1 = (mins - origin) * inv_dir
+        t2 = (maxs - origin) * inv_dir
+    # fmin/fmax drop the NaNs of rays running exactly along a slab plane
+    tmin = np.maximum(np.fmin(t1, t2).max(axis=1), 0.0)
+    tmax = np.fmax(t1, t2).min(axis=1)
+    # padding boxes (min=+inf, max=-inf) are empty and must never count as hit
+    return (tmax >= tmin) & (mins[:, 0] <= maxs[:, 0]), tmin
+
+
+class TriangleBVH:
+    """Bounding volume hierarchy over the triangles of a mesh, for ray picking.
+
+    Triangles are sorted along the Morton curve of their centroids and grouped
+    into leaves of leaf_size consecutive triangles; the tree is the implicit
+    complete binary tree over those leaves, so it is built level by level
+    with array reductions and traversed one level at a time for all
+    candidate nodes at once.
+
+    Usage:
+        bvh = TriangleBVH.build(verts, faces)
+        hit = bvh.intersect(origin, direction)  # (triangle, t, point) or None
+    """
+
+    # leaves tested per step of the front-to-back leaf walk
+    leaf_batch = 32
+
+    def __init__(self, verts, faces, order, leaf_min, leaf_max, leaf_size):
+        self.verts = verts
+        self.faces = faces
+        self.order = order
+        self.leaf_size = int(leaf_size)
+        self.leaf_min = leaf_min
+        self.leaf_max = leaf_max
+        # levels[0] is the root, levels[-1] the (padded) leaves
+        mins, maxs = leaf_min, leaf_max
+        levels = [(mins, maxs)]
+        while len(mins) > 1:
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            levels.append((mins, maxs))
+        levels.reverse()
+        self.levels = levels
+
+    @classmethod
+    def build(cls, verts, faces, leaf_size=8, batch=1 << 20):
+        verts = np.asarray(verts)
+        faces = np.asarray(faces)
+        m = len(faces)
+        centroids = verts[faces[:, 0]] + verts[faces[:, 1]]
+        centroids += verts[faces[:, 2]]
+        order = np.argsort(morton_codes(centroids, bits=10), kind='stable').astype(np.uint32)
+        del centroids
+
+        nleaves = max(1, -(-m // leaf_size))
+        padded = 1 << int(np.ceil(np.log2(nleaves)))
+        leaf_min = np.full((padded, 3), np.inf, dtype=np.float32)
+        leaf_max = np.full((padded, 3), -np.inf, dtype=np.float32)
+        # batches are multiples of leaf_size so every leaf is reduced in one go
+        batch = max(leaf_size, batch - batch % leaf_size)
+        for start in range(0, m, batch):
+            f = faces[order[start:start + batch]]
+            a, b, c = verts[f[:, 0]], verts[f[:, 1]], verts[f[:, 2]]
+            tmin = np.minimum(np.minimum(a, b), c)
+            tmax = np.maximum(np.maximum(a, b), c)
+            starts = np.arange(0, len(f), leaf_size)
+            first = start // leaf_size
+            leaf_min[first:first + len(starts)] = np.minimum.reduceat(tmin, starts, axis=0)
+            leaf_max[first:first + len(starts)] = np.maximum.reduceat(tmax, starts, axis=0)
+        # float32 bounds are widened slightly so rounding never loses a hit
+        if m:
+            eps = 1e-6 * float(np.max(leaf_max[:nleaves] - leaf_min[:nleaves]))
+            leaf_min[:nleaves] -= eps
+            leaf_max[:nleaves] += eps
+        return cls(verts, faces, order, leaf_min, leaf_max, leaf_size)
+
+    @classmethod
+    def load_or_build(cls, verts, faces, cache=None, path=None, **kwargs):
+        """Reuse the leaf arrays stored in a MeshCache entry for path, building them on a miss."""
+        if cache is not None and path is not None:
+            order = cache.get_extra(path, 'bvh_order')
+            leaf_min = cache.get_extra(path, 'bvh_leaf_min')
+            leaf_max = cache.get_extra(path, 'bvh_leaf_max')
+            meta = cache.get_extra(path, 'bvh_meta')
+            if order is not None and leaf_min is not None and leaf_max is not None and meta is not None \
+                    and len(order) == len(faces):
+                return cls(verts, faces, order, leaf_min, leaf_max, int(meta[0]))
+        bvh = cls.build(verts, faces, **kwargs)
+        if cache is not None and path is not None:
+            try:
+                cache.put_extra(path, 'bvh_order', bvh.order)
+                cache.put_extra(path, 'bvh_leaf_min', bvh.leaf_min)
+                cache.put_extra(path, 'bvh_leaf_max', bvh.leaf_max)
+                # written last: marks the other arrays as complete
+                cache.put_extra(path, 'bvh_meta', np.array([bvh.leaf_size]))
+            except Exception as e:
+                logger.warning('Could not cache the BVH for %s: %s', path, e)
+        return bvh
+
+    def intersect(self, origin, direction):
+        """Nearest hit of the ray origin + t * direction (t >= 0).
+
+        Returns (triangle index, t, hit point) or None.
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            inv_dir = 1.0 / direction
+        active = np.zeros(1, dtype=np.int64)
+        for depth, (mins, maxs) in enumerate(self.levels):
+            hit, tnear = _slab(origin, inv_dir, mins[active], maxs[active])
+            active = active[hit]
+            tnear = tnear[hit]
+            if active.size == 0:
+                return None
+            if depth + 1 < len(self.levels):
+                active = np.concatenate((2 * active, 2 * active + 1))
+
+        # visit leaves front to back and stop once the best hit is nearer than the next leaf
+        by_dist = np.argsort(tnear, kind='stable')
+        active = active[by_dist]
+        tnear = tnear[by_dist]
+        best_t = np.inf
+        best = -1
+        for start in range(0, len(active), self.leaf_batch):
+            if tnear[start] > best_t:
+                break
+            leaves = active[start:start + self.leaf_batch]
+            tri = (leaves[:, None] * self.leaf_size + np.arange(self.leaf_size)).ravel()
+            tri = self.order[tri[tri < len(self.order)]].astype(np.int64)
+            f = self.faces[tri]
+            t = ray_triangles(origin, direction, self.verts[f[:, 0]], self.verts[f[:, 1]], self.verts[f[:, 2]])
+            i = int(np.argmin(t))
+            if t[i] < best_t:
+                best_t = float(t[i])
+                best = int(tri[i])
+        if best < 0:
+            return None
+        return best, best_t, origin + best_t * direction
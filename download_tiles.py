@@ -3,20 +3,30 @@
 
 用法示例：
   python download_tiles.py --min-zoom 12 --max-zoom 14 --bbox 121.0,31.0,121.6,31.6
+  python download_tiles.py --min-zoom 12 --max-zoom 18 --area survey.geojson --dry-run
 
 参数说明：
 - bbox 格式为 lon_min,lat_min,lon_max,lat_max（十进制度），注意经度在前。
 - 默认使用 tile.openstreetmap.org 模板（请遵守其使用条款）；可用 --template 指定其它瓦片服务器模板。
 
-输出：将 PNG 文件保存为 assets/tiles/{z}/{x}/{y}.png
+输出：将 PNG 文件保存为 assets/tiles/{z}/{x}/{y}.png；使用 --format mbtiles 时
+写入单个 SQLite 文件 assets/tiles.mbtiles（目录与 MBTiles 互转见 tile_store.py）。
+
+下载由 tile_downloader.TileDownloader 并发完成（按主机限速、失败重试）；
+中断后重新运行同一命令即可从日志 <output>/.download-journal 处继续。
+--refresh 用条件请求（ETag/Last-Modified，记录在 <output>/.tile-manifest）重新校验已下载区域，
+只重写内容有变化的瓦片。
 """
 import argparse
 import math
-import os
 import time
 from pathlib import Path
 
-import requests
+from tile_downloader import TileDownloader
+from tile_overviews import build_overviews
+from tile_planner import CoveragePlan, TileIndex, area_bounds, bbox_polygon, load_geojson
+from tile_planner import report as plan_report
+from tile_store import open_store
 
 
 def deg2num(lat_deg, lon_deg, zoom):
@@ -27,77 +37,117 @@ def deg2num(lat_deg, lon_deg, zoom):
     return xtile, ytile
 
 
-def clamp(v, a, b):
-    return max(a, min(b, v))
-
-
-def download_tile(session, url, dest_path, headers=None, delay=0.1):
-    if dest_path.exists():
-        return True
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    try:
-        resp = session.get(url, headers=headers, timeout=15)
-        if resp.status_code == 200:
-            with open(dest_path, 'wb') as f:
-                f.write(resp.content)
-            time.sleep(delay)
-            return True
-        else:
-            return False
-    except Exception:
-        return False
-
-
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--min-zoom', type=int, required=True)
     p.add_argument('--max-zoom', type=int, required=True)
-    p.add_argument('--bbox', type=str, required=True,
-                   help='lon_min,lat_min,lon_max,lat_max')
+    area = p.add_mutually_exclusive_group(required=True)
+    area.add_argument('--bbox', type=str, help='lon_min,lat_min,lon_max,lat_max')
+    area.add_argument('--area', type=str, help='GeoJSON file with survey polygons and/or lines')
+    p.add_argument('--buffer', type=float, default=100.0,
+                   help='corridor width (m) for GeoJSON lines without a "buffer_m" property')
+    p.add_argument('--dry-run', action='store_true',
+                   help='only report tile counts and estimated download size')
     p.add_argument('--template', type=str, default='https://tile.openstreetmap.org/{z}/{x}/{y}.png',
                    help='tile URL template with {z}/{x}/{y}')
-    p.add_argument('--output', type=str, default='./assets/tiles', help='output tiles folder')
-    p.add_argument('--delay', type=float, default=0.1, help='delay between requests (s)')
+    p.add_argument('--output', type=str, default=None,
+                   help='output tiles folder, or .mbtiles file (default: ./assets/tiles[.mbtiles])')
+    p.add_argument('--format', choices=('dir', 'mbtiles'), default='dir',
+                   help='dir: one file per tile; mbtiles: single SQLite file')
+    p.add_argument('--delay', type=float, default=None,
+                   help='minimum interval between requests to one host (s); overrides --rate')
+    p.add_argument('--rate', type=float, default=10.0, help='max requests per second per host')
+    p.add_argument('--workers', type=int, default=8, help='concurrent download threads')
+    p.add_argument('--max-in-flight', type=int, default=8, help='max concurrent requests per host')
+    p.add_argument('--retries', type=int, default=5, help='retries on 429/5xx/network errors')
+    p.add_argument('--journal', type=str, default=None,
+                   help='resume journal (default: <output>/.download-journal)')
+    p.add_argument('--refresh', type=float, nargs='?', const=0.0, default=None, metavar='HOURS',
+                   help='revalidate all planned tiles with conditional requests and rewrite only changed ones; '
+                        'with HOURS, skip tiles checked within that many hours (resume)')
+    p.add_argument('--manifest', type=str, default=None,
+                   help='tile manifest with ETag/Last-Modified/digest (default: <output>/.tile-manifest)')
+    p.add_argument('--build-overviews', action='store_true',
+                   help='download only --max-zoom and build the lower zooms locally by downsampling')
     args = p.parse_args()
 
-    lon_min, lat_min, lon_max, lat_max = [float(x) for x in args.bbox.split(',')]
-    output = Path(args.output)
-    session = requests.Session()
-    session.headers.update({'User-Agent': 'GeoReconViewerTileDownloader/1.0 (+https://example)'})
+    if args.area:
+        polys = load_geojson(args.area, args.buffer)
+    else:
+        polys = [bbox_polygon(*[float(x) for x in args.bbox.split(',')])]
+    lon_min, lat_min, lon_max, lat_max = area_bounds(polys)
+    output = args.output or ('./assets/tiles.mbtiles' if args.format == 'mbtiles' else './assets/tiles')
+    if args.format == 'mbtiles' and not output.endswith('.mbtiles'):
+        output = str(Path(output).with_suffix('.mbtiles'))
+    rate = 1.0 / args.delay if args.delay else args.rate
 
     # Warn about using public servers
     if 'tile.openstreetmap.org' in args.template:
         print('注意：你正在使用 tile.openstreetmap.org 作为数据源。大规模下载会违反 OSM 的使用条款，请自行搭建 tileserver 或使用授权服务。')
 
-    for z in range(args.min_zoom, args.max_zoom + 1):
-        # compute tile range
-        x0, y1 = deg2num(lat_min, lon_min, z)
-        x1, y0 = deg2num(lat_max, lon_max, z)
-        # normalize ranges
-        x_min = min(x0, x1)
-        x_max = max(x0, x1)
-        y_min = min(y0, y1)
-        y_max = max(y0, y1)
-        max_tile = 2 ** z - 1
-        x_min = clamp(x_min, 0, max_tile)
-        x_max = clamp(x_max, 0, max_tile)
-        y_min = clamp(y_min, 0, max_tile)
-        y_max = clamp(y_max, 0, max_tile)
-
-        print(f'Downloading zoom {z} tiles: x {x_min}..{x_max}, y {y_min}..{y_max}')
-
-        downloaded_any = False
-        for x in range(x_min, x_max + 1):
-            for y in range(y_min, y_max + 1):
-                url = args.template.format(z=z, x=x, y=y)
-                dest = output / str(z) / str(x) / f"{y}.png"
-                ok = download_tile(session, url, dest, delay=args.delay)
-                if ok:
-                    downloaded_any = True
-                else:
-                    print(f'Failed: {url}')
-
-    # Write metadata (bbox, zoom range, suggested center and zoom)
+    # with overviews only the deepest level comes from the server
+    fetch_min_zoom = args.max_zoom if args.build_overviews else args.min_zoom
+    plan = CoveragePlan.from_polygons(polys, fetch_min_zoom, args.max_zoom)
+    # one scan/query of what is already there instead of a check per tile
+    mean_bytes = 0
+    index = TileIndex({})
+    if Path(output).exists():
+        existing = open_store(output)
+        index = TileIndex.scan(existing)
+        mean_bytes = existing.mean_tile_bytes()
+        existing.close()
+    todo = plan.minus(index)
+    print('\n'.join(plan_report(plan, todo, mean_bytes or 15000)))
+    if args.refresh is not None:
+        # every planned tile is revalidated, stored or not
+        todo = plan
+        print(f'Refresh: {plan.total()} tiles to revalidate')
+    if args.dry_run:
+        return
+    total = todo.total()
+
+    downloader = TileDownloader(args.template, output, workers=args.workers, rate=rate,
+                                max_in_flight=args.max_in_flight, retries=args.retries, journal=args.journal,
+                                manifest=args.manifest)
+    started = time.monotonic()
+    last = [0.0]
+
+    def report(stats):
+        now = time.monotonic()
+        if now - last[0] < 1.0:
+            return
+        last[0] = now
+        done = sum(stats.values())
+        print(f'{done}/{total} tiles ({stats["ok"]} downloaded, {stats["failed"]} failed, '
+              f'{done / max(now - started, 1e-9):.1f} tiles/s)', flush=True)
+
+    max_age = args.refresh * 3600.0 if args.refresh else None
+    try:
+        stats = downloader.run(todo.tiles(), progress=report, check_existing=False,
+                               refresh=args.refresh is not None, max_age=max_age)
+    except KeyboardInterrupt:
+        downloader.close()
+        if args.refresh is not None:
+            print('Interrupted; run again with --refresh HOURS to skip tiles already checked.')
+        else:
+            print('Interrupted; run the same command again to resume.')
+        return
+    if args.refresh is not None:
+        print(f'Done: {stats["ok"]} updated, {stats["not_modified"]} not modified (304), '
+              f'{stats["unchanged"]} unchanged, {stats["skipped"]} recently checked, '
+              f'{stats["missing"]} missing on server, {stats["failed"]} failed')
+    else:
+        print(f'Done: {stats["ok"]} downloaded, {stats["skipped"]} already present, '
+              f'{stats["missing"]} missing on server, {stats["failed"]} failed')
+
+    if args.build_overviews and args.min_zoom < args.max_zoom:
+        def report_overviews(z, done, n):
+            print(f'\rBuilding zoom {z}: {done}/{n}', end='', flush=True)
+        ov = build_overviews(downloader.store, args.max_zoom, args.min_zoom, progress=report_overviews)
+        print(f'\nOverviews: {ov["built"]} built, {ov["unchanged"]} unchanged')
+
+    # Write metadata (bbox, zoom range, suggested center and zoom); for MBTiles
+    # the same fields go to its metadata table
     try:
         meta = {
             'bbox': [lon_min, lat_min, lon_max, lat_max],
@@ -107,9 +157,10 @@ def main():
         # compute center
         meta['center'] = [(lat_min + lat_max) / 2.0, (lon_min + lon_max) / 2.0]
         meta['suggested_zoom'] = args.max_zoom
-        (output / 'metadata.json').write_text(__import__('json').dumps(meta))
+        downloader.store.set_metadata(meta)
     except Exception:
         pass
+    downloader.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,231 @@
+"""Georeferencing of reconstructions: model-local frame <-> ENU <-> ECEF <-> WGS84.
+
+A model's georeference is stored next to it as `<model>.georef.json`:
+
+    {"origin": [lat, lon, alt],            # ENU origin, degrees / metres
+     "matrix": [[...4x4...]]}              # local -> ENU (optional)
+
+or, instead of "matrix", the components "scale", "heading_deg" (rotation
+about the up axis, counter-clockwise from east) and "translation" (metres,
+ENU). Without either the local frame is taken to be ENU metres.
+
+All conversions are vectorized over (N, 3) arrays in float64.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1.0 / 298.257223563
+WGS84_B = WGS84_A * (1.0 - WGS84_F)
+WGS84_E2 = WGS84_F * (2.0 - WGS84_F)
+WGS84_EP2 = WGS84_E2 / (1.0 - WGS84_E2)
+
+
+# points per block: large enough to amortize numpy call overhead, small
+# enough that a block's temporaries stay in cache
+BLOCK = 1 << 16
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='georef')
+    return _executor
+
+
+def _blocked(fn, n):
+    """Run fn(start, stop) over [0, n) in blocks, on a thread pool for large inputs.
+
+    numpy releases the GIL inside its ufuncs, so blocks run in parallel.
+    """
+    starts = range(0, n, BLOCK)
+    if n <= 4 * BLOCK or (os.cpu_count() or 1) == 1:
+        for start in starts:
+            fn(start, min(start + BLOCK, n))
+        return
+    list(_pool().map(lambda start: fn(start, min(start + BLOCK, n)), starts))
+
+
+def _geodetic_to_ecef_block(lat, lon, alt, out):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_E2 * sin_lat * sin_lat
+    np.subtract(1.0, n, out=n)
+    np.sqrt(n, out=n)
+    np.divide(WGS84_A, n, out=n)
+    r = (n + alt) * cos_lat
+    out[:, 0] = r * np.cos(lon)
+    out[:, 1] = r * np.sin(lon)
+    n *= 1.0 - WGS84_E2
+    n += alt
+    n *= sin_lat
+    out[:, 2] = n
+
+
+def geodetic_to_ecef(lat, lon, alt=0.0):
+    """Latitude/longitude in degrees and ellipsoidal height in metres to ECEF metres, shape (N, 3)."""
+    lat, lon, alt = np.broadcast_arrays(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64),
+                                        np.asarray(alt, dtype=np.float64))
+    shape = lat.shape
+    lat, lon, alt = lat.ravel(), lon.ravel(), alt.ravel()
+    out = np.empty((lat.size, 3), dtype=np.float64)
+
+    def block(i, j):
+        _geodetic_to_ecef_block(lat[i:j], lon[i:j], alt[i:j], out[i:j])
+    _blocked(block, lat.size)
+    return out.reshape(shape + (3,))
+
+
+def _ecef_to_geodetic_block(xyz, lat_out, lon_out, alt_out):
+    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    a2 = WGS84_A * WGS84_A
+    b2 = WGS84_B * WGS84_B
+    e4 = WGS84_E2 * WGS84_E2
+    z2 = z * z
+    p2 = x * x + y * y
+    p = np.sqrt(p2)
+    f = (54.0 * b2) * z2
+    g = p2 + (1.0 - WGS84_E2) * z2
+    g -= WGS84_E2 * (a2 - b2)
+    c = e4 * f * p2 / (g * g * g)
+    s = np.cbrt(1.0 + c + np.sqrt(c * c + 2.0 * c))
+    k = s + 1.0 + 1.0 / s
+    pp = f / (3.0 * k * k * g * g)
+    q = np.sqrt(1.0 + (2.0 * e4) * pp)
+    r0 = 0.5 * a2 * (1.0 + 1.0 / q) - pp * (1.0 - WGS84_E2) * z2 / (q * (1.0 + q)) - 0.5 * pp * p2
+    np.maximum(r0, 0.0, out=r0)
+    np.sqrt(r0, out=r0)
+    r0 -= pp * WGS84_E2 * p / (1.0 + q)
+    t = p - WGS84_E2 * r0
+    t *= t
+    u = np.sqrt(t + z2)
+    v = np.sqrt(t + (1.0 - WGS84_E2) * z2)
+    z0 = (b2 / WGS84_A) * z / v
+    alt_out[:] = u * (1.0 - (b2 / WGS84_A) / v)
+    lat_out[:] = np.degrees(np.arctan2(z + WGS84_EP2 * z0, p))
+    lon_out[:] = np.degrees(np.arctan2(y, x))
+
+
+def ecef_to_geodetic(xyz):
+    """ECEF metres, shape (N, 3), to (lat, lon, alt) arrays in degrees and metres.
+
+    Closed-form solution of Heikkinen (1982); sub-millimetre for points near
+    the Earth's surface, no iteration.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    shape = xyz.shape[:-1]
+    xyz = xyz.reshape(-1, 3)
+    lat = np.empty(len(xyz))
+    lon = np.empty(len(xyz))
+    alt = np.empty(len(xyz))
+
+    def block(i, j):
+        _ecef_to_geodetic_block(xyz[i:j], lat[i:j], lon[i:j], alt[i:j])
+    _blocked(block, len(xyz))
+    return lat.reshape(shape), lon.reshape(shape), alt.reshape(shape)
+
+
+def enu_rotation(lat, lon):
+    """3x3 rotation taking ECEF vectors to the local East-North-Up frame at (lat, lon)."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sl, cl = np.sin(lat), np.cos(lat)
+    so, co = np.sin(lon), np.cos(lon)
+    return np.array([[-so, co, 0.0],
+                     [-sl * co, -sl * so, cl],
+                     [cl * co, cl * so, sl]])
+
+
+def _apply(matrix, points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    out = points @ matrix[:3, :3].T
+    out += matrix[:3, 3]
+    return out
+
+
+class Georeference:
+    """Transform between a model's local frame and WGS84 through ENU and ECEF.
+
+    Usage:
+        geo = Georeference.find_for('scan.obj')  # reads scan.georef.json if present
+        lat, lon, alt = geo.local_to_wgs84(points)
+        points = geo.wgs84_to_local(lat, lon, alt)
+    """
+
+    def __init__(self, origin, local_to_enu=None):
+        self.origin = tuple(float(c) for c in origin)
+        if len(self.origin) == 2:
+            self.origin = self.origin + (0.0,)
+        self.local_to_enu = np.eye(4) if local_to_enu is None else np.asarray(local_to_enu, dtype=np.float64)
+        lat, lon, alt = self.origin
+        enu_to_ecef = np.eye(4)
+        enu_to_ecef[:3, :3] = enu_rotation(lat, lon).T
+        enu_to_ecef[:3, 3] = geodetic_to_ecef(lat, lon, alt)
+        self.local_to_ecef = enu_to_ecef @ self.local_to_enu
+        self.ecef_to_local = np.linalg.inv(self.local_to_ecef)
+
+    @classmethod
+    def from_dict(cls, data):
+        origin = data['origin']
+        if 'matrix' in data:
+            return cls(origin, np.asarray(data['matrix'], dtype=np.float64).reshape(4, 4))
+        scale = float(data.get('scale', 1.0))
+        heading = np.radians(float(data.get('heading_deg', 0.0)))
+        m = np.eye(4)
+        m[:3, :3] = scale * np.array([[np.cos(heading), -np.sin(heading), 0.0],
+                                      [np.sin(heading), np.cos(heading), 0.0],
+                                      [0.0, 0.0, 1.0]])
+        m[:3, 3] = data.get('translation', (0.0, 0.0, 0.0))
+        return cls(origin, m)
+
+    def to_dict(self):
+        return {'origin': list(self.origin), 'matrix': self.local_to_enu.tolist()}
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(json.loads(Path(path).read_text(encoding='utf-8')))
+
+    def save(self, path):
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2), encoding='utf-8')
+
+    @staticmethod
+    def sidecar_path(model_path):
+        model_path = Path(model_path)
+        return model_path.with_name(model_path.stem + '.georef.json')
+
+    @classmethod
+    def find_for(cls, model_path):
+        """Georeference stored next to a model file, or None."""
+        sidecar = cls.sidecar_path(model_path)
+        if not sidecar.is_file():
+            return None
+        return cls.load(sidecar)
+
+    def local_to_ecef_points(self, points):
+        return _apply(self.local_to_ecef, points)
+
+    def ecef_to_local_points(self, xyz):
+        return _apply(self.ecef_to_local, xyz)
+
+    def local_to_wgs84(self, points):
+        """(N, 3) local points to (lat, lon, alt) arrays."""
+        return ecef_to_geodetic(self.local_to_ecef_points(points))
+
+    def wgs84_to_local(self, lat, lon, alt=0.0):
+        """lat/lon/alt arrays to (N, 3) local points."""
+        return self.ecef_to_local_points(geodetic_to_ecef(lat, lon, alt))
+
+    def footprint(self, minv, maxv):
+        """Lat/lon corners, shape (4, 2), of the model's local XY bounding box at its lowest height."""
+        corners = np.array([[minv[0], minv[1], minv[2]], [maxv[0], minv[1], minv[2]],
+                            [maxv[0], maxv[1], minv[2]], [minv[0], maxv[1], minv[2]]], dtype=np.float64)
+        lat, lon, _ = self.local_to_wgs84(corners)
+        return np.column_stack([lat, lon])
@@ -0,0 +1,177 @@
+import logging
+import threading
+
+import numpy as np
+
+from PySide6 import QtCore
+
+from bvh import TriangleBVH
+from mesh_lod import LodPyramid
+from obj_loader import LoadCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class MeshLoadSignals(QtCore.QObject):
+    """Signals emitted by MeshLoadJob; delivered to the GUI thread through queued connections."""
+
+    progress = QtCore.Signal(object, object)  # bytes_read, total_bytes
+    finished = QtCore.Signal(object, object)  # verts, faces
+    chunk = QtCore.Signal(object, object)  # verts, faces of one streamed block
+    stream_finished = QtCore.Signal()
+    lod_ready = QtCore.Signal(object)  # LodPyramid, emitted after finished/stream_finished
+    bvh_ready = QtCore.Signal(object)  # TriangleBVH for picking
+    completed = QtCore.Signal()  # last signal of a successful job
+    failed = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+
+
+class MeshLoadJob(QtCore.QRunnable):
+    """Runs ObjLoader.load on a QThreadPool worker.
+
+    The parsed arrays are only handed to the GUI thread through `finished`
+    (or `chunk`/`stream_finished` when stream=True), so the viewer and the GL
+    context are never touched from the worker. With lod=True a LodPyramid is
+    built (or read from the loader's cache) afterwards and sent via `lod_ready`,
+    and with pick=True a TriangleBVH via `bvh_ready`; `completed` follows last.
+
+    Usage:
+        job = MeshLoadJob(loader, path)
+        job.signals.finished.connect(viewer.set_mesh)
+        QtCore.QThreadPool.globalInstance().start(job)
+        ...
+        job.cancel()
+    """
+
+    def __init__(self, loader, path, stream=False, lod=False, pick=False):
+        super().__init__()
+        self.loader = loader
+        self.path = path
+        self.stream = stream
+        self.lod = lod
+        self.pick = pick
+        self.signals = MeshLoadSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def run(self):
+        if self.stream:
+            self._run_stream()
+            return
+        try:
+            verts, faces = self.loader.load(self.path, progress=self._on_progress, cancel=self._cancel)
+        except LoadCancelled:
+            logger.info('Loading %s cancelled', self.path)
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            logger.exception('Loading %s failed', self.path)
+            self.signals.failed.emit(str(e))
+            return
+        if self._cancel.is_set():
+            # cancelled after the last block: drop the arrays here instead of handing them over
+            del verts, faces
+            self.signals.cancelled.emit()
+            return
+        self.signals.finished.emit(verts, faces)
+        self._build_extras(verts, faces)
+
+    def _run_stream(self):
+        chunks = []
+        try:
+            for verts, faces in self.loader.iter_chunks(self.path, progress=self._on_progress, cancel=self._cancel):
+                if self._cancel.is_set():
+                    raise LoadCancelled(str(self.path))
+                self.signals.chunk.emit(verts, faces)
+                if self.lod or self.pick:
+                    chunks.append((verts, faces))
+        except LoadCancelled:
+            logger.info('Loading %s cancelled', self.path)
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            logger.exception('Loading %s failed', self.path)
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.stream_finished.emit()
+        if chunks:
+            verts = np.concatenate([c[0] for c in chunks])
+            faces = np.concatenate([c[1] for c in chunks])
+            del chunks
+            self._build_extras(verts, faces)
+        else:
+            self.signals.completed.emit()
+
+    def _build_extras(self, verts, faces):
+        """Build LOD levels and the picking BVH (cached with the mesh), then emit completed."""
+        cache = getattr(self.loader, 'cache', None)
+        builds = []
+        if self.lod:
+            builds.append(('LOD build', LodPyramid.load_or_build, self.signals.lod_ready))
+        if self.pick:
+            builds.append(('BVH build', TriangleBVH.load_or_build, self.signals.bvh_ready))
+        for name, build, signal in builds:
+            if self._cancel.is_set() or len(faces) == 0:
+                break
+            try:
+                result = build(verts, faces, cache=cache, path=self.path)
+            except Exception as e:
+                logger.exception('%s for %s failed', name, self.path)
+                self.signals.failed.emit(f'{name} failed: {e}')
+                return
+            if not self._cancel.is_set():
+                signal.emit(result)
+        self.signals.completed.emit()
+
+    def _on_progress(self, done, total):
+        self.signals.progress.emit(done, total)
+
+
+class PointSampleSignals(QtCore.QObject):
+    """Signals emitted by PointSampleJob."""
+
+    finished = QtCore.Signal(object, object)  # positions, colors (or None)
+    failed = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+
+
+class PointSampleJob(QtCore.QRunnable):
+    """Runs PointCloud.sample on a QThreadPool worker (the region scan reads the whole cloud).
+
+    Usage:
+        job = PointSampleJob(cloud, 1_000_000, lo, hi)
+        job.signals.finished.connect(viewer.set_point_detail)
+        QtCore.QThreadPool.globalInstance().start(job)
+    """
+
+    def __init__(self, cloud, budget, lo=None, hi=None):
+        super().__init__()
+        self.cloud = cloud
+        self.budget = budget
+        self.lo = lo
+        self.hi = hi
+        self.signals = PointSampleSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            points, colors = self.cloud.sample(self.budget, self.lo, self.hi, cancel=self._cancel)
+        except LoadCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            logger.exception('Sampling %s failed', self.cloud.path)
+            self.signals.failed.emit(str(e))
+            return
+        if self._cancel.is_set():
+            self.signals.cancelled.emit()
+            return
+        self.signals.finished.emit(points, colors)
@@ -1,49 +1,145 @@
-import pdb
+import time
+# start of the --startup-profile timeline, taken before the heavy imports
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import json
 import sys
 import os
 from pathlib import Path
 
+import numpy as np
 from PySide6 import QtCore, QtWidgets
 from PySide6.QtGui import QAction
-from PySide6.QtWebEngineWidgets import QWebEngineView
-from PySide6.QtWebEngineCore import QWebEngineSettings
-from PySide6.QtWebChannel import QWebChannel
-
-from PySide6.QtQuick import QQuickWindow, QSGRendererInterface
 
 import logging
 
-# local components
-from viewer_3d import ModelViewer
-from obj_loader import ObjLoader
-from devtools import DevToolsWindow
+# local components; the 3D view (pyqtgraph/OpenGL) and QtWebEngine are imported on first use,
+# see MainWindow._ensure_viewer and MainWindow._ensure_map
+from obj_loader import ObjLoader, MeshCache
+from load_worker import MeshLoadJob, PointSampleJob
+from georef import Georeference
+from map_overlay import pack_features, pack_ids
+from model_bundle import SUFFIX as BUNDLE_SUFFIX, BundleLoader, ModelBundle
+from ply_loader import PointCloud
+import perf
+from view_sync import ViewSync
 
 # configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
+ASSETS = Path(__file__).resolve().parent / 'assets'
+
+_IMPORTS_DONE = time.perf_counter()
 
 
-# Optional 3D view dependencies (pyqtgraph)
-try:
-    import pyqtgraph as pg
-    import pyqtgraph.opengl as gl
-    import numpy as np
-    HAS_3D = True
-except Exception as e:
-    print("3D view dependencies not found:", e)
-    HAS_3D = False
+def local_tile_store_path():
+    """assets/tiles.mbtiles or assets/tiles if present (served at tiles://local/), else None."""
+    if (ASSETS / 'tiles.mbtiles').is_file():
+        return ASSETS / 'tiles.mbtiles'
+    if (ASSETS / 'tiles').is_dir():
+        return ASSETS / 'tiles'
+    return None
 
 
 class MapBridge(QtCore.QObject):
-    """Bridge between Python and the web map (JS)."""
+    """Bridge between Python and the web map (JS).
+
+    Overlays: set_layer / add_features / remove_features / clear_layer send
+    one packed message per call (see map_overlay.py) that
+    assets/map_overlay.js draws on a canvas layer. Messages sent before the
+    page is ready are queued.
+
+    View sync (see view_sync.py): mapMoved carries the map center and
+    ground width, send_view_sync pushes camera updates to assets/view_sync.js.
+    """
 
     jsToPy = QtCore.Signal(float, float)
+    # zoom, south, west, north, east of the map view after a pan/zoom
+    viewChanged = QtCore.Signal(int, float, float, float, float)
+    # JSON overlay message; connected to by assets/map_overlay.js
+    overlayMessage = QtCore.Signal(str)
+    # map center lat, lon and visible ground width (m), at most once per animation frame
+    mapMoved = QtCore.Signal(float, float, float)
+    # JSON view sync message; connected to by assets/view_sync.js
+    viewSyncMessage = QtCore.Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ready = False
+        self._overlay_queue = []
+        # latest view sync message per op until the page is ready
+        self._view_sync_queue = {}
+
+    @QtCore.Slot()
+    @perf.timed('webchannel.fromJs_ready')
+    def fromJs_ready(self):
+        # the page (re)loaded and listens to overlayMessage / viewSyncMessage
+        self._ready = True
+        queued, self._overlay_queue = self._overlay_queue, []
+        for _, text in queued:
+            self.overlayMessage.emit(text)
+        queued, self._view_sync_queue = self._view_sync_queue, {}
+        for text in queued.values():
+            self.viewSyncMessage.emit(text)
+
+    @QtCore.Slot(float, float, float)
+    @perf.timed('webchannel.fromJs_mapMoved')
+    def fromJs_mapMoved(self, lat, lon, width_m):
+        self.mapMoved.emit(lat, lon, width_m)
+
+    @perf.timed('webchannel.send_view_sync')
+    def send_view_sync(self, msg):
+        text = json.dumps(msg)
+        if self._ready:
+            self.viewSyncMessage.emit(text)
+        else:
+            self._view_sync_queue[msg['op']] = text
+
+    @perf.timed('webchannel.send_overlay')
+    def _send_overlay(self, msg):
+        text = json.dumps(msg)
+        if self._ready:
+            self.overlayMessage.emit(text)
+            return
+        if msg['op'] in ('set', 'clear'):
+            # replaces the whole layer: earlier queued messages for it are moot
+            self._overlay_queue = [(name, t) for name, t in self._overlay_queue if name != msg['layer']]
+        self._overlay_queue.append((msg['layer'], text))
+
+    def set_layer(self, name, kind, geometry, ids=None, style=None):
+        """Replace overlay layer `name` with features of one kind ('points', 'polylines', 'polygons').
+
+        style: optional dict with color, fillColor, radius, weight, opacity, fillOpacity.
+        """
+        msg = pack_features(kind, geometry, ids)
+        msg.update(op='set', layer=name, style=style or {})
+        self._send_overlay(msg)
+
+    def add_features(self, name, kind, geometry, ids, style=None):
+        """Add features to a layer, replacing features with the same ids."""
+        msg = pack_features(kind, geometry, ids)
+        msg.update(op='add', layer=name, style=style or {})
+        self._send_overlay(msg)
+
+    def remove_features(self, name, ids):
+        self._send_overlay({'op': 'remove', 'layer': name, 'ids': pack_ids(ids)})
+
+    def clear_layer(self, name):
+        """Remove layer `name` from the map."""
+        self._send_overlay({'op': 'clear', 'layer': name})
 
     @QtCore.Slot(float, float)
+    @perf.timed('webchannel.fromJs_click')
     def fromJs_click(self, lat, lon):
         print(f"Map clicked at: {lat}, {lon}")
         self.jsToPy.emit(lat, lon)
 
+    @QtCore.Slot(int, float, float, float, float)
+    @perf.timed('webchannel.fromJs_view')
+    def fromJs_view(self, zoom, south, west, north, east):
+        self.viewChanged.emit(zoom, south, west, north, east)
+
     @QtCore.Slot(float, float)
     def highlight(self, lat, lon):
         # called from Python to ask JS to highlight a point
@@ -52,18 +148,110 @@ class MapBridge(QtCore.QObject):
 
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, lazy=False, startup_profile=False, scene_budget_mb=2048, frame_target_ms=1000.0 / 30):
+        """lazy: create the 3D view once the event loop runs and the map (QtWebEngine)
+        on first use of View > Map. startup_profile: log phase timings (perf spans
+        named startup.*) once the window, and later the map, are ready.
+        scene_budget_mb: memory for the resident models of a scene folder.
+        frame_target_ms: frame time the 3D view degrades to while the camera is dragged.
+        """
         super().__init__()
         self.setWindowTitle("GeoReconViewer - Demo")
-        self._setup_ui()
-        self._setup_menus()
-        self._setup_map()
-        self._setup_webchannel()
+        self._lazy = lazy
+        self._startup_profile = startup_profile
+        self._startup_logged = 0
+        self.viewer = None
+        # map window, web channel and tile service; created by _ensure_map
+        self._web = None
+        self._web_window = None
+        self._bridge = None
+        self._view_sync = None
+        self._tile_service = None
+        self._map_loaded = False
+        # JavaScript calls made before map.html finished loading
+        self._js_queue = []
+        # multi-model scene (File > Open scene folder), see scene_manager.py
+        self._scene = None
+        self._scene_budget = int(scene_budget_mb) << 20
+        self._frame_target_ms = frame_target_ms
+        with perf.span('startup.ui'):
+            self._setup_ui()
+        with perf.span('startup.menus'):
+            self._setup_menus()
+        if not lazy:
+            self._ensure_viewer()
+            self._ensure_map()
+        QtCore.QTimer.singleShot(0, self._on_event_loop_started)
+
+    def _on_event_loop_started(self):
+        perf.record('startup.until_event_loop', _IMPORT_START, time.perf_counter() - _IMPORT_START)
+        if self._lazy:
+            self._ensure_viewer()
+            self._log_startup_profile('window ready')
+
+    def _log_startup_profile(self, title):
+        """Log the startup.* spans recorded since the last call (with --startup-profile)."""
+        if not self._startup_profile:
+            return
+        events = perf.events('startup.')
+        new, self._startup_logged = events[self._startup_logged:], len(events)
+        lines = [f'Startup profile ({title}):']
+        for name, start, duration, _, _ in sorted(new, key=lambda e: e[1]):
+            lines.append(f'  at {1e3 * (start - _IMPORT_START):8.1f} ms  {name[8:]:24s} {1e3 * duration:8.1f} ms')
+        logging.info('\n'.join(lines))
+
+    def _ensure_viewer(self):
+        """Create the 3D view (imports pyqtgraph/OpenGL) if it does not exist yet; returns it."""
+        if self.viewer is not None:
+            return self.viewer
+        with perf.span('startup.import_3d'):
+            from viewer_3d import ModelViewer
+        with perf.span('startup.viewer'):
+            self.viewer = ModelViewer(parent=self)
+            self.setCentralWidget(self.viewer)
+            self.viewer.lodLevelChanged.connect(self._on_lod_level_changed)
+            self.viewer.picked.connect(self._on_model_picked)
+            if self._perf_action.isChecked():
+                self.viewer.set_perf_overlay(True)
+            self.viewer.set_adaptive_quality(self._adaptive_action.isChecked(), self._frame_target_ms)
+        return self.viewer
+
+    def _ensure_map(self):
+        """Create the map window, tile service and web channel if they do not exist yet."""
+        if self._web is not None:
+            return
+        self._ensure_viewer()
+        with perf.span('startup.map'):
+            self._setup_map()
+        with perf.span('startup.webchannel'):
+            self._setup_webchannel()
+        # a model may have been loaded before the map existed
+        if self._georef is not None:
+            self._view_sync.set_georef(self._georef)
+            self._show_footprint()
 
     def _setup_ui(self):
-        # Single central viewer (ModelViewer)
-        self.viewer = ModelViewer(parent=self)
-        self.setCentralWidget(self.viewer)
+        # the central 3D viewer replaces this placeholder (_ensure_viewer)
+        placeholder = QtWidgets.QLabel('Loading 3D view...')
+        placeholder.setAlignment(QtCore.Qt.AlignCenter)
+        self.setCentralWidget(placeholder)
+        # georeference of the loaded model (<model>.georef.json), or None
+        self._georef = None
+        # callable(model point) -> (lat, lon); set once the model has a georeference
+        self._model_to_latlon = None
+
+        # background load progress lives in the status bar; hidden while idle
+        self._load_job = None
+        self._load_bounds = None
+        self._load_progress = QtWidgets.QProgressBar()
+        self._load_progress.setRange(0, 1000)
+        self._load_progress.setMaximumWidth(240)
+        self._load_cancel = QtWidgets.QPushButton('Cancel')
+        self._load_cancel.clicked.connect(self._cancel_load)
+        self.statusBar().addPermanentWidget(self._load_progress)
+        self.statusBar().addPermanentWidget(self._load_cancel)
+        self._load_progress.hide()
+        self._load_cancel.hide()
 
     def _setup_menus(self):
         menubar = self.menuBar()
@@ -71,16 +259,78 @@ class MainWindow(QtWidgets.QMainWindow):
         self._view_menu = menubar.addMenu('View')
         self._debug_menu = menubar.addMenu('Debug')
 
-        self._obj_loader = ObjLoader()
-        load_action = QAction('Load .obj', self)
+        self._obj_loader = ObjLoader(cache=MeshCache())
+        # bundles written by preprocess.py: memory-mapped, with stored LOD levels and BVH
+        self._bundle_loader = BundleLoader()
+        load_action = QAction('Load .obj / bundle / .ply', self)
         load_action.triggered.connect(self._on_load_obj)
         self._file_menu.addAction(load_action)
 
+        # many preprocessed models in one georeferenced scene, paged by view and memory budget
+        scene_action = QAction('Open scene folder...', self)
+        scene_action.triggered.connect(self._on_open_scene)
+        self._file_menu.addAction(scene_action)
+
+        # show geometry block by block while a file is parsed
+        self._stream_action = QAction('Progressive loading', self)
+        self._stream_action.setCheckable(True)
+        self._stream_action.setChecked(True)
+        self._file_menu.addAction(self._stream_action)
+
+        # weld seam duplicates, drop degenerate faces and unused vertices, Morton-reorder (mesh_optimize.py);
+        # needs the whole mesh, so it replaces progressive loading
+        self._optimize_action = QAction('Optimize meshes on load', self)
+        self._optimize_action.setCheckable(True)
+        self._optimize_action.toggled.connect(self._set_optimize)
+        self._file_menu.addAction(self._optimize_action)
+
+        # build decimated levels after loading and switch between them by camera distance
+        self._lod_action = QAction('Level of detail', self)
+        self._lod_action.setCheckable(True)
+        self._lod_action.setChecked(True)
+        self._view_menu.addAction(self._lod_action)
+
+        # map pans/zooms move the 3D camera and the camera moves the map (needs a georeference)
+        self._link_action = QAction('Link map and 3D view', self)
+        self._link_action.setCheckable(True)
+        self._link_action.toggled.connect(self._set_linked)
+        self._view_menu.addAction(self._link_action)
+
+        # no edges and coarser LOD levels while the camera is dragged, to stay near the frame target
+        self._adaptive_action = QAction('Adaptive quality while dragging', self)
+        self._adaptive_action.setCheckable(True)
+        self._adaptive_action.setChecked(True)
+        self._adaptive_action.toggled.connect(self._set_adaptive_quality)
+        self._view_menu.addAction(self._adaptive_action)
+
+        # FPS, frame times, triangles and memory over the 3D view (also turns on perf instrumentation)
+        self._perf_action = QAction('Performance overlay', self)
+        self._perf_action.setCheckable(True)
+        self._perf_action.toggled.connect(self._set_perf_overlay)
+        self._perf_action.setChecked(perf.enabled() and not self._startup_profile)
+        self._view_menu.addAction(self._perf_action)
+
         # add highlight action to the debug menu (rename of previous '测试')
         hl_action = QAction('Highlight sample on map', self)
         hl_action.triggered.connect(self._do_highlight)
         self._debug_menu.addAction(hl_action)
 
+        overlay_action = QAction('Overlay test (100k points)', self)
+        overlay_action.triggered.connect(self._overlay_test)
+        self._debug_menu.addAction(overlay_action)
+
+        tile_stats_action = QAction('Tile cache stats', self)
+        tile_stats_action.triggered.connect(self._show_tile_stats)
+        self._debug_menu.addAction(tile_stats_action)
+
+        scene_stats_action = QAction('Scene residency stats', self)
+        scene_stats_action.triggered.connect(self._show_scene_stats)
+        self._debug_menu.addAction(scene_stats_action)
+
+        trace_action = QAction('Export performance trace...', self)
+        trace_action.triggered.connect(self._export_perf_trace)
+        self._debug_menu.addAction(trace_action)
+
         # add Map action in View menu (click to show if hidden)
         self._map_action = QAction('Map', self)
         # not checkable: clicking shows the map if it's not already visible
@@ -88,6 +338,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self._view_menu.addAction(self._map_action)
 
     def _setup_map(self):
+        with perf.span('startup.import_webengine'):
+            from PySide6.QtWebEngineCore import QWebEngineSettings
+            from PySide6.QtWebEngineWidgets import QWebEngineView
+            from tile_scheme import SCHEME, scheme_registered
+            from tile_server import TileSchemeHandler, TileService
+            from tile_store import DirectoryStore, MBTiles
         # create web view and load local map
         self._web = QWebEngineView()
         try:
@@ -96,8 +352,20 @@ class MainWindow(QtWidgets.QMainWindow):
             s.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, True)
         except Exception:
             pass
-        assets = Path(__file__).resolve().parent / "assets"
-        map_html = assets / "map.html"
+        # local tiles are served through tiles://local/ (see tile_server.py)
+        self._tile_service = None
+        tiles = local_tile_store_path()
+        if tiles is not None and not scheme_registered():
+            # --lazy: registering the scheme before the QApplication would have loaded QtWebEngine
+            logging.info('Local tiles at %s are not served with --lazy; the map uses online tiles', tiles)
+        elif tiles is not None:
+            store = MBTiles(tiles) if tiles.suffix == '.mbtiles' else DirectoryStore(tiles)
+            self._tile_service = TileService(store)
+            self._tile_handler = TileSchemeHandler(self._tile_service, parent=self)
+            self._web.page().profile().installUrlSchemeHandler(SCHEME, self._tile_handler)
+        map_html = ASSETS / "map.html"
+        self._map_load_start = time.perf_counter()
+        self._web.loadFinished.connect(self._on_map_loaded)
         self._web.load(QtCore.QUrl.fromLocalFile(str(map_html)))
 
         # Put the web view into its own top-level window so it runs separately
@@ -134,39 +402,378 @@ class MainWindow(QtWidgets.QMainWindow):
     # no inline test button; highlight action is in the '测试' menu
 
     def _setup_webchannel(self):
+        from PySide6.QtWebChannel import QWebChannel
         # keep a reference to the channel so we can clean it up on close
         self._web_channel = QWebChannel()
         self._bridge = MapBridge()
         self._web_channel.registerObject("pyBridge", self._bridge)
         self._web.page().setWebChannel(self._web_channel)
         self._bridge.jsToPy.connect(self._on_map_clicked)
+        self._bridge.viewChanged.connect(self._on_map_view_changed)
+        self._view_sync = ViewSync(self.viewer, self._bridge, parent=self)
+
+    def _on_map_loaded(self, ok):
+        if self._map_loaded:
+            return
+        # includes starting the Chromium processes
+        perf.record('startup.map_page_load', self._map_load_start, time.perf_counter() - self._map_load_start)
+        self._map_loaded = True
+        queued, self._js_queue = self._js_queue, []
+        for js in queued:
+            self._web.page().runJavaScript(js)
+        self._log_startup_profile('map ready')
+
+    def _run_js(self, js):
+        # no-op without a map; queued until map.html has loaded
+        if self._web is None:
+            return
+        if self._map_loaded:
+            self._web.page().runJavaScript(js)
+        else:
+            self._js_queue.append(js)
+
+    def _set_perf_overlay(self, on):
+        # _ensure_viewer applies the checked state to a viewer created later
+        if self.viewer is not None:
+            self.viewer.set_perf_overlay(on)
+
+    def _set_adaptive_quality(self, on):
+        if self.viewer is not None:
+            self.viewer.set_adaptive_quality(on)
+
+    def _set_optimize(self, on):
+        self._obj_loader.optimize = on
+
+    def _set_linked(self, on):
+        if on:
+            self._ensure_map()
+        if self._view_sync is not None:
+            self._view_sync.set_linked(on)
+
+    def _on_map_view_changed(self, zoom, south, west, north, east):
+        if self._tile_service is not None:
+            self._tile_service.prefetch_view(zoom, south, west, north, east)
+        if self._scene is not None:
+            self._scene.set_map_view(zoom, south, west, north, east)
+
+    def _show_tile_stats(self):
+        if self._web is None:
+            self.statusBar().showMessage('The map has not been opened yet', 5000)
+            return
+        if self._tile_service is None:
+            self.statusBar().showMessage('No local tiles (assets/tiles or assets/tiles.mbtiles)', 5000)
+            return
+        st = self._tile_service.stats()
+        msg = (f"Tiles: {st['requests']} requests, hit rate {100 * st['hit_rate']:.1f}%, "
+               f"{st['not_found']} not found, {st['prefetched']} prefetched, "
+               f"latency mean {st['mean_ms']:.2f} ms / p95 {st['p95_ms']:.2f} ms, "
+               f"cache {st['cached_tiles']} tiles ({st['cached_bytes'] / 1e6:.1f} MB)")
+        logging.info(msg)
+        self.statusBar().showMessage(msg, 10000)
+
+    def _export_perf_trace(self):
+        if not perf.enabled():
+            self.statusBar().showMessage('Performance instrumentation is off (View > Performance overlay '
+                                         'or GEORECON_PERF=1)', 5000)
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export performance trace',
+                                                        str(Path.cwd() / 'georecon-trace.json'), 'JSON (*.json)')
+        if not path:
+            return
+        path = Path(path)
+        n = perf.export_chrome_trace(path)
+        perf.export_json(path.with_suffix('.summary.json'))
+        self.statusBar().showMessage(f'{n} events written to {path} (open in chrome://tracing or ui.perfetto.dev)',
+                                     10000)
 
     def _on_load_obj(self):
-        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Open OBJ', str(Path.cwd()), 'OBJ Files (*.obj)')
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Open model', str(Path.cwd()),
+            f'Models (*.obj *{BUNDLE_SUFFIX} *.ply);;OBJ Files (*.obj);;Model bundles (*{BUNDLE_SUFFIX});;'
+            'Point clouds (*.ply)')
         if not path:
             return
-        verts, faces = self._obj_loader.load(path)
+        self._ensure_viewer()
+        # a new load supersedes the running one
+        self._cancel_load()
+        self._close_scene()
+        if Path(path).suffix.lower() == '.ply':
+            self._open_point_cloud(path)
+            return
+        loader = self._obj_loader
+        stream = self._stream_action.isChecked() and not loader.optimize
+        # known bounds (from a bundle header) spare set_mesh/set_lod a pass over the vertices
+        self._load_bounds = None
+        if Path(path).suffix.lower() == BUNDLE_SUFFIX:
+            try:
+                self._load_bounds = ModelBundle(path).bounds
+            except (OSError, ValueError, KeyError) as e:
+                QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
+                return
+            # the whole mesh is mapped at once: nothing to stream
+            loader = self._bundle_loader
+            stream = False
+        self._set_georef(path)
+        if stream:
+            try:
+                self.viewer.begin_stream()
+            except Exception as e:
+                QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
+                return
+        job = MeshLoadJob(loader, path, stream=stream, lod=self._lod_action.isChecked(), pick=True)
+        job.signals.progress.connect(self._on_load_progress)
+        job.signals.finished.connect(self._on_load_finished)
+        job.signals.chunk.connect(self._on_load_chunk)
+        job.signals.stream_finished.connect(self._on_stream_finished)
+        job.signals.lod_ready.connect(self._on_lod_ready)
+        job.signals.bvh_ready.connect(self._on_bvh_ready)
+        job.signals.completed.connect(self._on_load_completed)
+        job.signals.failed.connect(self._on_load_failed)
+        job.signals.cancelled.connect(self._on_load_cancelled)
+        self._load_job = job
+        self._load_progress.setValue(0)
+        self._load_progress.show()
+        self._load_cancel.show()
+        self.statusBar().showMessage(f'Loading {Path(path).name}...')
+        QtCore.QThreadPool.globalInstance().start(job)
+
+    def _on_open_scene(self):
+        directory = QtWidgets.QFileDialog.getExistingDirectory(
+            self, 'Open scene folder (preprocess.py output)', str(Path.cwd()))
+        if not directory:
+            return
+        self._ensure_viewer()
+        self._cancel_load()
+        self._close_scene()
+        from scene_manager import SceneManager
+        scene = SceneManager(self.viewer, budget_bytes=self._scene_budget, obj_loader=self._obj_loader, parent=self)
         try:
-            self.viewer.set_mesh(verts, faces)
+            if not scene.add_directory(directory):
+                raise ValueError(f'No model bundles in {directory} (run preprocess.py first)')
+            scene.start()
+        except Exception as e:
+            scene.close()
+            QtWidgets.QMessageBox.warning(self, 'Scene error', str(e))
+            return
+        self._scene = scene
+        scene.residencyChanged.connect(self._on_scene_residency)
+        self._use_georef(scene.georef)
+        self._show_footprint()
+
+    def _close_scene(self):
+        if self._scene is not None:
+            self._scene.close()
+            self._scene.deleteLater()
+            self._scene = None
+
+    def _on_scene_residency(self):
+        st = self._scene.stats()
+        msg = (f"Scene: {st['resident']}/{st['models']} models resident, {st['loading']} loading, "
+               f"{st['resident_bytes'] / 2 ** 20:.0f} of {st['budget_bytes'] / 2 ** 20:.0f} MB")
+        self.statusBar().showMessage(msg + (' (over budget)' if st['over_budget'] else ''), 5000)
+
+    def _show_scene_stats(self):
+        if self._scene is None:
+            self.statusBar().showMessage('No scene open (File > Open scene folder...)', 5000)
+            return
+        st = self._scene.stats()
+        msg = (f"Scene: {st['models']} models, {st['covered']} in view, {st['resident']} resident, "
+               f"{st['loading']} loading, {st['resident_bytes'] / 2 ** 20:.0f}/{st['budget_bytes'] / 2 ** 20:.0f} MB, "
+               f"{st['loads']} loads, {st['evictions']} evictions, {st['discarded']} discarded, {st['failed']} failed")
+        logging.info(msg)
+        self.statusBar().showMessage(msg, 10000)
+
+    def _open_point_cloud(self, path):
+        # only the header is read here; the overview sample is read on a worker
+        try:
+            cloud = PointCloud(path)
+        except (OSError, ValueError) as e:
+            QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
+            return
+        self._set_georef(path)
+        job = PointSampleJob(cloud, self.viewer.point_budget)
+        job.signals.finished.connect(self._on_points_sampled)
+        job.signals.failed.connect(self._on_load_failed)
+        job.signals.cancelled.connect(self._on_load_cancelled)
+        self._load_job = job
+        self._load_progress.setRange(0, 0)
+        self._load_progress.show()
+        self._load_cancel.show()
+        self.statusBar().showMessage(f'Sampling {len(cloud):,} points of {Path(path).name}...')
+        QtCore.QThreadPool.globalInstance().start(job)
+
+    def _on_points_sampled(self, points, colors):
+        if not self._is_current_load():
+            return
+        cloud = self._load_job.cloud
+        self._on_load_completed()
+        try:
+            self.viewer.set_point_cloud(cloud, points, colors)
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
+            return
+        self._show_footprint()
+        self.statusBar().showMessage(f'{len(cloud):,} points, {len(points):,} shown', 5000)
+
+    def _is_current_load(self):
+        # signals of a superseded job may still be queued; ignore them
+        return self._load_job is not None and self.sender() is self._load_job.signals
+
+    def _cancel_load(self):
+        if self._load_job is not None:
+            self._load_job.cancel()
+            if getattr(self._load_job, 'stream', False):
+                # keep the chunks shown so far but drop the accumulation buffer
+                self.viewer.end_stream()
+            self._load_job = None
+        self._load_progress.setRange(0, 1000)
+        self._load_progress.hide()
+        self._load_cancel.hide()
+        self.statusBar().clearMessage()
+
+    def _on_load_progress(self, done, total):
+        if self._is_current_load() and total:
+            self._load_progress.setValue(int(1000 * done / total))
+
+    def _finish_load_ui(self):
+        # the mesh is shown; the job stays current until LOD/BVH building completes
+        self._load_progress.setRange(0, 0)
+        self.statusBar().showMessage('Building LOD levels and picking index...')
+
+    def _set_georef(self, path):
+        try:
+            geo = Georeference.find_for(path)
+        except Exception as e:
+            logging.warning('Ignoring georeference of %s: %s', path, e)
+            geo = None
+        self._use_georef(geo)
+
+    def _use_georef(self, geo):
+        self._georef = geo
+        if self._view_sync is not None:
+            self._view_sync.set_georef(self._georef)
+        if geo is None:
+            self._model_to_latlon = None
+            return
+
+        def to_latlon(point):
+            lat, lon, _ = geo.local_to_wgs84(point)
+            return float(lat[0]), float(lon[0])
+        self._model_to_latlon = to_latlon
+
+    def _show_footprint(self):
+        bounds = self.viewer.model_bounds()
+        if self._georef is None or bounds is None:
+            return
+        corners = self._georef.footprint(*bounds)
+        self._run_js(f"jsFootprint({json.dumps(corners.tolist())});")
+
+    def _on_load_completed(self):
+        if not self._is_current_load():
+            return
+        self._load_job = None
+        self._load_progress.setRange(0, 1000)
+        self._load_progress.hide()
+        self._load_cancel.hide()
+        self.statusBar().clearMessage()
+
+    def _on_load_finished(self, verts, faces):
+        if not self._is_current_load():
+            return
+        self._finish_load_ui()
+        try:
+            self.viewer.set_mesh(verts, faces, bounds=self._load_bounds)
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
+            return
+        self._show_footprint()
+
+    def _on_load_chunk(self, verts, faces):
+        if not self._is_current_load():
+            return
+        try:
+            self.viewer.append_chunk(verts, faces)
+        except Exception as e:
+            self._cancel_load()
+            QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
+
+    def _on_stream_finished(self):
+        if not self._is_current_load():
+            return
+        self._finish_load_ui()
+        self.viewer.end_stream()
+        self._show_footprint()
+
+    def _on_lod_ready(self, lod):
+        if not self._is_current_load():
+            return
+        try:
+            self.viewer.set_lod(lod, bounds=self._load_bounds)
         except Exception as e:
             QtWidgets.QMessageBox.warning(self, 'Load error', str(e))
 
+    def _on_bvh_ready(self, bvh):
+        if self._is_current_load():
+            self.viewer.set_bvh(bvh)
+
+    def _on_model_picked(self, triangle, point):
+        msg = f"Model picked: triangle {triangle} at ({point[0]:.3f}, {point[1]:.3f}, {point[2]:.3f})"
+        print(msg)
+        logging.info(msg)
+        # model coordinates need a georeference before they can be shown on the map
+        to_latlon = getattr(self, '_model_to_latlon', None)
+        if to_latlon is not None:
+            lat, lon = to_latlon(point)
+            self._highlight_on_map(lat, lon)
+
+    def _on_lod_level_changed(self, level, triangles):
+        budgets = self.viewer.lod_triangle_budgets()
+        self.statusBar().showMessage(f'LOD level {level}/{len(budgets) - 1}: {triangles} triangles', 3000)
+
+    def _on_load_failed(self, message):
+        if not self._is_current_load():
+            return
+        self._cancel_load()
+        QtWidgets.QMessageBox.warning(self, 'Load error', message)
+
+    def _on_load_cancelled(self):
+        if self._is_current_load():
+            self._cancel_load()
+
     def _toggle_devtools(self):
         if getattr(self, '_devtools', None) and not self._devtools.isHidden():
             self._devtools.close()
             self._devtools = None
             return
+        from devtools import DevToolsWindow
         self._devtools = DevToolsWindow(self._web.page(), parent=self._web_window)
         self._devtools.show()
 
     def _do_highlight(self):
-        lat, lon = 31.109995, 121.066074
-        js = f"jsHighlight({lat}, {lon});"
-        self._web.page().runJavaScript(js)
+        self._ensure_map()
+        self._highlight_on_map(31.109995, 121.066074)
+
+    def _overlay_test(self):
+        # random points around the highlight sample; decode/draw times go to the JS console
+        self._ensure_map()
+        rng = np.random.default_rng()
+        points = np.column_stack([31.109995 + rng.normal(0.0, 0.02, 100_000),
+                                  121.066074 + rng.normal(0.0, 0.02, 100_000)])
+        t0 = time.perf_counter()
+        self._bridge.set_layer('overlay-test', 'points', points, style={'color': '#3388ff', 'radius': 2})
+        self.statusBar().showMessage(f'Overlay test: 100000 points packed and sent in '
+                                     f'{1e3 * (time.perf_counter() - t0):.0f} ms', 5000)
+
+    def _highlight_on_map(self, lat, lon):
+        self._run_js(f"jsHighlight({lat}, {lon});")
     
     def _toggle_map_window(self, checked=None):
         # When invoked: if the map window/dock is already visible, do nothing.
         # Otherwise show (or create then show) the map window/dock.
+        if self._web is None:
+            # first use in --lazy mode: _setup_map shows the new window
+            self._ensure_map()
+            return
         try:
             # prefer the separate window
             if getattr(self, '_web_window', None):
@@ -220,6 +827,13 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         logging.info("Main window close event triggered. Cleaning up web engine.")
 
+        # 0. Stop any background mesh load, scene paging and the tile lookups.
+        self._cancel_load()
+        self._close_scene()
+        if getattr(self, '_tile_service', None) is not None:
+            self._tile_service.close()
+            self._tile_service = None
+
         # 1. Clean up the DevTools window if it exists.
         if hasattr(self, '_devtools') and self._devtools:
             self._devtools.close()
@@ -259,14 +873,46 @@ class MainWindow(QtWidgets.QMainWindow):
         super().closeEvent(event)
 
 
-def make_window():
-    app = QtWidgets.QApplication(sys.argv)
+def parse_args(argv):
+    """Application options; unknown arguments are left for Qt."""
+    p = argparse.ArgumentParser(description='GeoReconViewer')
+    p.add_argument('--lazy', action='store_true',
+                   help='show the window first: create the 3D view right after and the map on first use of View > Map; '
+                        'QtWebEngine is not loaded at startup, so local tiles are not served and the map uses '
+                        'online tiles')
+    p.add_argument('--startup-profile', action='store_true', help='log the time spent in each startup phase')
+    p.add_argument('--scene-budget', type=int, default=2048, metavar='MB',
+                   help='memory for resident models of a scene folder (default 2048 MB)')
+    p.add_argument('--frame-target', type=float, default=1000.0 / 30, metavar='MS',
+                   help='frame time the 3D view degrades to while the camera is dragged (default 33.3 ms)')
+    return p.parse_known_args(argv[1:])
+
+
+def make_window(argv=None):
+    argv = sys.argv if argv is None else argv
+    args, qt_args = parse_args(argv)
+    if args.startup_profile:
+        perf.enable()
+        perf.record('startup.imports', _IMPORT_START, _IMPORTS_DONE - _IMPORT_START)
+    # QtWebEngine may be imported after the application exists only with shared GL contexts
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+    if local_tile_store_path() is not None and not args.lazy:
+        with perf.span('startup.register_scheme'):
+            from tile_scheme import register_scheme
+            # custom URL schemes must be known before the application (and web engine) start;
+            # this loads QtWebEngineCore, so --lazy skips it and the map uses online tiles
+            register_scheme()
+    with perf.span('startup.qapplication'):
+        app = QtWidgets.QApplication(argv[:1] + qt_args)
     # QQuickWindow.setGraphicsApi(QSGRendererInterface.GraphicsApi.OpenGL)
-    win = MainWindow()
+    with perf.span('startup.window'):
+        win = MainWindow(lazy=args.lazy, startup_profile=args.startup_profile, scene_budget_mb=args.scene_budget,
+                         frame_target_ms=args.frame_target)
     return app, win
 
 
 if __name__ == "__main__":
     app, win = make_window()
-    win.show()
+    with perf.span('startup.show'):
+        win.show()
     sys.exit(app.exec())
@@ -0,0 +1,62 @@
+"""Pack map overlays (points, polylines, polygons) into compact messages for the web map.
+
+Coordinates travel as base64 float32 lat/lon offsets from a float64
+origin at the layer centre (the float32 step is about 5e-7 degrees, ~5 cm,
+at 5 degrees from the origin: decimetre precision for layers up to ten
+degrees across), feature boundaries as uint32 offsets and feature ids as
+int32. A layer of 100k points is one ~1.5 MB message instead of 100k
+runJavaScript calls; assets/map_overlay.js decodes it into typed arrays and
+draws it on a canvas.
+"""
+import base64
+
+import numpy as np
+
+KINDS = ('points', 'polylines', 'polygons')
+
+
+def _b64(array, dtype):
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode('ascii')
+
+
+def pack_ids(ids):
+    """Feature ids as base64 little-endian int32."""
+    ids = np.asarray(ids).reshape(-1)
+    if ids.size and (not np.issubdtype(ids.dtype, np.integer)
+                     or ids.min() < -(1 << 31) or ids.max() >= (1 << 31)):
+        raise ValueError('feature ids must be integers that fit in int32')
+    return _b64(ids, '<i4')
+
+
+def pack_features(kind, geometry, ids=None):
+    """Message fields for a batch of features of one kind.
+
+    geometry is an (N, 2) lat/lon array for 'points', or a sequence of
+    (Mi, 2) lat/lon arrays for 'polylines' and 'polygons' (rings need not
+    be closed). ids are N integer feature ids, default 0..N-1.
+    """
+    if kind not in KINDS:
+        raise ValueError(f'unknown overlay kind {kind!r} (expected one of {KINDS})')
+    if kind == 'points':
+        coords = np.asarray(geometry, dtype=np.float64).reshape(-1, 2)
+        n = len(coords)
+        parts = None
+    else:
+        arrays = [np.asarray(g, dtype=np.float64).reshape(-1, 2) for g in geometry]
+        n = len(arrays)
+        parts = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(a) for a in arrays], out=parts[1:])
+        coords = np.concatenate(arrays) if arrays else np.empty((0, 2))
+    ids = np.arange(n) if ids is None else np.asarray(ids).reshape(-1)
+    if len(ids) != n:
+        raise ValueError(f'{len(ids)} ids for {n} features')
+    if not np.isfinite(coords).all():
+        raise ValueError('overlay coordinates must be finite')
+    origin = (coords.min(axis=0) + coords.max(axis=0)) / 2.0 if len(coords) else np.zeros(2)
+    msg = {'kind': kind, 'count': n, 'origin': origin.tolist(),
+           'coords': _b64(coords - origin, '<f4'), 'ids': pack_ids(ids)}
+    if parts is not None:
+        if parts[-1] >= 1 << 32:
+            raise ValueError('too many vertices in one message')
+        msg['parts'] = _b64(parts, '<u4')
+    return msg
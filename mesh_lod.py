@@ -0,0 +1,148 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _compact(verts, faces):
+    """Drop vertices no face references and renumber the faces."""
+    used, inv = np.unique(faces, return_inverse=True)
+    return verts[used], inv.astype(faces.dtype, copy=False).reshape(-1, 3)
+
+
+def cluster_decimate(verts, faces, cell):
+    """Simplify a mesh by vertex clustering on a uniform grid of the given cell size.
+
+    All vertices of a cell collapse to their mean; triangles that become
+    degenerate or duplicated are removed.
+    """
+    verts = np.asarray(verts)
+    faces = np.asarray(faces)
+    q = np.floor((verts - verts.min(axis=0)) / cell).astype(np.int64)
+    dims = q.max(axis=0) + 1
+    key = (q[:, 0] * dims[1] + q[:, 1]) * dims[2] + q[:, 2]
+    _, inv = np.unique(key, return_inverse=True)
+    counts = np.bincount(inv)
+    new_v = np.empty((len(counts), 3), dtype=verts.dtype)
+    for k in range(3):
+        new_v[:, k] = np.bincount(inv, weights=verts[:, k]) / counts
+
+    new_f = inv.astype(faces.dtype, copy=False)[faces]
+    keep = ((new_f[:, 0] != new_f[:, 1]) & (new_f[:, 1] != new_f[:, 2])
+            & (new_f[:, 0] != new_f[:, 2]))
+    new_f = new_f[keep]
+    if len(new_f) == 0:
+        return np.empty((0, 3), dtype=verts.dtype), np.empty((0, 3), dtype=faces.dtype)
+    # the same cluster triple can come from many source triangles; keep one
+    rows = np.ascontiguousarray(np.sort(new_f, axis=1))
+    _, first = np.unique(rows.view([('', rows.dtype)] * 3).ravel(), return_index=True)
+    new_f = new_f[np.sort(first)]
+    return _compact(new_v, new_f)
+
+
+def mean_edge_length(verts, faces, sample=100000):
+    faces = np.asarray(faces)
+    if len(faces) > sample:
+        faces = faces[np.linspace(0, len(faces) - 1, sample).astype(np.int64)]
+    v = np.asarray(verts)
+    e = np.linalg.norm(v[faces[:, 0]] - v[faces[:, 1]], axis=1)
+    return float(e.mean()) if e.size else 0.0
+
+
+class LodPyramid:
+    """Decimated versions of a mesh, from full resolution (level 0) to coarse.
+
+    Each level records the clustering cell size that produced it (0 for the
+    original), which is the geometric error the viewer compares against the
+    size of a screen pixel.
+
+    Usage:
+        lod = LodPyramid.build(verts, faces)
+        lod.triangle_counts  # budget per level
+        level = lod.select(pixel_world_size)
+    """
+
+    def __init__(self, levels, cell_sizes):
+        self.levels = list(levels)
+        self.cell_sizes = [float(c) for c in cell_sizes]
+
+    @property
+    def triangle_counts(self):
+        return [len(f) for _, f in self.levels]
+
+    def __len__(self):
+        return len(self.levels)
+
+    @classmethod
+    def build(cls, verts, faces, ratio=4.0, min_triangles=20000, max_levels=6):
+        """Build levels with roughly 1/ratio the triangles of the previous one."""
+        levels = [(verts, faces)]
+        cells = [0.0]
+        cell = mean_edge_length(verts, faces)
+        if cell <= 0:
+            return cls(levels, cells)
+        cur_v, cur_f = np.asarray(verts), np.asarray(faces)
+        while len(levels) < max_levels and len(cur_f) / ratio >= min_triangles:
+            target = len(cur_f) / ratio
+            # triangle count of a surface scales with 1 / cell^2
+            cell *= np.sqrt(ratio)
+            v, f = cluster_decimate(cur_v, cur_f, cell)
+            if len(f) > 0.75 * len(cur_f):
+                cell *= np.sqrt(len(f) / target)
+                v, f = cluster_decimate(cur_v, cur_f, cell)
+            if len(f) == 0 or len(f) >= len(cur_f):
+                break
+            levels.append((v, f))
+            cells.append(cell)
+            cur_v, cur_f = v, f
+        logger.info('Built LOD pyramid with triangle counts %s', [len(f) for _, f in levels])
+        return cls(levels, cells)
+
+    @classmethod
+    def load_or_build(cls, verts, faces, cache=None, path=None, **kwargs):
+        """Reuse levels stored in a MeshCache entry for path, building and storing them on a miss."""
+        if cache is not None and path is not None:
+            lod = cls.load(cache, path, verts, faces)
+            if lod is not None:
+                return lod
+        lod = cls.build(verts, faces, **kwargs)
+        if cache is not None and path is not None:
+            try:
+                lod.save(cache, path)
+            except Exception as e:
+                logger.warning('Could not cache LOD levels for %s: %s', path, e)
+        return lod
+
+    def save(self, cache, path):
+        for i, (v, f) in enumerate(self.levels[1:], start=1):
+            cache.put_extra(path, f'lod{i}_verts', v)
+            cache.put_extra(path, f'lod{i}_faces', f)
+        # written last: its presence marks the level arrays as complete
+        cache.put_extra(path, 'lod_cells', np.asarray(self.cell_sizes))
+
+    @classmethod
+    def load(cls, cache, path, verts, faces):
+        cells = cache.get_extra(path, 'lod_cells')
+        if cells is None:
+            return None
+        levels = [(verts, faces)]
+        for i in range(1, len(cells)):
+            v = cache.get_extra(path, f'lod{i}_verts')
+            f = cache.get_extra(path, f'lod{i}_faces')
+            if v is None or f is None:
+                return None
+            levels.append((v, f))
+        return cls(levels, cells)
+
+    def select(self, pixel_size, tolerance=1.5):
+        """Coarsest level whose geometric error stays below tolerance pixels.
+
+        pixel_size is the world-space size of one screen pixel at the model,
+        in the mesh's own units.
+        """
+        best = 0
+        for i, cell in enumerate(self.cell_sizes):
+            if cell <= tolerance * pixel_size:
+                best = i
+        return best
@@ -0,0 +1,207 @@
+"""Preprocessed model bundles: one binary file per model that the viewer maps instead of parsing.
+
+Layout: an 8-byte magic, a little-endian uint32 header length, a UTF-8 JSON
+header and the raw arrays, each aligned to 64 bytes. The header lists every
+array (dtype, shape, offset) and model metadata (source, bounds, counts).
+
+Arrays:
+  verts, faces                  the full-resolution mesh, as ObjLoader returns it
+  normals                       area-weighted vertex normals, int8 (x127), optional
+  lod<i>_verts, lod<i>_faces    LodPyramid levels 1..n, with lod_cells (optional)
+  bvh_order, bvh_leaf_min,      TriangleBVH leaves for picking, with bvh_meta (optional)
+  bvh_leaf_max
+
+The LOD and BVH arrays use the MeshCache extra names, so BundleLoader can
+hand them to LodPyramid.load_or_build / TriangleBVH.load_or_build unchanged.
+Bundles are written by preprocess.py.
+
+Usage:
+    bundle = ModelBundle('out/scan.grb')
+    verts, faces = bundle.verts, bundle.faces   # memory-mapped
+    job = MeshLoadJob(BundleLoader(), 'out/scan.grb', lod=True, pick=True)
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'GRBUNDLE'
+VERSION = 1
+SUFFIX = '.grb'
+ALIGN = 64
+
+
+def _pad(n):
+    return -n % ALIGN
+
+
+def vertex_normals(verts, faces):
+    """Unit area-weighted vertex normals (float32); zero for unreferenced vertices."""
+    v = np.asarray(verts, dtype=np.float64)
+    f = np.asarray(faces)
+    # cross product length is twice the triangle area: larger faces weigh more
+    n = np.cross(v[f[:, 1]] - v[f[:, 0]], v[f[:, 2]] - v[f[:, 0]])
+    out = np.empty((len(v), 3), dtype=np.float64)
+    for axis in range(3):
+        out[:, axis] = np.bincount(f.ravel(), weights=np.repeat(n[:, axis], 3), minlength=len(v))
+    length = np.linalg.norm(out, axis=1)
+    length[length == 0] = 1.0
+    return (out / length[:, None]).astype(np.float32)
+
+
+def encode_normals(normals):
+    return np.round(np.clip(normals, -1.0, 1.0) * 127.0).astype(np.int8)
+
+
+def decode_normals(packed):
+    n = np.asarray(packed, dtype=np.float32) / 127.0
+    length = np.linalg.norm(n, axis=1)
+    length[length == 0] = 1.0
+    return n / length[:, None]
+
+
+def write_bundle(path, arrays, meta=None):
+    """Write arrays (name -> ndarray) and meta atomically to path; returns the blake2b-16 hex digest of the file."""
+    path = Path(path)
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    specs = {}
+    # offsets relative to the end of the header; fixed up below
+    offset = 0
+    for name, a in arrays.items():
+        specs[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset += a.nbytes + _pad(a.nbytes)
+    header = {'version': VERSION, 'meta': meta or {}, 'arrays': specs}
+    # the header length depends on the offsets it contains: reserve room for their digits
+    start = len(json.dumps(header).encode('utf-8')) + 20 * len(specs) + 64
+    start += _pad(len(MAGIC) + 4 + start)
+    data_start = len(MAGIC) + 4 + start
+    for spec in specs.values():
+        spec['offset'] += data_start
+    text = json.dumps(header).encode('utf-8')
+    assert len(text) <= start
+    text += b' ' * (start - len(text))
+    h = hashlib.blake2b(digest_size=16)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.tmp-', suffix=SUFFIX, dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            def put(b):
+                f.write(b)
+                h.update(b)
+            put(MAGIC + start.to_bytes(4, 'little') + text)
+            for a in arrays.values():
+                put(memoryview(a).cast('B') if a.nbytes else b'')
+                put(b'\0' * _pad(a.nbytes))
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return h.hexdigest()
+
+
+def file_digest(path, block=1 << 22):
+    """blake2b-16 hex digest of a whole file (the catalog checksum of a bundle)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class ModelBundle:
+    """A bundle file opened for reading; arrays are memory-mapped on access."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with self.path.open('rb') as f:
+            head = f.read(len(MAGIC) + 4)
+            if len(head) < len(MAGIC) + 4 or head[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{self.path} is not a model bundle')
+            header = json.loads(f.read(int.from_bytes(head[len(MAGIC):], 'little')))
+        if header.get('version') != VERSION:
+            raise ValueError(f'{self.path}: unsupported bundle version {header.get("version")}')
+        self.meta = header['meta']
+        self._specs = header['arrays']
+        self._arrays = {}
+
+    def __contains__(self, name):
+        return name in self._specs
+
+    def names(self):
+        return list(self._specs)
+
+    def array(self, name):
+        """Read-only memory map of an array, or None if the bundle has no such array."""
+        spec = self._specs.get(name)
+        if spec is None:
+            return None
+        a = self._arrays.get(name)
+        if a is None:
+            shape = tuple(spec['shape'])
+            if 0 in shape:
+                a = np.empty(shape, dtype=np.dtype(spec['dtype']))
+            else:
+                a = np.memmap(self.path, dtype=np.dtype(spec['dtype']), mode='r', offset=spec['offset'], shape=shape)
+            self._arrays[name] = a
+        return a
+
+    @property
+    def verts(self):
+        return self.array('verts')
+
+    @property
+    def faces(self):
+        return self.array('faces')
+
+    @property
+    def bounds(self):
+        """(min, max) of the full-resolution vertices, from the header."""
+        lo, hi = self.meta['bounds']
+        return np.asarray(lo, dtype=np.float64), np.asarray(hi, dtype=np.float64)
+
+    def normals(self):
+        """Unit vertex normals (float32), or None if the bundle was written without them."""
+        packed = self.array('normals')
+        return None if packed is None else decode_normals(packed)
+
+
+class BundleLoader:
+    """ObjLoader stand-in for MeshLoadJob that opens bundles instead of parsing OBJ text.
+
+    It is also its own `cache`: get_extra serves the LOD levels and BVH stored
+    in the bundle under their MeshCache names, and put_extra stores nothing.
+    """
+
+    def __init__(self):
+        self.cache = self
+        self._open = {}
+
+    def bundle(self, path):
+        key = str(Path(path).resolve())
+        b = self._open.get(key)
+        if b is None:
+            b = self._open[key] = ModelBundle(path)
+        return b
+
+    def load(self, path, progress=None, cancel=None):
+        # reopened on every load in case the bundle was rebuilt
+        b = self._open[str(Path(path).resolve())] = ModelBundle(path)
+        if progress is not None:
+            size = Path(path).stat().st_size
+            progress(size, size)
+        return b.verts, b.faces
+
+    def iter_chunks(self, path, progress=None, cancel=None):
+        yield self.load(path, progress, cancel)
+
+    def get_extra(self, path, name):
+        return self.bundle(path).array(name)
+
+    def put_extra(self, path, name, array):
+        return False
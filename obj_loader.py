@@ -1,33 +1,486 @@
 from pathlib import Path
+import hashlib
+import json
 import logging
+import os
+import shutil
+import tempfile
 import numpy as np
 
+import perf
+from mesh_optimize import format_report, optimize_mesh
+
 logger = logging.getLogger(__name__)
 
+_NL = 10
+_SPACE = 32
+_SLASH = 47
+_HASH = 35
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[[9, 10, 13, 32]] = True
+_BLANK = np.zeros(256, dtype=bool)
+_BLANK[[9, 32]] = True
+
+
+def _gather_records(chars, starts, lengths, sel):
+    """Copy the selected lines into one buffer with their record tag and inline comments blanked out.
+
+    Returns the buffer and the offset of every record inside it.
+    """
+    buf = chars[np.repeat(sel, lengths)]
+    rec_len = lengths[sel]
+    rec_start = np.cumsum(rec_len) - rec_len
+    buf[rec_start] = _SPACE
+    hashes = np.flatnonzero(buf == _HASH)
+    if hashes.size:
+        # blank from the first '#' of a record to its end (`v 0 0 0 # note`)
+        rec = np.searchsorted(rec_start, hashes, 'right') - 1
+        first = np.ones(len(rec), dtype=bool)
+        first[1:] = rec[1:] != rec[:-1]
+        rec = rec[first]
+        edges = np.zeros(len(buf) + 1, dtype=np.int64)
+        np.add.at(edges, hashes[first], 1)
+        np.add.at(edges, rec_start[rec] + rec_len[rec], -1)
+        buf[np.cumsum(edges[:-1]) > 0] = _SPACE
+    return buf, rec_start
+
+
+def _token_starts(buf):
+    space = _WHITESPACE[buf]
+    starts = ~space
+    starts[1:] &= space[:-1]
+    return np.flatnonzero(starts)
+
+
+def _parse_vertices(buf, rec_start, dtype):
+    """Parse `v` records into an (N, 3) array plus a mask of the records kept."""
+    tok = _token_starts(buf)
+    counts = np.bincount(np.searchsorted(rec_start, tok, 'right') - 1, minlength=len(rec_start))
+    nums = np.fromstring(buf.tobytes(), dtype=np.float64, sep=' ')
+    if nums.size != tok.size:
+        raise ValueError('malformed vertex record')
+    # extra columns (w or per-vertex colors) are ignored; short records are skipped
+    keep = counts >= 3
+    first = (np.cumsum(counts) - counts)[keep]
+    return nums[first[:, None] + np.arange(3)].astype(dtype, copy=False), keep
+
+
+def _parse_face_indices(buf, rec_start):
+    """Parse `f` records into a flat array of 1-based position indices and per-record counts."""
+    tok = _token_starts(buf)
+    counts = np.bincount(np.searchsorted(rec_start, tok, 'right') - 1, minlength=len(rec_start))
+    slash = np.flatnonzero(buf == _SLASH)
+    if slash.size == 0:
+        nums = np.fromstring(buf.tobytes(), dtype=np.int64, sep=' ')
+        if nums.size != tok.size:
+            raise ValueError('malformed face record')
+        return nums, counts
+
+    # `v/vt/vn`, `v//vn`, `v/vt`: split on slashes and keep the first number of every token
+    double = slash[buf[slash + 1] == _SLASH]
+    per_tok = (1 + np.bincount(np.searchsorted(tok, slash, 'right') - 1, minlength=tok.size)
+               - np.bincount(np.searchsorted(tok, double, 'right') - 1, minlength=tok.size))
+    nums = np.fromstring(buf.tobytes().replace(b'/', b' '), dtype=np.int64, sep=' ')
+    if nums.size != per_tok.sum():
+        raise ValueError('malformed face record')
+    return nums[np.cumsum(per_tok) - per_tok], counts
+
+
+def _triangulate(idx, counts, dtype):
+    """Fan-triangulate polygons given as a flat index array and per-polygon vertex counts."""
+    ntris = np.maximum(counts - 2, 0)
+    total = int(ntris.sum())
+    first = np.repeat(np.cumsum(counts) - counts, ntris)
+    local = np.arange(total) - np.repeat(np.cumsum(ntris) - ntris, ntris)
+    tris = np.empty((total, 3), dtype=dtype)
+    tris[:, 0] = idx[first]
+    tris[:, 1] = idx[first + local + 1]
+    tris[:, 2] = idx[first + local + 2]
+    return tris
+
+
+def parse_block(block, nverts_before=0, vertex_dtype=np.float32, index_dtype=np.uint32):
+    """Parse the `v` and `f` records of a chunk of OBJ text ending on a line boundary.
+
+    nverts_before is the number of vertices defined earlier in the file and is
+    used to resolve negative (relative) face indices. Numbers are parsed at
+    double precision and only the block's result is narrowed to vertex_dtype.
+    """
+    chars = np.frombuffer(block, dtype=np.uint8)
+    nl = np.flatnonzero(chars == _NL)
+    starts = np.concatenate(([0], nl[:-1] + 1))
+    lengths = nl - starts + 1
+    tag = chars[starts]
+    after = chars[np.minimum(starts + 1, len(chars) - 1)]
+    is_v = (tag == ord('v')) & _BLANK[after]
+    is_f = (tag == ord('f')) & _BLANK[after]
+
+    verts = np.empty((0, 3), dtype=vertex_dtype)
+    valid_v = np.zeros(len(starts), dtype=bool)
+    if is_v.any():
+        buf, rec_start = _gather_records(chars, starts, lengths, is_v)
+        verts, keep = _parse_vertices(buf, rec_start, vertex_dtype)
+        valid_v[is_v] = keep
+
+    faces = np.empty((0, 3), dtype=index_dtype)
+    if is_f.any():
+        buf, rec_start = _gather_records(chars, starts, lengths, is_f)
+        idx, counts = _parse_face_indices(buf, rec_start)
+        # OBJ indices are 1-based; negative ones count back from the last vertex seen so far
+        neg = idx < 0
+        if neg.any():
+            seen = nverts_before + np.cumsum(valid_v)[is_f]
+            idx = np.where(neg, np.repeat(seen, counts) + idx, idx - 1)
+        else:
+            idx -= 1
+        if idx.size and (idx.min() < 0 or idx.max() > np.iinfo(index_dtype).max):
+            raise ValueError('face index out of range')
+        faces = _triangulate(idx, counts, index_dtype)
+    return verts, faces
+
+
+class LoadCancelled(Exception):
+    """Raised by ObjLoader.load when its cancel event is set."""
+
+
+def default_cache_dir():
+    env = os.environ.get('GEORECON_CACHE_DIR')
+    if env:
+        return Path(env)
+    return Path.home() / '.cache' / 'GeoReconViewer' / 'meshes'
+
+
+def file_fingerprint(path, block=1 << 22):
+    """blake2b-16 hex digest of a file's size and whole content.
+
+    Hashing reads the file once, which is still several times faster than
+    parsing it; any sampled shortcut would miss same-size edits.
+    """
+    path = Path(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(path.stat().st_size).encode())
+    with path.open('rb') as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class MeshCache:
+    """On-disk cache of parsed meshes stored as memory-mappable .npy files.
+
+    Each source file gets a directory named after the hash of its resolved path
+    holding `verts.npy`, `faces.npy` and a `header.json` recording the source
+    size, mtime and content fingerprint (a hash of the whole file). An entry is
+    reused while size and mtime match; if only the mtime changed (file copied or
+    touched) the file is hashed again and the fingerprint decides. Least
+    recently used entries are evicted once the cache grows past max_bytes.
+
+    Usage:
+        loader = ObjLoader(cache=MeshCache())
+    """
+    # 3: fingerprints hash the whole file (older entries used sampled fingerprints)
+    version = 3
+
+    def __init__(self, cache_dir=None, max_bytes=4 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self.max_bytes = int(max_bytes)
+
+    def _entry_dir(self, path):
+        key = hashlib.sha1(str(Path(path).resolve()).encode('utf-8')).hexdigest()
+        return self.cache_dir / key
+
+    @staticmethod
+    def _read_header(entry):
+        try:
+            return json.loads((entry / 'header.json').read_text())
+        except Exception:
+            return None
+
+    def _valid_entry(self, path):
+        """Entry directory for path if it is still up to date with the source, else None."""
+        entry = self._entry_dir(path)
+        header = self._read_header(entry)
+        if header is None or header.get('version') != self.version:
+            return None
+        st = path.stat()
+        if header.get('size') != st.st_size:
+            self.invalidate(path)
+            return None
+        if header.get('mtime_ns') != st.st_mtime_ns:
+            if header.get('fingerprint') != file_fingerprint(path):
+                self.invalidate(path)
+                return None
+            header['mtime_ns'] = st.st_mtime_ns
+            (entry / 'header.json').write_text(json.dumps(header))
+        return entry
+
+    @perf.timed('cache.get')
+    def get(self, path, variant=None):
+        """Return memory-mapped (verts, faces) for path, or None on a miss.
+
+        variant names how the arrays were post-processed (see ObjLoader.optimize);
+        an entry stored under another variant is a miss.
+        """
+        path = Path(path)
+        entry = self._valid_entry(path)
+        if entry is None or (self._read_header(entry) or {}).get('variant') != variant:
+            return None
+        try:
+            verts = np.load(entry / 'verts.npy', mmap_mode='r')
+            faces = np.load(entry / 'faces.npy', mmap_mode='r')
+        except Exception as e:
+            logger.warning('Discarding unreadable mesh cache entry %s: %s', entry, e)
+            self.invalidate(path)
+            return None
+        # the header mtime is the LRU timestamp
+        os.utime(entry / 'header.json')
+        return verts, faces
+
+    def put(self, path, verts, faces, variant=None):
+        """Store parsed arrays for path, replacing any previous entry (and its extras)."""
+        path = Path(path)
+        st = path.stat()
+        header = {
+            'version': self.version,
+            'source': str(path.resolve()),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'fingerprint': file_fingerprint(path),
+            'nbytes': int(verts.nbytes + faces.nbytes),
+            'variant': variant,
+        }
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = self._entry_dir(path)
+        # write into a temp dir and rename so readers never see half-written entries
+        tmp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir))
+        try:
+            np.save(tmp / 'verts.npy', np.ascontiguousarray(verts))
+            np.save(tmp / 'faces.npy', np.ascontiguousarray(faces))
+            (tmp / 'header.json').write_text(json.dumps(header))
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+
+    def get_extra(self, path, name):
+        """Return a memory-mapped derived array (e.g. a LOD level) stored with path's entry."""
+        path = Path(path)
+        entry = self._valid_entry(path)
+        if entry is None or not (entry / f'{name}.npy').is_file():
+            return None
+        try:
+            return np.load(entry / f'{name}.npy', mmap_mode='r')
+        except Exception:
+            return None
+
+    def put_extra(self, path, name, array):
+        """Store a derived array next to path's cached mesh; no-op if the mesh is not cached."""
+        path = Path(path)
+        entry = self._valid_entry(path)
+        if entry is None:
+            return False
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', suffix='.npy', dir=entry)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, entry / f'{name}.npy')
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        os.utime(entry / 'header.json')
+        self.evict()
+        return True
+
+    def invalidate(self, path):
+        shutil.rmtree(self._entry_dir(path), ignore_errors=True)
+
+    def entries(self):
+        """List (entry_dir, nbytes, last_used) for every cache entry."""
+        out = []
+        if not self.cache_dir.is_dir():
+            return out
+        for entry in self.cache_dir.iterdir():
+            header_path = entry / 'header.json'
+            if entry.name.startswith('.') or not header_path.is_file():
+                continue
+            nbytes = sum(p.stat().st_size for p in entry.iterdir())
+            out.append((entry, nbytes, header_path.stat().st_mtime))
+        return out
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        for entry, nbytes, _ in entries:
+            if total <= self.max_bytes:
+                break
+            logger.info('Evicting mesh cache entry %s (%d bytes)', entry, nbytes)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= nbytes
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
 
 class ObjLoader:
     """Minimal OBJ loader that returns vertices and triangular faces as numpy arrays.
 
+    The file is read in large binary blocks and the `v`/`f` records of each block
+    are converted in bulk with numpy instead of line by line. With a MeshCache
+    attached, previously parsed files are memory-mapped from the cache instead.
+
+    Vertices come back as float32 and indices as uint32, the layout pyqtgraph
+    uploads to GL, so they reach MeshData without conversion copies. Set
+    vertex_dtype to np.float64 for coordinates that need double precision.
+
+    With optimize=True parsed meshes go through mesh_optimize.optimize_mesh
+    (welding within weld_tolerance, degenerate/unreferenced removal, Morton
+    order) and the cache stores the optimized arrays. iter_chunks then
+    yields the whole mesh at once.
+
     Usage:
         verts, faces = ObjLoader().load(path)
+        verts, faces = ObjLoader(cache=MeshCache()).load(path)
+        verts, faces = ObjLoader(optimize=True, weld_tolerance=1e-4).load(path)
     """
-    def load(self, path):
+    block_size = 16 * 1024 * 1024
+    vertex_dtype = np.float32
+    index_dtype = np.uint32
+
+    def __init__(self, block_size=None, cache=None, vertex_dtype=None, optimize=False, weld_tolerance=0.0):
+        if block_size is not None:
+            self.block_size = int(block_size)
+        if vertex_dtype is not None:
+            self.vertex_dtype = np.dtype(vertex_dtype).type
+        self.cache = cache
+        self.optimize = optimize
+        self.weld_tolerance = float(weld_tolerance)
+
+    def _variant(self):
+        return f'optimized:{self.weld_tolerance!r}' if self.optimize else None
+
+    def _cached(self, path, progress):
+        try:
+            hit = self.cache.get(path, self._variant())
+        except Exception as e:
+            logger.warning('Mesh cache lookup failed for %s: %s', path, e)
+            hit = None
+        if hit is not None and hit[0].dtype != self.vertex_dtype:
+            hit = None
+        if hit is not None:
+            logger.info('Loaded %s from mesh cache', path)
+            if progress is not None:
+                size = path.stat().st_size
+                progress(size, size)
+        return hit
+
+    def _put_cache(self, path, verts, faces):
+        try:
+            self.cache.put(path, verts, faces, self._variant())
+        except Exception as e:
+            logger.warning('Could not write mesh cache for %s: %s', path, e)
+
+    def iter_blocks(self, path):
+        """Yield chunks of the file that always end on a line boundary."""
+        with Path(path).open('rb') as f:
+            rest = b''
+            while True:
+                data = f.read(self.block_size)
+                if not data:
+                    break
+                data = rest + data
+                cut = data.rfind(b'\n') + 1
+                rest = data[cut:]
+                if cut:
+                    yield data[:cut]
+            if rest:
+                yield rest + b'\n'
+
+    def load(self, path, progress=None, cancel=None):
+        """Load (verts, faces) from path.
+
+        progress: optional callable(bytes_read, total_bytes) invoked after each block.
+        cancel: optional threading.Event; when set, parsing stops with LoadCancelled.
+        """
+        path = Path(path)
+        if self.cache is not None:
+            hit = self._cached(path, progress)
+            if hit is not None:
+                return hit
+
+        verts, faces = self.parse(path, progress=progress, cancel=cancel)
+        if self.optimize and len(verts) and len(faces):
+            with perf.span('mesh.optimize', faces=len(faces)):
+                verts, faces, report = optimize_mesh(verts, faces, self.weld_tolerance)
+            logger.info('Optimized %s: %s', path.name, format_report(report))
+        if self.cache is not None and len(verts) and len(faces):
+            self._put_cache(path, verts, faces)
+        return verts, faces
+
+    def iter_chunks(self, path, progress=None, cancel=None):
+        """Yield (verts, faces) chunks as the file is parsed, one per block.
+
+        Face indices are global (they may reference vertices of earlier chunks).
+        A cache hit yields the whole mesh as a single chunk; a full parse is
+        written to the cache once the last chunk has been produced. With
+        optimize the mesh is only complete after the last block, so it comes
+        as a single chunk too.
+        """
+        path = Path(path)
+        if self.optimize:
+            yield self.load(path, progress, cancel)
+            return
+        if self.cache is not None:
+            hit = self._cached(path, progress)
+            if hit is not None:
+                yield hit
+                return
+
+        verts = []
+        faces = []
+        for v, f in self._iter_blocks_parsed(path, progress, cancel):
+            if self.cache is not None:
+                verts.append(v)
+                faces.append(f)
+            yield v, f
+        if self.cache is not None and verts and faces:
+            verts = np.concatenate(verts)
+            faces = np.concatenate(faces)
+            if len(verts) and len(faces):
+                self._put_cache(path, verts, faces)
+
+    def _iter_blocks_parsed(self, path, progress=None, cancel=None):
+        total = Path(path).stat().st_size
+        done = 0
+        nverts = 0
+        for block in self.iter_blocks(path):
+            if cancel is not None and cancel.is_set():
+                raise LoadCancelled(str(path))
+            with perf.span('obj.parse_block', bytes=len(block)):
+                v, f = parse_block(block, nverts, self.vertex_dtype, self.index_dtype)
+            nverts += len(v)
+            done = min(total, done + len(block))
+            if progress is not None:
+                progress(done, total)
+            yield v, f
+
+    @perf.timed('obj.parse')
+    def parse(self, path, progress=None, cancel=None):
+        """Parse the OBJ text, bypassing any cache."""
         path = Path(path)
         verts = []
         faces = []
-        with path.open('r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                if line.startswith('v '):
-                    parts = line.strip().split()
-                    if len(parts) >= 4:
-                        verts.append([float(parts[1]), float(parts[2]), float(parts[3])])
-                elif line.startswith('f '):
-                    parts = line.strip().split()[1:]
-                    face = [int(p.split('/')[0]) - 1 for p in parts if p]
-                    if len(face) >= 3:
-                        for i in range(1, len(face)-1):
-                            faces.append([face[0], face[i], face[i+1]])
+        for v, f in self._iter_blocks_parsed(path, progress, cancel):
+            verts.append(v)
+            faces.append(f)
 
+        verts = np.concatenate(verts) if verts else np.empty((0, 3), dtype=self.vertex_dtype)
+        faces = np.concatenate(faces) if faces else np.empty((0, 3), dtype=self.index_dtype)
         if len(verts) == 0 or len(faces) == 0:
             logger.warning('OBJ %s contains no geometry (verts=%d, faces=%d)', path, len(verts), len(faces))
-        return np.array(verts), np.array(faces)
+        return verts, faces
@@ -0,0 +1,211 @@
+"""Lightweight timing and metrics for hot paths, with JSON and Chrome-trace export.
+
+Instrumentation is off by default and then costs one flag check per call:
+span() hands back a shared no-op context manager and timed() calls the
+function straight through. When enabled (perf.enable(), or the environment
+variable GEORECON_PERF=1) every span is recorded with its thread, and per-
+name statistics (count, total, recent durations for percentiles) are kept.
+
+Usage:
+    import perf
+    with perf.span('obj.parse', path=str(path)):
+        ...
+    @perf.timed('tile.fetch')
+    def fetch(...): ...
+    perf.gauge('viewer.triangles', n)
+    perf.export_chrome_trace('trace.json')   # chrome://tracing or ui.perfetto.dev
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_enabled = os.environ.get('GEORECON_PERF', '') not in ('', '0')
+_lock = threading.Lock()
+# (name, start s, duration s, thread id, args) of recent spans
+_events = deque(maxlen=200_000)
+# (name, time s, value) of recent gauge samples
+_samples = deque(maxlen=50_000)
+# per name; 'starts' holds recent start times (frame rates up to 2000/s over frame_stats' window)
+_stats = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0, 'recent': deque(maxlen=1000),
+                              'starts': deque(maxlen=4096)})
+_gauges = {}
+_epoch = time.perf_counter()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def span(name, **args):
+    """Context manager timing a block under name (args go to the trace)."""
+    if not _enabled:
+        return _NULL
+    return _Span(name, args)
+
+
+def timed(name):
+    """Decorator timing every call of a function under name."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*a, **kw):
+            if not _enabled:
+                return fn(*a, **kw)
+            start = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                record(name, start, time.perf_counter() - start)
+        return inner
+    return wrap
+
+
+def record(name, start, duration, args=None):
+    """Record a finished span; start is a time.perf_counter() value."""
+    if not _enabled:
+        return
+    with _lock:
+        _events.append((name, start, duration, threading.get_ident(), args))
+        st = _stats[name]
+        st['count'] += 1
+        st['total'] += duration
+        st['max'] = max(st['max'], duration)
+        st['recent'].append(duration)
+        st['starts'].append(start)
+
+
+def gauge(name, value):
+    """Record the current value of a metric (triangle count, memory, ...)."""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+        _samples.append((name, time.perf_counter(), value))
+
+
+def rss_bytes():
+    """Resident memory of this process in bytes, or None if unknown."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    if not values:
+        return {q: 0.0 for q in qs}
+    v = sorted(values)
+    return {q: v[min(len(v) - 1, int(q / 100.0 * len(v)))] for q in qs}
+
+
+def summary():
+    """Per-span statistics (ms) and the latest gauge values."""
+    with _lock:
+        stats = {name: dict(st, recent=list(st['recent'])) for name, st in _stats.items()}
+        gauges = dict(_gauges)
+    out = {}
+    for name, st in stats.items():
+        p = percentiles(st['recent'])
+        out[name] = {'count': st['count'], 'total_ms': 1e3 * st['total'],
+                     'mean_ms': 1e3 * st['total'] / st['count'], 'max_ms': 1e3 * st['max'],
+                     'p50_ms': 1e3 * p[50], 'p95_ms': 1e3 * p[95], 'p99_ms': 1e3 * p[99]}
+    return {'spans': out, 'gauges': gauges}
+
+
+def frame_stats(name='frame', window=2.0):
+    """FPS over the last window seconds and frame time percentiles (ms) of spans named name."""
+    now = time.perf_counter()
+    # only this name's recent starts are read under the lock, newest first until outside the window
+    frames = 0
+    with _lock:
+        st = _stats.get(name)
+        recent = list(st['recent']) if st is not None else []
+        if st is not None:
+            for start in reversed(st['starts']):
+                if now - start > window:
+                    break
+                frames += 1
+    p = percentiles(recent)
+    return {'fps': frames / window, 'p50_ms': 1e3 * p[50], 'p95_ms': 1e3 * p[95], 'p99_ms': 1e3 * p[99]}
+
+
+def events(prefix=''):
+    """Recorded spans (name, start, duration, thread id, args) whose name starts with prefix, oldest first."""
+    with _lock:
+        return [e for e in _events if e[0].startswith(prefix)]
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _samples.clear()
+        _stats.clear()
+        _gauges.clear()
+
+
+def export_json(path):
+    Path(path).write_text(json.dumps(summary(), indent=2), encoding='utf-8')
+
+
+def export_chrome_trace(path):
+    """Write recorded spans and gauges in the Chrome trace event format."""
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        samples = list(_samples)
+    trace = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'GeoReconViewer'}}]
+    for name, start, duration, tid, args in events:
+        ev = {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+              'ts': 1e6 * (start - _epoch), 'dur': 1e6 * duration}
+        if args:
+            ev['args'] = {k: v if isinstance(v, (int, float, str, bool)) else str(v) for k, v in args.items()}
+        trace.append(ev)
+    for name, t, value in samples:
+        trace.append({'name': name, 'ph': 'C', 'pid': pid, 'ts': 1e6 * (t - _epoch), 'args': {'value': value}})
+    Path(path).write_text(json.dumps({'traceEvents': trace, 'displayTimeUnit': 'ms'}), encoding='utf-8')
+    return len(events)
@@ -0,0 +1,227 @@
+"""Binary PLY point clouds, memory-mapped instead of parsed.
+
+The header is read as text; the vertex element then maps onto a NumPy
+structured dtype (little- or big-endian) over the file, so opening a cloud
+of any size reads only its header. Points are read when they are sampled:
+sample() picks a spatially uniform subset of a point budget, from the
+whole cloud or from a box (the region the camera zoomed in on).
+
+Usage:
+    cloud = PointCloud('scan.ply')
+    points, colors = cloud.sample(1_000_000)
+    points, colors = cloud.sample(1_000_000, lo=box_min, hi=box_max)
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+
+import perf
+from obj_loader import LoadCancelled
+
+logger = logging.getLogger(__name__)
+
+_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+_ENDIAN = {'binary_little_endian': '<', 'binary_big_endian': '>'}
+_COLOR_FIELDS = (('red', 'green', 'blue'), ('r', 'g', 'b'), ('diffuse_red', 'diffuse_green', 'diffuse_blue'))
+# points read per block when scanning the whole cloud
+_BLOCK = 1 << 22
+# consecutive records per pick of an overview sample
+_RUN = 32
+
+
+def read_header(path):
+    """Parse a PLY header: (format, [(element, count, [(property, type or None for lists)])], data offset)."""
+    elements = []
+    fmt = None
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f'{path} is not a PLY file')
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f'{path}: PLY header has no end_header')
+            words = line.decode('ascii', 'replace').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                return fmt, elements, f.tell()
+            if words[0] == 'format':
+                fmt = words[1]
+            elif words[0] == 'element':
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == 'property' and elements:
+                if words[1] == 'list':
+                    elements[-1][2].append((words[-1], None))
+                else:
+                    if words[1] not in _TYPES:
+                        raise ValueError(f'{path}: unknown PLY property type {words[1]}')
+                    elements[-1][2].append((words[2], _TYPES[words[1]]))
+
+
+def column_bounds(points):
+    """(min, max) per column of an (N, k) array; column by column is several times faster than axis=0."""
+    return (np.array([points[:, i].min() for i in range(points.shape[1])]),
+            np.array([points[:, i].max() for i in range(points.shape[1])]))
+
+
+def cap_per_cell(points, cell, budget, rng):
+    """Indices of about budget points keeping at most the same number per cube of side cell.
+
+    Dense cells are thinned and sparse ones kept whole, so the result is
+    spread evenly over the occupied space instead of following the density.
+    """
+    # truncation is floor here: the offsets are not negative
+    q = ((points - column_bounds(points)[0]) / cell).astype(np.int64)
+    dims = column_bounds(q)[1] + 1
+    if np.prod(dims.astype(np.float64)) <= 1 << 24:
+        # small grid: count with a dense histogram instead of sorting the keys
+        keys = np.ravel_multi_index(q.T, dims)
+        per_cell = np.bincount(keys)
+        point_count = per_cell[keys]
+        counts = per_cell[per_cell > 0]
+    else:
+        # cells as one integer key: 21 bits per axis is enough for any useful cell size
+        q = np.clip(q, 0, (1 << 21) - 1)
+        keys = (q[:, 0] << 42) | (q[:, 1] << 21) | q[:, 2]
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        point_count = counts[inverse]
+    # the per-cell cap k with sum(min(count, k)) == budget
+    c = np.sort(counts)
+    kept = np.cumsum(c) + c * (len(c) - 1 - np.arange(len(c)))
+    i = int(np.searchsorted(kept, budget))
+    if i >= len(c):
+        return np.arange(len(points))
+    below = kept[i - 1] if i else 0
+    k = (c[i - 1] if i else 0) + (budget - below) / (len(c) - i)
+    return np.flatnonzero(rng.random(len(points)) * point_count < k)
+
+
+class PointCloud:
+    """A binary PLY file opened for sampling; the vertex records are memory-mapped."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with perf.span('ply.open'):
+            fmt, elements, offset = read_header(self.path)
+            if fmt not in _ENDIAN:
+                raise ValueError(f'{self.path}: only binary PLY is supported (format {fmt})')
+            order = _ENDIAN[fmt]
+            for name, count, props in elements:
+                if any(t is None for _, t in props):
+                    if name == 'vertex':
+                        raise ValueError(f'{self.path}: list properties in the vertex element')
+                    if count:
+                        raise ValueError(f'{self.path}: element {name} with lists precedes the vertices')
+                dtype = np.dtype([(p, order + t) for p, t in props if t is not None])
+                if name == 'vertex':
+                    break
+                offset += count * dtype.itemsize
+            else:
+                raise ValueError(f'{self.path}: no vertex element')
+            if not {'x', 'y', 'z'} <= set(dtype.names):
+                raise ValueError(f'{self.path}: vertices have no x/y/z')
+            self.dtype = dtype
+            self.count = count
+            if offset + count * dtype.itemsize > self.path.stat().st_size:
+                raise ValueError(f'{self.path}: file is shorter than its header says')
+            self.records = np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=(count,)) \
+                if count else np.zeros(0, dtype=dtype)
+        self.color_fields = next((c for c in _COLOR_FIELDS if set(c) <= set(dtype.names)), None)
+        self._bounds = None
+
+    def __len__(self):
+        return self.count
+
+    def _split(self, r):
+        """(N, 3) float64 positions and (N, 3) uint8 colors (or None) of records r."""
+        points = np.column_stack([r['x'], r['y'], r['z']]).astype(np.float64, copy=False)
+        if self.color_fields is None:
+            return points, None
+        colors = np.column_stack([r[c] for c in self.color_fields])
+        if colors.dtype.kind == 'f':
+            colors = np.clip(colors * 255.0, 0, 255)
+        return points, colors.astype(np.uint8, copy=False)
+
+    def bounds(self, cancel=None):
+        """(min, max) of all points; the first call reads the whole cloud."""
+        if self._bounds is None:
+            lo = np.full(3, np.inf)
+            hi = np.full(3, -np.inf)
+            for start in range(0, self.count, _BLOCK):
+                if cancel is not None and cancel.is_set():
+                    raise LoadCancelled(str(self.path))
+                r = self.records[start:start + _BLOCK]
+                for axis, name in enumerate('xyz'):
+                    lo[axis] = min(lo[axis], r[name].min())
+                    hi[axis] = max(hi[axis], r[name].max())
+            self._bounds = (lo, hi)
+        return self._bounds
+
+    def _random_records(self, n, rng):
+        if n >= self.count:
+            return self.records[:]
+        # short runs of consecutive records: far fewer pages of the map are read than for
+        # scattered single records; distinct slots come out sorted, so the map is read front to back
+        run = min(_RUN, max(1, self.count // n))
+        taken = np.zeros(self.count // run, dtype=bool)
+        taken[rng.integers(0, len(taken), n // run + 1)] = True
+        slots = np.flatnonzero(taken)
+        # whole runs are copied as rows of a (slots, run) view
+        return self.records[:self.count // run * run].reshape(-1, run)[slots].reshape(-1)[:n]
+
+    def _index_in_box(self, lo, hi, cancel):
+        found = []
+        for start in range(0, self.count, _BLOCK):
+            if cancel is not None and cancel.is_set():
+                raise LoadCancelled(str(self.path))
+            r = self.records[start:start + _BLOCK]
+            # narrow down axis by axis on the float32 fields instead of converting whole blocks
+            x = r['x']
+            idx = np.flatnonzero((x >= lo[0]) & (x <= hi[0]))
+            for axis, name in ((1, 'y'), (2, 'z')):
+                v = r[name][idx]
+                idx = idx[(v >= lo[axis]) & (v <= hi[axis])]
+            found.append(start + idx)
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def sample(self, budget, lo=None, hi=None, method='voxel', seed=0, cancel=None):
+        """At most budget points (float64 positions, uint8 colors or None), spread evenly over the cloud.
+
+        lo/hi restrict the sample to a box, which needs a pass over the whole
+        cloud; without them only the sampled records are read. method 'random'
+        keeps a uniform random subset; 'voxel' oversamples and keeps at most
+        the same number of points per grid cell, so dense areas do not crowd
+        out sparse ones.
+        """
+        with perf.span('points.sample', budget=budget, region=lo is not None):
+            rng = np.random.default_rng(seed)
+            budget = int(budget)
+            oversample = 3 if method == 'voxel' else 1
+            if lo is None:
+                records = self._random_records(budget * oversample, rng)
+            else:
+                index = self._index_in_box(np.asarray(lo), np.asarray(hi), cancel)
+                if len(index) > budget * oversample:
+                    index = np.sort(rng.choice(index, budget * oversample, replace=False))
+                records = self.records[index]
+            points, colors = self._split(records)
+            if len(points) > budget:
+                if method == 'voxel':
+                    # cells holding about 16 of the kept points on a surface-like cloud
+                    pmin, pmax = column_bounds(points)
+                    extent = np.sort(pmax - pmin)
+                    area = max(extent[1] * extent[2], 1e-12)
+                    keep = cap_per_cell(points, np.sqrt(16.0 * area / budget), budget, rng)
+                    if len(keep) > budget:
+                        keep = np.sort(rng.choice(keep, budget, replace=False))
+                else:
+                    keep = np.sort(rng.choice(len(points), budget, replace=False))
+                points = points[keep]
+                colors = None if colors is None else colors[keep]
+            return points, colors
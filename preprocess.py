@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Convert a directory of OBJ files into model bundles (see model_bundle.py), without Qt.
+
+Every OBJ under the input directory is parsed in a process pool and written
+to the same relative path under the output directory with a .grb suffix,
+together with its LOD levels, picking BVH and vertex normals (each can be
+turned off). --optimize welds duplicated vertices and drops degenerate
+faces and unreferenced vertices first (see mesh_optimize.py). A
+<model>.georef.json next to the source is copied along.
+
+The output directory gets a catalog.json listing per model the bundle
+path, bounding box, vertex/triangle counts, LOD triangle counts and the
+checksums of source and bundle. A rerun skips models whose source size,
+mtime and build options match the catalog and whose bundle is still in
+place; a source with a new mtime is hashed and skipped only if its content
+is unchanged (--verify also rechecks the bundle checksums).
+
+Usage:
+  python preprocess.py scans/ bundles/
+  python preprocess.py scans/ bundles/ --workers 4 --no-bvh
+  python preprocess.py scans/ bundles/ --force
+  python preprocess.py scans/ bundles/ --optimize --weld-tolerance 0.0005
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from bvh import TriangleBVH
+from georef import Georeference
+from mesh_lod import LodPyramid
+from mesh_optimize import optimize_mesh
+from model_bundle import SUFFIX, encode_normals, file_digest, vertex_normals, write_bundle
+from obj_loader import ObjLoader, file_fingerprint
+from tile_store import write_atomic
+
+logger = logging.getLogger(__name__)
+
+CATALOG = 'catalog.json'
+# 2: source fingerprints hash the whole file; version 1 catalogs may hold entries
+# accepted through sampled fingerprints and are rebuilt
+CATALOG_VERSION = 2
+
+
+def bundle_path(output, rel):
+    return Path(output) / Path(rel).with_suffix(SUFFIX)
+
+
+def build_bundle(src, dst, lod=True, bvh=True, normals=True, optimize=False, weld_tolerance=0.0):
+    """Parse src and write its bundle to dst; returns the model's catalog fields."""
+    t0 = time.perf_counter()
+    verts, faces = ObjLoader().load(src)
+    if len(verts) == 0 or len(faces) == 0:
+        raise ValueError('no geometry')
+    report = None
+    if optimize:
+        verts, faces, report = optimize_mesh(verts, faces, weld_tolerance)
+        if len(faces) == 0:
+            raise ValueError('no faces left after optimization')
+    lo = verts.min(axis=0).astype(np.float64)
+    hi = verts.max(axis=0).astype(np.float64)
+    arrays = {'verts': verts, 'faces': faces}
+    meta = {'source': Path(src).name, 'bounds': [lo.tolist(), hi.tolist()],
+            'vertices': len(verts), 'triangles': len(faces)}
+    if normals:
+        arrays['normals'] = encode_normals(vertex_normals(verts, faces))
+    lod_triangles = [len(faces)]
+    if lod:
+        pyramid = LodPyramid.build(verts, faces)
+        for i, (v, f) in enumerate(pyramid.levels[1:], start=1):
+            arrays[f'lod{i}_verts'] = v
+            arrays[f'lod{i}_faces'] = f
+        arrays['lod_cells'] = np.asarray(pyramid.cell_sizes)
+        lod_triangles = pyramid.triangle_counts
+    if bvh:
+        tree = TriangleBVH.build(verts, faces)
+        arrays['bvh_order'] = tree.order
+        arrays['bvh_leaf_min'] = tree.leaf_min
+        arrays['bvh_leaf_max'] = tree.leaf_max
+        arrays['bvh_meta'] = np.array([tree.leaf_size])
+    meta['lod_triangles'] = lod_triangles
+    if report is not None:
+        meta['optimize'] = {k: report[k] for k in ('welded_vertices', 'degenerate_faces', 'unreferenced_vertices',
+                                                    'saved_bytes')}
+    digest = write_bundle(dst, arrays, meta)
+    sidecar = Georeference.sidecar_path(src)
+    if sidecar.is_file():
+        shutil.copy2(sidecar, Georeference.sidecar_path(dst))
+    return dict(meta, bytes=Path(dst).stat().st_size, checksum=digest, georef=sidecar.is_file(),
+                seconds=round(time.perf_counter() - t0, 3))
+
+
+def _build_one(rel, src, dst, options):
+    # runs in a worker process
+    st = os.stat(src)
+    entry = build_bundle(src, dst, **options)
+    entry.update(source=rel, bundle=Path(rel).with_suffix(SUFFIX).as_posix(), source_size=st.st_size,
+                 source_mtime_ns=st.st_mtime_ns, source_fingerprint=file_fingerprint(src), options=options)
+    return rel, entry
+
+
+def load_catalog(output):
+    try:
+        catalog = json.loads((Path(output) / CATALOG).read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        return {'version': CATALOG_VERSION, 'models': {}}
+    if catalog.get('version') != CATALOG_VERSION:
+        return {'version': CATALOG_VERSION, 'models': {}}
+    return catalog
+
+
+def save_catalog(output, catalog):
+    write_atomic(Path(output) / CATALOG, json.dumps(catalog, indent=1).encode('utf-8'))
+
+
+def up_to_date(entry, src, dst, options, verify=False):
+    """Whether entry still describes src and its bundle dst.
+
+    A changed source mtime is only accepted when the whole source hashes to the
+    catalog fingerprint.
+    """
+    if entry is None or entry.get('options') != options:
+        return False
+    try:
+        st = os.stat(src)
+        size = os.stat(dst).st_size
+    except OSError:
+        return False
+    if st.st_size != entry['source_size'] or size != entry['bytes']:
+        return False
+    if st.st_mtime_ns != entry['source_mtime_ns'] and file_fingerprint(src) != entry['source_fingerprint']:
+        return False
+    return not verify or file_digest(dst) == entry['checksum']
+
+
+def preprocess(input_dir, output, workers=None, options=None, force=False, verify=False, progress=None):
+    """Build bundles for every OBJ under input_dir; returns counts of 'built', 'skipped' and 'failed'.
+
+    progress(done, total, rel, status) is called once per model.
+    """
+    input_dir = Path(input_dir)
+    output = Path(output)
+    options = {'lod': True, 'bvh': True, 'normals': True, **(options or {})}
+    catalog = load_catalog(output)
+    models = catalog['models']
+    sources = sorted(p for p in input_dir.rglob('*') if p.suffix.lower() == '.obj' and p.is_file())
+    stats = {'built': 0, 'skipped': 0, 'failed': 0}
+    todo = []
+    done = 0
+    for src in sources:
+        rel = src.relative_to(input_dir).as_posix()
+        dst = bundle_path(output, rel)
+        if not force and up_to_date(models.get(rel), src, dst, options, verify):
+            # same content under a new mtime (copied or touched; up_to_date hashed the whole
+            # source): skip the hash next time
+            models[rel]['source_mtime_ns'] = src.stat().st_mtime_ns
+            stats['skipped'] += 1
+            done += 1
+            if progress is not None:
+                progress(done, len(sources), rel, 'up to date')
+            continue
+        todo.append((rel, src, dst))
+    # drop entries of sources that are gone
+    present = {src.relative_to(input_dir).as_posix() for src in sources}
+    for rel in [rel for rel in models if rel not in present]:
+        del models[rel]
+    if not todo:
+        save_catalog(output, catalog)
+        return stats
+
+    workers = workers or os.cpu_count() or 1
+    last_save = time.monotonic()
+    # one model per task: the largest models dominate, so start them first
+    todo.sort(key=lambda t: -t[1].stat().st_size)
+    with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+        pending = {pool.submit(_build_one, rel, str(src), str(dst), options): rel for rel, src, dst in todo}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                rel = pending.pop(fut)
+                try:
+                    _, entry = fut.result()
+                except Exception as e:
+                    logger.warning('Preprocessing %s failed: %s', rel, e)
+                    models.pop(rel, None)
+                    stats['failed'] += 1
+                    status = f'failed: {e}'
+                else:
+                    models[rel] = entry
+                    stats['built'] += 1
+                    status = f'{entry["triangles"]} triangles in {entry["seconds"]:.1f} s'
+                done += 1
+                if progress is not None:
+                    progress(done, len(sources), rel, status)
+            # an interrupted run keeps what was finished
+            if time.monotonic() - last_save > 10.0:
+                save_catalog(output, catalog)
+                last_save = time.monotonic()
+    save_catalog(output, catalog)
+    return stats
+
+
+def main():
+    p = argparse.ArgumentParser(description='Build model bundles and a catalog from a directory of OBJ files.')
+    p.add_argument('input', help='directory searched recursively for .obj files')
+    p.add_argument('output', help='output directory for bundles and catalog.json')
+    p.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    p.add_argument('--no-lod', action='store_true', help='do not store LOD levels')
+    p.add_argument('--no-bvh', action='store_true', help='do not store the picking BVH')
+    p.add_argument('--no-normals', action='store_true', help='do not store vertex normals')
+    p.add_argument('--optimize', action='store_true',
+                   help='weld duplicated vertices, drop degenerate faces and unreferenced vertices, Morton-reorder')
+    p.add_argument('--weld-tolerance', type=float, default=0.0,
+                   help='with --optimize: merge vertices within this distance (model units; default: equal positions)')
+    p.add_argument('--force', action='store_true', help='rebuild every bundle')
+    p.add_argument('--verify', action='store_true', help='also recheck bundle checksums when deciding what to skip')
+    args = p.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s: %(message)s')
+    options = {'lod': not args.no_lod, 'bvh': not args.no_bvh, 'normals': not args.no_normals}
+    if args.optimize:
+        # only present when used, so catalogs written without it stay up to date
+        options.update(optimize=True, weld_tolerance=args.weld_tolerance)
+    started = time.monotonic()
+
+    def report(done, total, rel, status):
+        print(f'[{done}/{total}] {rel}: {status}', flush=True)
+
+    stats = preprocess(args.input, args.output, workers=args.workers, options=options, force=args.force,
+                       verify=args.verify, progress=report)
+    print(f'Done in {time.monotonic() - started:.1f} s: {stats["built"]} built, {stats["skipped"]} up to date, '
+          f'{stats["failed"]} failed; catalog at {Path(args.output) / CATALOG}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""Many models in one georeferenced scene, paged in and out by view and memory budget.
+
+Models are registered with their bounds only (from a preprocess.py catalog
+or bundle headers), so a site with hundreds of tiles opens without parsing
+anything. Each model's local coordinates map into a shared frame: local
+ENU metres at the origin of the first georeferenced model, through the
+models' georeferences (models without one are taken to be in the frame
+already). A uniform grid over the frame's XY footprints answers which
+models the 3D camera or the map viewport covers.
+
+Covered models load in the background (nearest first, a few at a time).
+When the estimated memory of the resident models exceeds the budget, the
+least recently visible ones that are no longer covered are evicted.
+
+Usage:
+    scene = SceneManager(viewer, budget_bytes=2 << 30)
+    scene.add_directory('bundles/')     # catalog.json or *.grb
+    scene.start()
+    bridge.viewChanged.connect(scene.set_map_view)
+    scene.stats()
+"""
+import json
+import logging
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+from PySide6 import QtCore
+
+from georef import Georeference
+from load_worker import MeshLoadJob
+from model_bundle import SUFFIX as BUNDLE_SUFFIX, BundleLoader, ModelBundle
+from spatial import transform_box
+
+logger = logging.getLogger(__name__)
+
+# host + GPU bytes per displayed triangle: pyqtgraph expands faces into per-corner
+# float32 vertex and normal arrays (2 x 36 B) next to the indexed chunk arrays
+BYTES_PER_TRIANGLE = 84
+BYTES_PER_VERTEX = 12
+
+
+def estimate_bytes(vertices, triangles):
+    """Approximate memory of a displayed mesh."""
+    return int(vertices) * BYTES_PER_VERTEX + int(triangles) * BYTES_PER_TRIANGLE
+
+
+class FootprintIndex:
+    """Uniform grid over XY bounding boxes; query returns the keys whose boxes overlap a box."""
+
+    def __init__(self, cell):
+        self.cell = float(cell)
+        self._cells = {}
+        self._boxes = {}
+
+    def _range(self, lo, hi):
+        i0, j0 = (int(math.floor(c / self.cell)) for c in lo[:2])
+        i1, j1 = (int(math.floor(c / self.cell)) for c in hi[:2])
+        return ((i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+
+    def insert(self, key, lo, hi):
+        self._boxes[key] = (np.asarray(lo[:2], dtype=float), np.asarray(hi[:2], dtype=float))
+        for c in self._range(lo, hi):
+            self._cells.setdefault(c, set()).add(key)
+
+    def query(self, lo, hi):
+        lo = np.asarray(lo[:2], dtype=float)
+        hi = np.asarray(hi[:2], dtype=float)
+        found = set()
+        # a huge query box (zoomed-out map) would enumerate many empty cells: scan the boxes instead
+        span = (hi - lo) / self.cell
+        if (span[0] + 1) * (span[1] + 1) > 4 * len(self._boxes):
+            candidates = self._boxes
+        else:
+            candidates = set()
+            for c in self._range(lo, hi):
+                candidates |= self._cells.get(c, set())
+        for key in candidates:
+            blo, bhi = self._boxes[key]
+            if (blo <= hi).all() and (bhi >= lo).all():
+                found.add(key)
+        return found
+
+    def __len__(self):
+        return len(self._boxes)
+
+
+class SceneModel:
+    """A registered model: where it is and whether it is in memory."""
+
+    def __init__(self, key, path, bounds, matrix, vertices=0, triangles=0):
+        self.key = key
+        self.path = Path(path)
+        self.bounds = (np.asarray(bounds[0], dtype=np.float64), np.asarray(bounds[1], dtype=np.float64))
+        # local -> frame
+        self.matrix = matrix
+        self.box = transform_box(matrix, *self.bounds)
+        self.est_bytes = estimate_bytes(vertices, triangles)
+        # 'unloaded', 'loading', 'resident' or 'failed'
+        self.state = 'unloaded'
+        self.nbytes = 0
+        self.last_visible = 0.0
+        self.job = None
+
+
+class SceneManager(QtCore.QObject):
+    """Keeps the models covered by the camera and map views resident within budget_bytes."""
+
+    # resident set or loading state changed
+    residencyChanged = QtCore.Signal()
+
+    def __init__(self, viewer, budget_bytes=2 << 30, max_loads=2, margin=0.5, obj_loader=None, parent=None):
+        super().__init__(parent)
+        self.viewer = viewer
+        self.budget_bytes = int(budget_bytes)
+        self.max_loads = int(max_loads)
+        # view regions are grown by this fraction of their size before querying
+        self.margin = float(margin)
+        self.georef = None
+        self.models = {}
+        self._index = None
+        self._bundle_loader = BundleLoader()
+        self._obj_loader = obj_loader
+        self._camera_region = None
+        self._map_region = None
+        self._wanted = set()
+        self._started = False
+        self._closed = False
+        self._counts = {'loads': 0, 'evictions': 0, 'discarded': 0, 'failed': 0}
+        # camera moves arrive once per frame; re-plan at most every 150 ms
+        self._update_timer = QtCore.QTimer(self, singleShot=True, interval=150)
+        self._update_timer.timeout.connect(self._update)
+
+    # -- registration
+
+    def add_model(self, path, bounds=None, georef=None, vertices=0, triangles=0):
+        """Register a model by its local bounds; .grb bundles supply bounds and counts from their header.
+
+        georef defaults to the model's .georef.json sidecar. Must precede start().
+        """
+        if self._started:
+            raise RuntimeError('add models before start()')
+        path = Path(path)
+        if bounds is None:
+            if path.suffix.lower() != BUNDLE_SUFFIX:
+                raise ValueError(f'{path}: bounds unknown (preprocess it into a bundle first)')
+            bundle = ModelBundle(path)
+            bounds = bundle.bounds
+            vertices = bundle.meta.get('vertices', 0)
+            triangles = bundle.meta.get('triangles', 0)
+        if georef is None:
+            georef = Georeference.find_for(path)
+        if georef is not None and self.georef is None:
+            # the frame: ENU at the first georeferenced model's origin
+            self.georef = Georeference(georef.origin)
+        if georef is not None:
+            matrix = self.georef.ecef_to_local @ georef.local_to_ecef
+        else:
+            matrix = np.eye(4)
+        key = str(path)
+        self.models[key] = SceneModel(key, path, bounds, matrix, vertices, triangles)
+        return key
+
+    def add_directory(self, directory):
+        """Register the models of a preprocess.py output directory (catalog.json), else its *.grb files."""
+        directory = Path(directory)
+        catalog = directory / 'catalog.json'
+        if catalog.is_file():
+            models = json.loads(catalog.read_text(encoding='utf-8')).get('models', {})
+            for entry in models.values():
+                path = directory / entry['bundle']
+                if path.is_file():
+                    self.add_model(path, entry['bounds'], vertices=entry.get('vertices', 0),
+                                   triangles=entry.get('triangles', 0))
+        else:
+            for path in sorted(directory.rglob('*' + BUNDLE_SUFFIX)):
+                self.add_model(path)
+        return len(self.models)
+
+    def bounds(self):
+        """(min, max) of all models in the frame."""
+        boxes = [m.box for m in self.models.values()]
+        return np.min([b[0] for b in boxes], axis=0), np.max([b[1] for b in boxes], axis=0)
+
+    def start(self):
+        """Build the footprint index, set up the viewer's scene and load what the camera sees."""
+        if not self.models:
+            raise ValueError('no models in the scene')
+        self._started = True
+        lo, hi = self.bounds()
+        # cells the size of the median footprint: about one model per cell on a regular tiling
+        sizes = np.array([m.box[1][:2] - m.box[0][:2] for m in self.models.values()])
+        self._index = FootprintIndex(max(float(np.median(sizes.max(axis=1))), 1e-6))
+        for key, m in self.models.items():
+            self._index.insert(key, *m.box)
+        self.viewer.begin_scene(lo, hi)
+        self.viewer.cameraChanged.connect(self._on_camera_changed)
+        self._on_camera_changed()
+        self._update()
+
+    def close(self):
+        """Stop loading and forget the scene (the viewer's items are cleared by its next model)."""
+        self._closed = True
+        self._update_timer.stop()
+        try:
+            self.viewer.cameraChanged.disconnect(self._on_camera_changed)
+        except (RuntimeError, TypeError):
+            pass
+        for m in self.models.values():
+            if m.job is not None:
+                m.job.cancel()
+                m.job = None
+
+    # -- views
+
+    def _grow(self, lo, hi):
+        pad = (np.asarray(hi) - np.asarray(lo)) * self.margin / 2.0
+        return np.asarray(lo) - pad, np.asarray(hi) + pad
+
+    def _on_camera_changed(self):
+        camera = self.viewer.camera()
+        norm = self.viewer.scene_normalization()
+        if camera is None or norm is None:
+            return
+        center, factor = norm
+        # orbit center back to the frame, and the ground half-width the camera sees there
+        focus = np.asarray(camera['center']) / factor + center
+        half = camera['distance'] * math.tan(math.radians(camera['fov']) / 2.0) / factor
+        self._camera_region = self._grow(focus[:2] - half, focus[:2] + half)
+        self._schedule()
+
+    def set_camera_region(self, lo, hi):
+        """Frame XY box the 3D view covers (normally derived from the viewer's camera)."""
+        self._camera_region = self._grow(lo[:2], hi[:2])
+        self._schedule()
+
+    def set_map_view(self, zoom, south, west, north, east):
+        """Map viewport (MapBridge.viewChanged); ignored without a georeferenced frame."""
+        if self.georef is None:
+            return
+        lat = np.array([south, south, north, north], dtype=np.float64)
+        lon = np.array([west, east, west, east], dtype=np.float64)
+        pts = self.georef.wgs84_to_local(lat, lon, np.zeros(4))
+        self._map_region = self._grow(pts[:, :2].min(axis=0), pts[:, :2].max(axis=0))
+        self._schedule()
+
+    def _schedule(self):
+        if self._started and not self._closed and not self._update_timer.isActive():
+            self._update_timer.start()
+
+    # -- paging
+
+    def _update(self):
+        if self._closed or self._index is None:
+            return
+        wanted = set()
+        for region in (self._camera_region, self._map_region):
+            if region is not None:
+                wanted |= self._index.query(*region)
+        self._wanted = wanted
+        now = time.monotonic()
+        for key in wanted:
+            self.models[key].last_visible = now
+        focus = self._camera_region or self._map_region
+        mid = (focus[0] + focus[1]) / 2.0 if focus is not None else np.zeros(2)
+
+        def distance(m):
+            return float(np.linalg.norm((m.box[0][:2] + m.box[1][:2]) / 2.0 - mid))
+
+        todo = sorted((self.models[k] for k in wanted if self.models[k].state == 'unloaded'), key=distance)
+        loading = sum(m.est_bytes for m in self.models.values() if m.state == 'loading')
+        slots = self.max_loads - sum(m.state == 'loading' for m in self.models.values())
+        planned = todo[:max(slots, 0)]
+        # make room for the next loads by dropping models that left the views
+        self._evict(loading + sum(m.est_bytes for m in planned))
+        used = self.resident_bytes() + loading
+        for m in planned:
+            if used + m.est_bytes > self.budget_bytes and used > 0:
+                # the covered models alone exceed the budget: load no more than fits
+                break
+            self._load(m)
+            used += m.est_bytes
+        self.residencyChanged.emit()
+
+    def _load(self, m):
+        if m.path.suffix.lower() == BUNDLE_SUFFIX:
+            loader = self._bundle_loader
+        elif self._obj_loader is not None:
+            loader = self._obj_loader
+        else:
+            logger.warning('No OBJ loader for %s', m.path)
+            return
+        job = MeshLoadJob(loader, m.path)
+        job.signals.finished.connect(lambda v, f, key=m.key, job=job: self._on_loaded(key, job, v, f))
+        job.signals.failed.connect(lambda msg, key=m.key, job=job: self._on_failed(key, job, msg))
+        job.signals.cancelled.connect(lambda key=m.key, job=job: self._on_failed(key, job, None))
+        m.state = 'loading'
+        m.job = job
+        QtCore.QThreadPool.globalInstance().start(job)
+
+    def _on_loaded(self, key, job, verts, faces):
+        m = self.models.get(key)
+        if self._closed or m is None or m.job is not job:
+            return
+        m.job = None
+        nbytes = estimate_bytes(len(verts), len(faces))
+        if key not in self._wanted and self.resident_bytes() + nbytes > self.budget_bytes:
+            # the view moved on while it loaded and there is no room for it
+            m.state = 'unloaded'
+            self._counts['discarded'] += 1
+        else:
+            self.viewer.add_scene_model(key, verts, faces, m.matrix)
+            m.state = 'resident'
+            m.nbytes = nbytes
+            m.est_bytes = nbytes
+            self._counts['loads'] += 1
+            self._evict()
+        # next models in line
+        self._schedule()
+        self.residencyChanged.emit()
+
+    def _on_failed(self, key, job, message):
+        m = self.models.get(key)
+        if m is None or m.job is not job:
+            return
+        m.job = None
+        m.state = 'unloaded'
+        if message is not None:
+            logger.warning('Loading scene model %s failed: %s', key, message)
+            self._counts['failed'] += 1
+            # not retried
+            m.state = 'failed'
+        self._schedule()
+        self.residencyChanged.emit()
+
+    def _evict(self, needed=0):
+        """Evict uncovered models, least recently visible first, until needed more bytes fit."""
+        over = self.resident_bytes() + needed - self.budget_bytes
+        if over <= 0:
+            return
+        victims = sorted((m for m in self.models.values() if m.state == 'resident' and m.key not in self._wanted),
+                         key=lambda m: m.last_visible)
+        for m in victims:
+            if over <= 0:
+                break
+            self.viewer.remove_scene_model(m.key)
+            over -= m.nbytes
+            m.state = 'unloaded'
+            m.nbytes = 0
+            self._counts['evictions'] += 1
+
+    # -- stats
+
+    def resident_bytes(self):
+        return sum(m.nbytes for m in self.models.values() if m.state == 'resident')
+
+    def stats(self):
+        """Model counts by state, bytes resident / covered by the views / budget, and load/eviction counters."""
+        states = [m.state for m in self.models.values()]
+        covered = sum(self.models[k].est_bytes for k in self._wanted)
+        return dict(self._counts, models=len(states), resident=states.count('resident'),
+                    loading=states.count('loading'), covered=len(self._wanted), resident_bytes=self.resident_bytes(),
+                    covered_bytes=covered, budget_bytes=self.budget_bytes,
+                    # the models in view do not all fit: the farthest stay unloaded
+                    over_budget=covered > self.budget_bytes)
@@ -0,0 +1,165 @@
+import numpy as np
+
+
+def _spread_bits(v):
+    """Insert two zero bits between each of the low 21 bits of v (uint64)."""
+    v = v & np.uint64(0x1FFFFF)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_codes(points, bits=21, lo=None, hi=None):
+    """Morton (Z-order) codes of (N, 3) points quantized to `bits` per axis inside [lo, hi]."""
+    points = np.asarray(points)
+    lo = points.min(axis=0) if lo is None else np.asarray(lo, dtype=np.float64)
+    hi = points.max(axis=0) if hi is None else np.asarray(hi, dtype=np.float64)
+    extent = np.where(hi > lo, hi - lo, 1.0)
+    cells = (1 << bits) - 1
+    q = np.clip((points - lo) / extent * cells, 0, cells).astype(np.uint64)
+    return (_spread_bits(q[:, 0]) << np.uint64(2)) | (_spread_bits(q[:, 1]) << np.uint64(1)) | _spread_bits(q[:, 2])
+
+
+def split_into_chunks(verts, faces, max_triangles=65536):
+    """Split a mesh into spatially compact chunks of at most max_triangles triangles.
+
+    Triangles are sorted along the Morton curve of their centroids and cut into
+    consecutive runs, which gives octree-like cells with balanced sizes.
+    Returns a list of (verts, faces, aabb_min, aabb_max) with chunk-local indices.
+    """
+    verts = np.asarray(verts)
+    faces = np.asarray(faces)
+    if len(faces) <= max_triangles:
+        return [(verts, faces, verts.min(axis=0), verts.max(axis=0))]
+    # sum of corners instead of verts[faces].mean(): avoids an (M, 3, 3) temporary
+    centroids = verts[faces[:, 0]] + verts[faces[:, 1]]
+    centroids += verts[faces[:, 2]]
+    order = np.argsort(morton_codes(centroids, bits=10), kind='stable')
+    del centroids
+    chunks = []
+    for start in range(0, len(order), max_triangles):
+        f = faces[order[start:start + max_triangles]]
+        used, inv = np.unique(f, return_inverse=True)
+        v = verts[used]
+        chunks.append((v, inv.astype(faces.dtype, copy=False).reshape(-1, 3), v.min(axis=0), v.max(axis=0)))
+    return chunks
+
+
+def normalization(minv, maxv, size=10.0):
+    """Center and scale factor that fit the box [minv, maxv] into a cube of the given size.
+
+    Scene coordinates are (v - center) * factor; the viewer applies this as an
+    item transform instead of rewriting the vertex arrays.
+    """
+    minv = np.asarray(minv, dtype=np.float64)
+    maxv = np.asarray(maxv, dtype=np.float64)
+    center = (minv + maxv) / 2.0
+    extent = (maxv - minv).max()
+    if extent == 0:
+        extent = 1.0
+    return center, size / extent
+
+
+def transform_box(matrix, minv, maxv):
+    """Axis-aligned bounds of the box [minv, maxv] after the affine 4x4 matrix."""
+    corners = np.array([[x, y, z] for x in (minv[0], maxv[0]) for y in (minv[1], maxv[1]) for z in (minv[2], maxv[2])],
+                       dtype=np.float64)
+    out = corners @ np.asarray(matrix)[:3, :3].T + np.asarray(matrix)[:3, 3]
+    return out.min(axis=0), out.max(axis=0)
+
+
+def _translate(x, y, z):
+    m = np.eye(4)
+    m[:3, 3] = (x, y, z)
+    return m
+
+
+def _rotate(angle, x, y, z):
+    """Rotation about an axis, same convention as QMatrix4x4.rotate."""
+    axis = np.array([x, y, z], dtype=np.float64)
+    x, y, z = axis / np.linalg.norm(axis)
+    a = np.deg2rad(angle)
+    c, s = np.cos(a), np.sin(a)
+    t = 1.0 - c
+    m = np.eye(4)
+    m[:3, :3] = [[t*x*x + c, t*x*y - s*z, t*x*z + s*y],
+                 [t*x*y + s*z, t*y*y + c, t*y*z - s*x],
+                 [t*x*z - s*y, t*y*z + s*x, t*z*z + c]]
+    return m
+
+
+def _vec3(c):
+    try:
+        return np.array([c.x(), c.y(), c.z()], dtype=np.float64)
+    except Exception:
+        return np.array(tuple(c), dtype=np.float64)
+
+
+def camera_matrices(opts, width, height):
+    """View and projection matrices for pyqtgraph GLViewWidget-style camera opts.
+
+    Mirrors GLViewWidget.viewMatrix/projectionMatrix (euler rotation mode) so
+    the result can be computed without a GL context.
+    """
+    center = _vec3(opts.get('center', (0, 0, 0)))
+    dist = float(opts.get('distance', 40))
+    azim = float(opts.get('azimuth', 45))
+    elev = float(opts.get('elevation', 30))
+    fov = float(opts.get('fov', 60))
+    view = (_translate(0, 0, -dist) @ _rotate(elev - 90, 1, 0, 0)
+            @ _rotate(azim + 90, 0, 0, -1) @ _translate(*(-center)))
+
+    near = dist * 0.001
+    far = dist * 1000.0
+    r = near * np.tan(0.5 * np.deg2rad(fov))
+    t = r * height / max(width, 1)
+    proj = np.zeros((4, 4))
+    proj[0, 0] = near / r
+    proj[1, 1] = near / t
+    proj[2, 2] = -(far + near) / (far - near)
+    proj[2, 3] = -2.0 * far * near / (far - near)
+    proj[3, 2] = -1.0
+    return view, proj
+
+
+def ray_from_pixel(opts, width, height, x, y):
+    """World-space ray (origin, unit direction) through widget pixel (x, y)."""
+    view, proj = camera_matrices(opts, width, height)
+    inv = np.linalg.inv(proj @ view)
+    ndc_x = 2.0 * x / max(width, 1) - 1.0
+    ndc_y = 1.0 - 2.0 * y / max(height, 1)
+    near = inv @ np.array([ndc_x, ndc_y, -1.0, 1.0])
+    far = inv @ np.array([ndc_x, ndc_y, 1.0, 1.0])
+    near = near[:3] / near[3]
+    far = far[:3] / far[3]
+    d = far - near
+    return near, d / np.linalg.norm(d)
+
+
+def frustum_planes(opts, width, height):
+    """The six frustum planes (a, b, c, d) as a (6, 4) array; inside means a*x+b*y+c*z+d >= 0."""
+    view, proj = camera_matrices(opts, width, height)
+    m = proj @ view
+    planes = np.array([m[3] + m[0], m[3] - m[0],
+                       m[3] + m[1], m[3] - m[1],
+                       m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def cull_aabbs(planes, mins, maxs):
+    """Boolean mask of the boxes that intersect the frustum, vectorized over all boxes.
+
+    A box is rejected when its corner furthest along a plane normal is still
+    outside that plane. Boxes straddling a frustum corner may be kept
+    (conservative), never wrongly dropped.
+    """
+    mins = np.asarray(mins, dtype=np.float64).reshape(-1, 3)
+    maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 3)
+    normals = planes[:, :3]
+    # (boxes, planes, 3): the box corner furthest along each plane normal
+    corner = np.where(normals[None, :, :] >= 0, maxs[:, None, :], mins[:, None, :])
+    dist = np.einsum('bpk,pk->bp', corner, normals) + planes[None, :, 3]
+    return (dist >= 0).all(axis=1)
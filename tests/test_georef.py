@@ -0,0 +1,70 @@
+"""Georeference transforms against reference points with known ECEF coordinates, and round trips."""
+import numpy as np
+import pytest
+
+from georef import BLOCK, WGS84_A, WGS84_B, Georeference, ecef_to_geodetic, geodetic_to_ecef
+
+# (lat, lon, alt) -> ECEF metres
+REFERENCE = [
+    ((0.0, 0.0, 0.0), (WGS84_A, 0.0, 0.0)),
+    ((0.0, 90.0, 0.0), (0.0, WGS84_A, 0.0)),
+    ((0.0, 180.0, 100.0), (-WGS84_A - 100.0, 0.0, 0.0)),
+    ((90.0, 0.0, 0.0), (0.0, 0.0, WGS84_B)),
+    ((-90.0, 0.0, 1000.0), (0.0, 0.0, -WGS84_B - 1000.0)),
+    # 45N 45E on the ellipsoid: N = a / sqrt(1 - e2 / 2)
+    ((45.0, 45.0, 0.0), (3194419.145060574, 3194419.145060574, 4487348.40886592)),
+]
+GEO = np.array([r[0] for r in REFERENCE])
+ECEF = np.array([r[1] for r in REFERENCE])
+
+# metres; float64 ECEF coordinates near the earth's radius resolve about 1e-9 m
+POSITION_TOL = 1e-6
+# degrees; 1e-11 deg is about 1 micrometre on the ground
+ANGLE_TOL = 1e-11
+
+
+def test_geodetic_to_ecef_reference_points():
+    xyz = geodetic_to_ecef(GEO[:, 0], GEO[:, 1], GEO[:, 2])
+    assert np.abs(xyz - ECEF).max() < POSITION_TOL
+
+
+def test_ecef_to_geodetic_reference_points():
+    lat, lon, alt = ecef_to_geodetic(ECEF)
+    assert np.abs(lat - GEO[:, 0]).max() < ANGLE_TOL
+    assert np.abs(alt - GEO[:, 2]).max() < POSITION_TOL
+    # longitude is undefined at the poles
+    defined = np.abs(GEO[:, 0]) != 90.0
+    dlon = (lon - GEO[:, 1] + 180.0) % 360.0 - 180.0
+    assert np.abs(dlon[defined]).max() < ANGLE_TOL
+
+
+def test_origin_maps_to_local_zero():
+    g = Georeference((31.11, 121.07, 12.0))
+    lat, lon, alt = g.local_to_wgs84(np.zeros((1, 3)))
+    assert abs(lat[0] - 31.11) < ANGLE_TOL and abs(lon[0] - 121.07) < ANGLE_TOL
+    assert abs(alt[0] - 12.0) < POSITION_TOL
+
+
+def test_local_axes_are_east_north_up():
+    g = Georeference((31.11, 121.07, 12.0))
+    lat, lon, alt = g.local_to_wgs84(np.array([[100.0, 0.0, 0.0], [0.0, 100.0, 0.0], [0.0, 0.0, 100.0]]))
+    assert lon[0] > 121.07 and abs(lat[0] - 31.11) < 1e-6
+    assert lat[1] > 31.11 and abs(lon[1] - 121.07) < 1e-9
+    assert abs(alt[2] - 112.0) < 1e-6
+
+
+@pytest.mark.parametrize('georef', [
+    {'origin': [31.11, 121.07, 12.0]},
+    {'origin': [-33.86, 151.21, 40.0], 'scale': 0.5, 'heading_deg': 37.0, 'translation': [10.0, -4.0, 2.0]},
+    {'origin': [69.65, 18.96, 0.0], 'heading_deg': -120.0},
+])
+def test_local_wgs84_round_trip(georef):
+    # more than 4 blocks, so the threaded path runs too
+    n = 5 * BLOCK + 123
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-5000.0, 5000.0, (n, 3))
+    points[:, 2] *= 0.02
+    g = Georeference.from_dict(georef)
+    again = g.wgs84_to_local(*g.local_to_wgs84(points))
+    # within 1e-6 m over a 10 km model
+    assert np.abs(again - points).max() < POSITION_TOL
@@ -0,0 +1,47 @@
+"""OBJ parsing edge cases and the mesh cache size bound."""
+import os
+
+import numpy as np
+
+from obj_loader import MeshCache, ObjLoader, parse_block
+
+
+def test_inline_comments_on_vertex_and_face_lines():
+    text = (b'# header comment\n'
+            b'v 0 0 0 # origin\n'
+            b'v 1 0 0#no space\n'
+            b'v 0 1 0\n'
+            b'v 1 1 0 # 5 6 7\n'
+            b'f 1 2 3 # tri\n'
+            b'f 2/2/2 4/4/4 3/3/3 # with / slashes 1 2\n'
+            b'f -4 -3 -2#\n')
+    verts, faces = parse_block(text)
+    assert np.array_equal(verts, [[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]])
+    assert faces.tolist() == [[0, 1, 2], [1, 3, 2], [0, 1, 2]]
+
+
+def test_inline_comments_through_the_loader(tmp_path):
+    path = tmp_path / 'commented.obj'
+    path.write_text('v 0 0 0 # a\nv 1 0 0 # b\nv 0 1 0 # c\nf 1 2 3 # tri\n')
+    verts, faces = ObjLoader().load(path)
+    assert verts.shape == (3, 3) and faces.tolist() == [[0, 1, 2]]
+
+
+def test_put_extra_evicts_past_max_bytes(tmp_path):
+    sources = []
+    for name in ('old.obj', 'new.obj'):
+        path = tmp_path / name
+        path.write_text('v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n')
+        sources.append(path)
+    cache = MeshCache(tmp_path / 'cache')
+    verts, faces = np.zeros((3, 3), np.float32), np.array([[0, 1, 2]], np.uint32)
+    for i, path in enumerate(sources):
+        cache.put(path, verts, faces)
+        os.utime(cache._entry_dir(path) / 'header.json', (i, i))
+    # room for one mesh and the extra, not for both meshes and the extra
+    extra = np.zeros(1024, np.float32)
+    entry_bytes = max(nbytes for _, nbytes, _ in cache.entries())
+    cache.max_bytes = entry_bytes + extra.nbytes + entry_bytes // 2
+    assert cache.put_extra(sources[1], 'lod1', extra)
+    assert cache.get(sources[0]) is None
+    assert cache.get_extra(sources[1], 'lod1') is not None
@@ -0,0 +1,107 @@
+"""Frustum culling against known camera poses, and the camera matrices against pyqtgraph."""
+import inspect
+import os
+
+import numpy as np
+import pytest
+
+from spatial import camera_matrices, cull_aabbs, frustum_planes
+
+WIDTH, HEIGHT = 800, 600
+
+POSES = [
+    {'center': (0, 0, 0), 'distance': 10.0, 'azimuth': 0.0, 'elevation': 0.0, 'fov': 60},
+    {'center': (0, 0, 0), 'distance': 40.0, 'azimuth': 45.0, 'elevation': 30.0, 'fov': 60},
+    {'center': (120.0, -35.0, 8.0), 'distance': 3.0, 'azimuth': 200.0, 'elevation': -60.0, 'fov': 45},
+]
+
+
+def camera_axes(opts):
+    """(camera position, unit forward, unit right) of a GLViewWidget orbit camera."""
+    center = np.asarray(opts['center'], dtype=float)
+    a, e = np.deg2rad(opts['azimuth']), np.deg2rad(opts['elevation'])
+    offset = np.array([np.cos(e) * np.cos(a), np.cos(e) * np.sin(a), np.sin(e)])
+    forward = -offset
+    right = np.cross(forward, [0.0, 0.0, 1.0])
+    return center + opts['distance'] * offset, forward, right / np.linalg.norm(right)
+
+
+def box_at(point, half):
+    point = np.asarray(point, dtype=float)
+    return point - half, point + half
+
+
+def kept(opts, point, half):
+    lo, hi = box_at(point, half)
+    return bool(cull_aabbs(frustum_planes(opts, WIDTH, HEIGHT), lo, hi)[0])
+
+
+@pytest.mark.parametrize('opts', POSES)
+def test_box_at_center_is_kept(opts):
+    assert kept(opts, opts['center'], 0.1 * opts['distance'])
+
+
+@pytest.mark.parametrize('opts', POSES)
+def test_box_behind_camera_is_culled(opts):
+    eye, forward, _ = camera_axes(opts)
+    assert not kept(opts, eye - forward * opts['distance'], 0.1 * opts['distance'])
+
+
+@pytest.mark.parametrize('opts', POSES)
+def test_box_beyond_far_is_culled(opts):
+    eye, forward, _ = camera_axes(opts)
+    # the far plane is at 1000 * distance
+    assert not kept(opts, eye + forward * 2000 * opts['distance'], 0.1 * opts['distance'])
+
+
+@pytest.mark.parametrize('opts', POSES)
+def test_box_beside_view_is_culled(opts):
+    # at the center's depth the view is about tan(fov / 2) * distance wide to each side
+    _, _, right = camera_axes(opts)
+    center = np.asarray(opts['center'], dtype=float)
+    for side in (1, -1):
+        assert not kept(opts, center + side * right * 5 * opts['distance'], 0.1 * opts['distance'])
+
+
+def test_box_straddling_near_plane_is_kept():
+    opts = POSES[0]
+    eye, _, _ = camera_axes(opts)
+    assert kept(opts, eye, 1.0)
+
+
+def test_cull_is_vectorized_over_boxes():
+    opts = POSES[1]
+    eye, forward, right = camera_axes(opts)
+    points = [opts['center'], eye - forward * 40, np.asarray(opts['center']) + right * 200]
+    mins, maxs = zip(*(box_at(p, 1.0) for p in points))
+    mask = cull_aabbs(frustum_planes(opts, WIDTH, HEIGHT), np.array(mins), np.array(maxs))
+    assert mask.tolist() == [True, False, False]
+
+
+@pytest.fixture
+def qapp():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    pytest.importorskip('pyqtgraph.opengl')
+    from PySide6 import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def pyqtgraph_projection(w):
+    """w.projectionMatrix() for the whole widget; pyqtgraph 0.14 requires region and viewport."""
+    viewport = w.getViewport()
+    if 'viewport' in inspect.signature(w.projectionMatrix).parameters:
+        return w.projectionMatrix(viewport, viewport)
+    return w.projectionMatrix(viewport)
+
+
+@pytest.mark.parametrize('opts', POSES)
+def test_camera_matrices_match_pyqtgraph(qapp, opts):
+    import pyqtgraph as pg
+    import pyqtgraph.opengl as gl
+    w = gl.GLViewWidget()
+    w.resize(WIDTH, HEIGHT)
+    w.opts.update(opts, center=pg.Vector(*opts['center']))
+    view, proj = camera_matrices(opts, w.deviceWidth(), w.deviceHeight())
+    # QMatrix4x4.data() is column-major
+    assert np.allclose(view, np.array(w.viewMatrix().data()).reshape(4, 4).T, atol=1e-4)
+    assert np.allclose(proj, np.array(pyqtgraph_projection(w).data()).reshape(4, 4).T, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,276 @@
+"""TileDownloader against a local stand-in tile server (http.server)."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tile_downloader import TileDownloader
+from tile_store import open_store
+
+
+class FakeTileServer:
+    """Serves tiles[(z, x, y)] at /z/x/y.png; fail[(z, x, y)] holds statuses to answer first.
+
+    Every request is logged as (tile, request headers).
+    """
+
+    def __init__(self):
+        self.tiles = {}
+        self.fail = {}
+        self.etags = True
+        self.log = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                z, x, y = (int(p) for p in self.path.strip('/').split('.')[0].split('/'))
+                tile = (z, x, y)
+                with server._lock:
+                    server.log.append((tile, dict(self.headers)))
+                    queued = server.fail.get(tile)
+                    status = queued.pop(0) if queued else None
+                    data = server.tiles.get(tile)
+                if status is not None:
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if data is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = f'"{hash(data) & 0xffffffff:08x}"'
+                if server.etags and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if server.etags:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.template = f'http://127.0.0.1:{self.httpd.server_port}/{{z}}/{{x}}/{{y}}.png'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def requested(self):
+        """Tiles requested so far, in order."""
+        with self._lock:
+            return [tile for tile, _ in self.log]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    s = FakeTileServer()
+    yield s
+    s.close()
+
+
+def tile_grid(z=6, n=4):
+    return [(z, x, y) for x in range(n) for y in range(n)]
+
+
+def make_downloader(server, out, **kwargs):
+    options = dict(workers=2, rate=0, backoff=0.0, timeout=5.0)
+    options.update(kwargs)
+    return TileDownloader(server.template, str(out), **options)
+
+
+def test_retries_429_and_5xx_then_stores(server, tmp_path):
+    server.tiles[(3, 1, 2)] = b'tile-a'
+    server.fail[(3, 1, 2)] = [429, 503, 500]
+    dl = make_downloader(server, tmp_path / 'tiles', retries=5)
+    try:
+        assert dl.fetch(3, 1, 2) == 'ok'
+        assert dl.store.get(3, 1, 2) == b'tile-a'
+    finally:
+        dl.close()
+    assert server.requested() == [(3, 1, 2)] * 4
+
+
+def test_gives_up_after_retries(server, tmp_path):
+    server.tiles[(3, 1, 2)] = b'tile-a'
+    server.fail[(3, 1, 2)] = [503] * 10
+    dl = make_downloader(server, tmp_path / 'tiles', retries=2)
+    try:
+        assert dl.fetch(3, 1, 2) == 'failed'
+        assert not dl.store.has(3, 1, 2)
+    finally:
+        dl.close()
+    assert len(server.requested()) == 3
+
+
+def test_missing_and_client_errors_are_not_retried(server, tmp_path):
+    server.fail[(3, 0, 0)] = [403]
+    dl = make_downloader(server, tmp_path / 'tiles', retries=5)
+    try:
+        assert dl.fetch(3, 0, 0) == 'failed'
+        assert dl.fetch(3, 0, 1) == 'missing'
+    finally:
+        dl.close()
+    assert server.requested() == [(3, 0, 0), (3, 0, 1)]
+
+
+@pytest.mark.parametrize('output', ['tiles', 'tiles.mbtiles'])
+def test_resume_requests_only_unfinished_tiles(server, tmp_path, output):
+    tiles = tile_grid()
+    for t in tiles[:-2]:
+        server.tiles[t] = f'data {t}'.encode()
+    # the last two tiles are missing upstream; two others fail on the first run
+    failing = tiles[3:5]
+    for t in failing:
+        server.fail[t] = [500]
+    out = tmp_path / output
+
+    dl = make_downloader(server, out, retries=0)
+    try:
+        stats = dl.run(tiles)
+    finally:
+        dl.close()
+    assert (stats['ok'], stats['missing'], stats['failed']) == (len(tiles) - 4, 2, 2)
+
+    before = len(server.requested())
+    dl = make_downloader(server, out, retries=0)
+    try:
+        stats = dl.run(tiles)
+    finally:
+        dl.close()
+    # stored tiles and journaled missing tiles are skipped; only the failed ones are fetched again
+    assert sorted(server.requested()[before:]) == sorted(failing)
+    assert (stats['ok'], stats['skipped']) == (2, len(tiles) - 2)
+    store = open_store(out)
+    try:
+        assert all(store.get(*t) == f'data {t}'.encode() for t in tiles[:-2])
+    finally:
+        store.close()
+
+
+def test_resume_after_stop(server, tmp_path):
+    tiles = tile_grid(n=6)
+    for t in tiles:
+        server.tiles[t] = f'data {t}'.encode()
+    out = tmp_path / 'tiles'
+    dl = make_downloader(server, out, workers=1)
+
+    def progress(stats):
+        if stats['ok'] == 10:
+            dl.stop()
+
+    try:
+        stats = dl.run(tiles, progress=progress)
+    finally:
+        dl.close()
+    first = server.requested()
+    assert stats['ok'] >= 10 and len(first) < len(tiles)
+
+    dl = make_downloader(server, out, workers=1)
+    try:
+        stats = dl.run(tiles)
+    finally:
+        dl.close()
+    rest = server.requested()[len(first):]
+    assert sorted(first + rest) == sorted(tiles)
+    assert stats['skipped'] == len(first)
+
+
+def seed(server, out, n=20):
+    """Serve n * n distinct tiles and download them all into out."""
+    tiles = tile_grid(z=8, n=n)
+    for t in tiles:
+        server.tiles[t] = f'data {t}'.encode()
+    dl = make_downloader(server, out, workers=4)
+    try:
+        assert dl.run(tiles)['ok'] == len(tiles)
+    finally:
+        dl.close()
+    return tiles
+
+
+def refresh(server, out, **kwargs):
+    before = len(server.log)
+    dl = make_downloader(server, out, workers=4)
+    try:
+        stats = dl.run(server.tiles, refresh=True, **kwargs)
+    finally:
+        dl.close()
+    return stats, server.log[before:]
+
+
+@pytest.mark.parametrize('output', ['tiles', 'tiles.mbtiles'])
+def test_refresh_uses_conditional_requests(server, tmp_path, output):
+    out = tmp_path / output
+    tiles = seed(server, out, n=10)
+    changed = tiles[7:10]
+    for t in changed:
+        server.tiles[t] = b'new ' + server.tiles[t]
+
+    stats, log = refresh(server, out)
+    assert (stats['ok'], stats['not_modified'], stats['unchanged']) == (len(changed), len(tiles) - len(changed), 0)
+    assert len(log) == len(tiles)
+    assert all('If-None-Match' in headers for _, headers in log)
+    store = open_store(out)
+    try:
+        assert all(store.get(*t) == server.tiles[t] for t in tiles)
+    finally:
+        store.close()
+
+    # the manifest now has the new validators: nothing changed since
+    stats, _ = refresh(server, out)
+    assert stats['not_modified'] == len(tiles)
+
+
+def test_refresh_without_validators_compares_digests(server, tmp_path):
+    server.etags = False
+    out = tmp_path / 'tiles'
+    tiles = seed(server, out, n=6)
+    changed = tiles[:2]
+    for t in changed:
+        server.tiles[t] = b'new ' + server.tiles[t]
+    store = open_store(out)
+    mtimes = {t: store.path(*t).stat().st_mtime_ns for t in tiles}
+    store.close()
+
+    stats, log = refresh(server, out)
+    assert (stats['ok'], stats['unchanged'], stats['not_modified']) == (2, len(tiles) - 2, 0)
+    assert not any('If-None-Match' in headers for _, headers in log)
+    store = open_store(out)
+    try:
+        # identical tiles are left alone, changed ones rewritten
+        assert all((store.path(*t).stat().st_mtime_ns == mtimes[t]) == (t not in changed) for t in tiles)
+        assert all(store.get(*t) == server.tiles[t] for t in tiles)
+    finally:
+        store.close()
+
+
+def test_refresh_of_tiles_stored_before_the_manifest(server, tmp_path):
+    out = tmp_path / 'tiles'
+    tiles = seed(server, out, n=4)
+    (out / '.tile-manifest').unlink()
+    server.tiles[tiles[0]] = b'new'
+
+    stats, log = refresh(server, out)
+    # no validators to send: the stored bytes decide
+    assert not any('If-None-Match' in headers for _, headers in log)
+    assert (stats['ok'], stats['unchanged']) == (1, len(tiles) - 1)
+
+
+def test_refresh_max_age_skips_recently_checked_tiles(server, tmp_path):
+    out = tmp_path / 'tiles'
+    tiles = seed(server, out, n=4)
+    stats, log = refresh(server, out, max_age=3600)
+    assert stats['skipped'] == len(tiles) and not log
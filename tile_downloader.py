@@ -0,0 +1,369 @@
+"""Concurrent XYZ tile download engine used by download_tiles.py.
+
+Tiles are fetched by a thread pool sharing one pooled requests.Session.
+Each host gets a rate limit and a cap on in-flight requests; 429 and 5xx
+responses are retried with exponential backoff. Tiles go to a tile_store
+store (directory tree with atomic writes, or MBTiles), and every finished
+tile is appended to a journal so an interrupted run resumes where it
+stopped.
+
+A tile manifest keeps each tile's ETag, Last-Modified, size and content
+digest. run(..., refresh=True) revalidates stored tiles with conditional
+requests: 304 responses cost no transfer, and a 200 whose content digest
+matches the stored tile is not written again.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import perf
+from tile_store import open_store, tile_digest
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class HostLimiter:
+    """Per-host request pacing (requests per second) and in-flight cap."""
+
+    def __init__(self, rate=10.0, max_in_flight=8):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._lock = threading.Lock()
+        self._next = {}
+        self._slots = {}
+
+    def _slot(self, host):
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self.max_in_flight)
+            return slot
+
+    def acquire(self, host):
+        self._slot(host).acquire()
+        if self.interval:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next.get(host, now))
+                self._next[host] = start + self.interval
+            if start > now:
+                time.sleep(start - now)
+
+    def release(self, host):
+        self._slot(host).release()
+
+
+class DownloadJournal:
+    """Append-only record of finished tiles, one JSON object per line.
+
+    Status is 'ok' for stored tiles and 'missing' for tiles the server does
+    not have (404/204), so neither is requested again on resume.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.done = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        self.done[(rec['z'], rec['x'], rec['y'])] = rec['status']
+                    except (ValueError, KeyError):
+                        # a line cut short by an interruption
+                        continue
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, tile, status):
+        z, x, y = tile
+        with self._lock:
+            self.done[tile] = status
+            self._file.write(json.dumps({'z': z, 'x': x, 'y': y, 'status': status}) + '\n')
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+ManifestEntry = namedtuple('ManifestEntry', 'etag last_modified size digest checked')
+
+
+class TileManifest:
+    """HTTP validators and content digest of every downloaded tile, in SQLite.
+
+    Shared between download threads behind a lock; records are buffered
+    and committed batch_size at a time.
+    """
+
+    def __init__(self, path, batch_size=500):
+        self.path = Path(path)
+        self.batch_size = int(batch_size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript('''
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS tiles (z INTEGER, x INTEGER, y INTEGER, etag TEXT, last_modified TEXT,
+                                              size INTEGER, digest TEXT, checked REAL,
+                                              PRIMARY KEY (z, x, y)) WITHOUT ROWID;
+        ''')
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def get(self, tile):
+        """ManifestEntry for (z, x, y), or None."""
+        with self._lock:
+            entry = self._pending.get(tile)
+            if entry is not None:
+                return entry
+            row = self._db.execute('SELECT etag, last_modified, size, digest, checked FROM tiles '
+                                   'WHERE z=? AND x=? AND y=?', tile).fetchone()
+        return None if row is None else ManifestEntry(*row)
+
+    def record(self, tile, entry):
+        with self._lock:
+            self._pending[tile] = entry
+            if len(self._pending) >= self.batch_size:
+                self._commit()
+
+    def _commit(self):
+        if not self._pending:
+            return
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 [tile + tuple(entry) for tile, entry in self._pending.items()])
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._commit()
+            finally:
+                self._db.close()
+                self._db = None
+
+
+class TileDownloader:
+    """Download many tiles concurrently.
+
+    Usage:
+        dl = TileDownloader('https://tiles.example/{z}/{x}/{y}.png', 'assets/tiles')
+        stats = dl.run(tiles)  # iterable of (z, x, y)
+        dl.close()
+
+    output is a directory, a *.mbtiles path or an already open store. The
+    manifest defaults to <output>/.tile-manifest (<file>.mbtiles.manifest);
+    without one, refreshes compare digests against the stored tiles only.
+    """
+
+    def __init__(self, template, output, workers=8, rate=10.0, max_in_flight=8, retries=5,
+                 backoff=0.5, max_backoff=60.0, timeout=15.0, journal=None, headers=None, manifest=None):
+        self.template = template
+        if isinstance(output, (str, os.PathLike)):
+            ext = os.path.splitext(urlsplit(template).path)[1] or '.png'
+            self.store = open_store(output, 'w', ext)
+            if str(output).endswith('.mbtiles'):
+                default_journal = Path(str(output) + '.journal')
+                default_manifest = Path(str(output) + '.manifest')
+            else:
+                default_journal = Path(output) / '.download-journal'
+                default_manifest = Path(output) / '.tile-manifest'
+        else:
+            self.store = output
+            default_journal = default_manifest = None
+        self.workers = max(1, int(workers))
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.timeout = timeout
+        self.limiter = HostLimiter(rate, max_in_flight)
+        self.journal_path = Path(journal) if journal else default_journal
+        if self.journal_path is None:
+            raise ValueError('journal path required when output is a store object')
+        self.manifest_path = Path(manifest) if manifest else default_manifest
+        self._manifest = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': 'GeoReconViewerTileDownloader/1.0 (+https://example)'})
+        if headers:
+            self.session.headers.update(headers)
+        self._stop = threading.Event()
+
+    def close(self):
+        self.store.close()
+
+    def stop(self):
+        """Ask a running run() to finish the requests in flight and return."""
+        self._stop.set()
+
+    @perf.timed('tile.fetch')
+    def fetch(self, z, x, y, refresh=False):
+        """Download one tile. Returns 'ok', 'missing' or 'failed'.
+
+        With refresh=True the request is conditional on the manifest's
+        validators and may also return 'not_modified' (304) or 'unchanged'
+        (same content digest as the stored tile, which is left alone).
+        """
+        tile = (z, x, y)
+        url = self.template.format(z=z, x=x, y=y)
+        host = urlsplit(url).netloc
+        manifest = self._manifest
+        entry = manifest.get(tile) if manifest is not None else None
+        headers = {}
+        known = None
+        if refresh:
+            if entry is not None and not self.store.has(z, x, y):
+                # recorded, but the tile never reached the store (hard interruption)
+                entry = None
+            if entry is not None:
+                known = entry.digest
+                if entry.etag:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    headers['If-Modified-Since'] = entry.last_modified
+            else:
+                # stored before the manifest existed: compare with the bytes themselves
+                old = self.store.get(z, x, y)
+                known = tile_digest(old) if old is not None else None
+        for attempt in range(self.retries + 1):
+            if self._stop.is_set():
+                return 'failed'
+            retry_after = None
+            self.limiter.acquire(host)
+            try:
+                resp = self.session.get(url, timeout=self.timeout, headers=headers)
+                status = resp.status_code
+                if status == 304 and entry is not None:
+                    manifest.record(tile, entry._replace(checked=time.time()))
+                    return 'not_modified'
+                if status == 200:
+                    data = resp.content
+                    digest = tile_digest(data)
+                    if digest != known:
+                        self.store.put(z, x, y, data, digest)
+                    if manifest is not None:
+                        manifest.record(tile, ManifestEntry(resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                                                            len(data), digest, time.time()))
+                    return 'unchanged' if digest == known else 'ok'
+                if status in (204, 404):
+                    return 'missing'
+                if status not in RETRY_STATUS:
+                    logger.warning('HTTP %d for %s', status, url)
+                    return 'failed'
+                retry_after = resp.headers.get('Retry-After')
+            except requests.RequestException as e:
+                logger.debug('Request for %s failed: %s', url, e)
+            finally:
+                self.limiter.release(host)
+            if attempt == self.retries:
+                break
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if retry_after is not None:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            self._stop.wait(delay)
+        logger.warning('Giving up on %s after %d attempts', url, self.retries + 1)
+        return 'failed'
+
+    def run(self, tiles, progress=None, check_existing=True, refresh=False, max_age=None):
+        """Fetch every (z, x, y) in tiles that is not stored or journaled as missing yet.
+
+        With check_existing=False the store is not asked tile by tile; for
+        tile lists already diffed against a tile_planner.TileIndex.
+
+        With refresh=True every tile is revalidated (see fetch) except those
+        the manifest says were checked less than max_age seconds ago, so an
+        interrupted refresh can resume.
+
+        progress(stats) is called from this thread after each finished tile.
+        Returns a dict with counts of 'ok', 'missing', 'failed', 'skipped',
+        'unchanged' and 'not_modified'.
+        """
+        self._stop.clear()
+        journal = DownloadJournal(self.journal_path)
+        if self.manifest_path is not None:
+            self._manifest = TileManifest(self.manifest_path)
+        stats = {'ok': 0, 'missing': 0, 'failed': 0, 'skipped': 0, 'unchanged': 0, 'not_modified': 0}
+        cutoff = time.time() - max_age if refresh and max_age else None
+        pending = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tiles') as pool:
+                for tile in tiles:
+                    if self._stop.is_set():
+                        break
+                    tile = tuple(int(c) for c in tile)
+                    if refresh:
+                        entry = self._manifest.get(tile) if cutoff and self._manifest is not None else None
+                        skip = entry is not None and entry.checked >= cutoff
+                    else:
+                        # 'ok' journal entries are not trusted alone: the store may
+                        # not have committed them before an interruption
+                        skip = journal.done.get(tile) == 'missing' or (check_existing and self.store.has(*tile))
+                    if skip:
+                        stats['skipped'] += 1
+                        continue
+                    # bounded queue: tile lists can have millions of entries
+                    while len(pending) >= 4 * self.workers:
+                        self._collect(pending, journal, stats, progress)
+                    pending[pool.submit(self.fetch, *tile, refresh)] = tile
+                while pending:
+                    self._collect(pending, journal, stats, progress)
+        except BaseException:
+            # e.g. KeyboardInterrupt: drop queued tiles, let in-flight ones finish
+            self._stop.set()
+            for fut in pending:
+                fut.cancel()
+            raise
+        finally:
+            self.store.flush()
+            journal.close()
+            if self._manifest is not None:
+                # after the store flush: a manifest row never describes an unwritten tile
+                self._manifest.close()
+                self._manifest = None
+        return stats
+
+    def _collect(self, pending, journal, stats, progress):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            tile = pending.pop(fut)
+            try:
+                status = fut.result()
+            except Exception:
+                logger.exception('Downloading tile %s failed', tile)
+                status = 'failed'
+            stats[status] += 1
+            # failed tiles are left out of the journal so the next run retries them
+            if status != 'failed':
+                journal.record(tile, status)
+            if progress is not None:
+                progress(stats)
+        journal.flush()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Build lower zoom levels of a tile store by downsampling its deepest level.
+
+Each parent tile is composed from its 2x2 children and reduced by a 2x2
+box filter (in premultiplied alpha, so missing children fade out instead
+of darkening the edges). Levels are built from max_zoom - 1 up to
+min_zoom, each one from the level below it, with the image work spread
+over a process pool.
+
+A manifest next to the store remembers a digest of the children each
+parent was built from, so a rerun only rebuilds parents whose children
+changed (and, through them, their ancestors).
+
+Usage:
+  python tile_overviews.py assets/tiles --max-zoom 16 --min-zoom 10
+  python tile_overviews.py assets/tiles.mbtiles --max-zoom 16 --min-zoom 10
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from PySide6 import QtCore, QtGui
+
+from tile_store import MBTiles, open_store, write_atomic
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+# parents handed to a worker per task; amortizes pickling and process round trips
+TASK_PARENTS = 32
+
+
+def _decode(data):
+    """Tile bytes to a premultiplied RGBA uint8 array (TILE_SIZE, TILE_SIZE, 4), or None."""
+    img = QtGui.QImage.fromData(data)
+    if img.isNull():
+        return None
+    if img.width() != TILE_SIZE or img.height() != TILE_SIZE:
+        img = img.scaled(TILE_SIZE, TILE_SIZE)
+    img = img.convertToFormat(QtGui.QImage.Format.Format_RGBA8888_Premultiplied)
+    rows = np.frombuffer(img.constBits(), np.uint8).reshape(TILE_SIZE, img.bytesPerLine())
+    # copy: the view dies with img
+    return rows[:, :TILE_SIZE * 4].reshape(TILE_SIZE, TILE_SIZE, 4).copy()
+
+
+def _encode(pixels, fmt):
+    pixels = np.ascontiguousarray(pixels)
+    img = QtGui.QImage(pixels.data, TILE_SIZE, TILE_SIZE, TILE_SIZE * 4,
+                       QtGui.QImage.Format.Format_RGBA8888_Premultiplied)
+    buf = QtCore.QBuffer()
+    buf.open(QtCore.QIODevice.WriteOnly)
+    img.save(buf, fmt.upper())
+    return bytes(buf.data())
+
+
+def compose_parent(children, fmt='png'):
+    """Parent tile bytes from its children [top-left, top-right, bottom-left, bottom-right] (None if absent)."""
+    canvas = np.zeros((2 * TILE_SIZE, 2 * TILE_SIZE, 4), dtype=np.uint16)
+    any_child = False
+    for i, data in enumerate(children):
+        if data is None:
+            continue
+        pixels = _decode(data)
+        if pixels is None:
+            continue
+        r, c = divmod(i, 2)
+        canvas[r * TILE_SIZE:(r + 1) * TILE_SIZE, c * TILE_SIZE:(c + 1) * TILE_SIZE] = pixels
+        any_child = True
+    if not any_child:
+        return None
+    # 2x2 box filter with rounding
+    out = (canvas[0::2, 0::2] + canvas[0::2, 1::2] + canvas[1::2, 0::2] + canvas[1::2, 1::2] + 2) >> 2
+    return _encode(out.astype(np.uint8), fmt)
+
+
+def _compose_many(tasks, fmt):
+    # runs in a worker process
+    return [(parent, compose_parent(children, fmt)) for parent, children in tasks]
+
+
+def children_of(z, x, y):
+    return [(z + 1, 2 * x, 2 * y), (z + 1, 2 * x + 1, 2 * y),
+            (z + 1, 2 * x, 2 * y + 1), (z + 1, 2 * x + 1, 2 * y + 1)]
+
+
+def children_digest(children):
+    h = hashlib.blake2b(digest_size=16)
+    for data in children:
+        if data is None:
+            h.update(b'\0')
+        else:
+            h.update(len(data).to_bytes(8, 'little'))
+            h.update(data)
+    return h.hexdigest()
+
+
+def manifest_path(store):
+    if isinstance(store, MBTiles):
+        return Path(str(store.path) + '.overviews.json')
+    return Path(store.root) / '.overviews.json'
+
+
+def build_overviews(store, max_zoom, min_zoom, workers=None, fmt=None, progress=None):
+    """Rebuild zoom levels max_zoom - 1 .. min_zoom of store from max_zoom.
+
+    progress(zoom, done, total) is called as parents are processed.
+    Returns a dict with counts of 'built', 'unchanged' and 'empty' parents.
+    """
+    if fmt is None:
+        fmt = store.metadata().get('format') or getattr(store, 'ext', '.png').lstrip('.') or 'png'
+    manifest_file = manifest_path(store)
+    try:
+        manifest = json.loads(manifest_file.read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    stats = {'built': 0, 'unchanged': 0, 'empty': 0}
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for z in range(max_zoom - 1, min_zoom - 1, -1):
+            parents = sorted({(z, cx // 2, cy // 2) for _, cx, cy in store.tiles(zoom=z + 1)})
+            pending = set()
+            batch = []
+            done = 0
+
+            def collect():
+                nonlocal done
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    pending.discard(fut)
+                    for (pz, px, py), data in fut.result():
+                        if data is None:
+                            stats['empty'] += 1
+                        else:
+                            store.put(pz, px, py, data)
+                            stats['built'] += 1
+                        done += 1
+                if progress is not None:
+                    progress(z, done, len(parents))
+
+            for parent in parents:
+                children = [store.get(*c) for c in children_of(*parent)]
+                key = '/'.join(map(str, parent))
+                digest = children_digest(children)
+                if manifest.get(key) == digest and store.has(*parent):
+                    stats['unchanged'] += 1
+                    done += 1
+                    continue
+                manifest[key] = digest
+                batch.append((parent, children))
+                if len(batch) >= TASK_PARENTS:
+                    # bounded in flight: children bytes of queued tasks stay in memory
+                    while len(pending) >= 2 * workers:
+                        collect()
+                    pending.add(pool.submit(_compose_many, batch, fmt))
+                    batch = []
+            if batch:
+                pending.add(pool.submit(_compose_many, batch, fmt))
+            while pending:
+                collect()
+            # the next level reads this one back
+            store.flush()
+            write_atomic(manifest_file, json.dumps(manifest).encode('utf-8'))
+            logger.info('Zoom %d: %d parents', z, len(parents))
+    return stats
+
+
+def main():
+    p = argparse.ArgumentParser(description='Build lower zoom levels from the deepest level of a tile store.')
+    p.add_argument('store', help='tiles directory or .mbtiles file')
+    p.add_argument('--max-zoom', type=int, required=True, help='zoom level to build from')
+    p.add_argument('--min-zoom', type=int, required=True, help='lowest zoom level to build')
+    p.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    args = p.parse_args()
+
+    store = open_store(args.store, 'w')
+    try:
+        def report(z, done, total):
+            print(f'\rZoom {z}: {done}/{total}', end='', flush=True)
+        stats = build_overviews(store, args.max_zoom, args.min_zoom, workers=args.workers, progress=report)
+    finally:
+        store.close()
+    print(f'\nDone: {stats["built"]} built, {stats["unchanged"]} unchanged, {stats["empty"]} empty')
+
+
+if __name__ == '__main__':
+    main()
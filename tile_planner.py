@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Plan which XYZ tiles cover an area: GeoJSON polygons, buffered lines or a bbox.
+
+Coverage is exact per zoom: a tile is planned iff its square intersects the
+area. Tiles cut by the outline come from walking every edge across the tile
+grid; interior tiles from scanlines through tile-row centers. Both are
+computed with numpy and kept as runs (row, first column, last column), so
+large areas at deep zooms are never expanded tile by tile until fetched.
+
+Dry run over an area against an existing store:
+  python tile_planner.py area.geojson --min-zoom 12 --max-zoom 18 --store assets/tiles
+"""
+import argparse
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+MAX_LAT = 85.0511287798
+EARTH_RADIUS = 6378137.0
+# rows x edges elements per scanline batch; bounds the size of its temporaries
+SCAN_CELLS = 1 << 22
+
+
+def lonlat_to_tile(lon, lat, z):
+    """Fractional XYZ tile coordinates of lon/lat arrays at zoom z."""
+    n = float(1 << z)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT))
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n
+    return x, y
+
+
+def tile_to_lonlat(x, y, z):
+    """Lon/lat of fractional tile coordinates (tile corners for integer x, y)."""
+    n = float(1 << z)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    lon = x / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * y / n))))
+    return lon, lat
+
+
+def _merge_runs(runs, n):
+    """Union of (row, x0, x1) runs as sorted, non-overlapping, non-adjacent runs."""
+    if len(runs) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+    runs = np.asarray(runs, dtype=np.int64)
+    # put every row on its own stretch of one number line; the gap of 2
+    # keeps runs of different rows from ever touching
+    stride = n + 2
+    start = runs[:, 0] * stride + runs[:, 1]
+    end = runs[:, 0] * stride + runs[:, 2]
+    order = np.argsort(start, kind='stable')
+    start = start[order]
+    end = np.maximum.accumulate(end[order])
+    new = np.ones(len(start), dtype=bool)
+    new[1:] = start[1:] > end[:-1] + 1
+    first = np.flatnonzero(new)
+    last = np.append(first[1:] - 1, len(start) - 1)
+    rows = start[first] // stride
+    return np.column_stack([rows, start[first] - rows * stride, end[last] - rows * stride])
+
+
+def _edge_runs(x0, y0, x1, y1, n):
+    """Runs of the tiles every edge (x0, y0)-(x1, y1) passes through, in tile coordinates."""
+    out = []
+    for ax, ay, bx, by in zip(x0, y0, x1, y1):
+        # parameters where the edge crosses a grid line, plus its ends
+        ts = [np.array([0.0, 1.0])]
+        if bx != ax:
+            k = np.arange(math.ceil(min(ax, bx)), math.floor(max(ax, bx)) + 1)
+            ts.append((k - ax) / (bx - ax))
+        if by != ay:
+            k = np.arange(math.ceil(min(ay, by)), math.floor(max(ay, by)) + 1)
+            ts.append((k - ay) / (by - ay))
+        t = np.unique(np.clip(np.concatenate(ts), 0.0, 1.0))
+        # the tile of each piece between crossings is the one holding its midpoint
+        mid = (t[:-1] + t[1:]) / 2.0 if len(t) > 1 else t
+        tx = np.clip(np.floor(ax + mid * (bx - ax)), 0, n - 1).astype(np.int64)
+        ty = np.clip(np.floor(ay + mid * (by - ay)), 0, n - 1).astype(np.int64)
+        out.append(np.column_stack([ty, tx, tx]))
+    return np.concatenate(out) if out else np.empty((0, 3), dtype=np.int64)
+
+
+def _scanline_runs(x0, y0, x1, y1, n):
+    """Runs of the tiles whose row center line lies inside the polygon (even-odd rule)."""
+    ymin = max(0, int(math.floor(min(y0.min(), y1.min()))))
+    ymax = min(n - 1, int(math.floor(max(y0.max(), y1.max()))))
+    step = max(1, SCAN_CELLS // len(x0))
+    out = []
+    for row0 in range(ymin, ymax + 1, step):
+        yc = np.arange(row0, min(row0 + step, ymax + 1))[:, None] + 0.5
+        # half-open rule so a vertex on the scanline is counted once
+        crosses = (y0[None, :] <= yc) != (y1[None, :] <= yc)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xs = x0 + (yc - y0) * (x1 - x0) / (y1 - y0)
+        xs = np.where(crosses, xs, np.inf)
+        xs.sort(axis=1)
+        counts = crosses.sum(axis=1)
+        for pair in range(0, int(counts.max(initial=0)), 2):
+            has = counts > pair + 1
+            if not has.any():
+                break
+            rows = yc[has, 0].astype(np.int64)
+            a = np.clip(np.floor(xs[has, pair]), 0, n - 1).astype(np.int64)
+            b = np.clip(np.floor(xs[has, pair + 1]), 0, n - 1).astype(np.int64)
+            out.append(np.column_stack([rows, a, b]))
+    return np.concatenate(out) if out else np.empty((0, 3), dtype=np.int64)
+
+
+def polygon_runs(rings, z):
+    """Tile runs at zoom z of a polygon given as lon/lat rings (outer first, then holes)."""
+    n = 1 << z
+    edges = []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        if len(ring) < 3:
+            continue
+        x, y = lonlat_to_tile(ring[:, 0], ring[:, 1], z)
+        edges.append((x, y, np.roll(x, -1), np.roll(y, -1)))
+    if not edges:
+        return np.empty((0, 3), dtype=np.int64)
+    x0, y0, x1, y1 = (np.concatenate(c) for c in zip(*edges))
+    return _merge_runs(np.concatenate([_edge_runs(x0, y0, x1, y1, n), _scanline_runs(x0, y0, x1, y1, n)]), n)
+
+
+def buffer_line(coords, width_m, segments=8):
+    """Polygons (as ring lists) whose union is the line buffered by width_m / 2 on each side.
+
+    One quad per segment and a small polygon around every vertex for the
+    joins; meters are converted to degrees at each segment's latitude.
+    """
+    coords = np.asarray(coords, dtype=np.float64)[:, :2]
+    half = width_m / 2.0
+    m_per_deg = math.pi * EARTH_RADIUS / 180.0
+    polys = []
+    ang = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
+    for lon, lat in coords:
+        k = math.cos(math.radians(lat))
+        polys.append([np.column_stack([lon + half * np.cos(ang) / (m_per_deg * max(k, 1e-6)),
+                                       lat + half * np.sin(ang) / m_per_deg])])
+    for (lon0, lat0), (lon1, lat1) in zip(coords[:-1], coords[1:]):
+        k = max(math.cos(math.radians((lat0 + lat1) / 2.0)), 1e-6)
+        # work in local meters so the offset is perpendicular on the ground
+        dx = (lon1 - lon0) * m_per_deg * k
+        dy = (lat1 - lat0) * m_per_deg
+        length = math.hypot(dx, dy)
+        if length == 0:
+            continue
+        ox = -dy / length * half / (m_per_deg * k)
+        oy = dx / length * half / m_per_deg
+        polys.append([np.array([[lon0 + ox, lat0 + oy], [lon1 + ox, lat1 + oy],
+                                [lon1 - ox, lat1 - oy], [lon0 - ox, lat0 - oy]])])
+    return polys
+
+
+def bbox_polygon(lon_min, lat_min, lon_max, lat_max):
+    return [np.array([[lon_min, lat_min], [lon_max, lat_min], [lon_max, lat_max], [lon_min, lat_max]])]
+
+
+def load_geojson(path, buffer_m=100.0):
+    """Polygons (ring lists) of a GeoJSON file.
+
+    Lines are buffered by the feature's "buffer_m" property or buffer_m.
+    """
+    data = json.loads(Path(path).read_text(encoding='utf-8'))
+    if data.get('type') == 'FeatureCollection':
+        features = data['features']
+    elif data.get('type') == 'Feature':
+        features = [data]
+    else:
+        features = [{'type': 'Feature', 'geometry': data, 'properties': {}}]
+    polys = []
+
+    def add(geom, width):
+        kind = geom['type']
+        coords = geom.get('coordinates')
+        if kind == 'Polygon':
+            polys.append([np.asarray(r, dtype=np.float64)[:, :2] for r in coords])
+        elif kind == 'MultiPolygon':
+            for poly in coords:
+                polys.append([np.asarray(r, dtype=np.float64)[:, :2] for r in poly])
+        elif kind == 'LineString':
+            polys.extend(buffer_line(coords, width))
+        elif kind == 'MultiLineString':
+            for line in coords:
+                polys.extend(buffer_line(line, width))
+        elif kind == 'GeometryCollection':
+            for g in geom['geometries']:
+                add(g, width)
+        else:
+            raise ValueError(f'Unsupported geometry type {kind}')
+
+    for feature in features:
+        props = feature.get('properties') or {}
+        add(feature['geometry'], float(props.get('buffer_m', buffer_m)))
+    return polys
+
+
+def area_bounds(polys):
+    """lon_min, lat_min, lon_max, lat_max of polygons."""
+    pts = np.concatenate([ring for poly in polys for ring in poly])
+    return [float(pts[:, 0].min()), float(pts[:, 1].min()), float(pts[:, 0].max()), float(pts[:, 1].max())]
+
+
+class CoveragePlan:
+    """Tiles per zoom covering an area, as runs (row y, first x, last x).
+
+    Usage:
+        plan = CoveragePlan.from_polygons(load_geojson('area.geojson'), 12, 18)
+        plan = plan.minus(TileIndex.scan(store))
+        plan.counts()   # {zoom: tiles}
+        for z, x, y in plan.tiles(): ...
+    """
+
+    def __init__(self, runs):
+        self.runs = runs
+
+    @classmethod
+    def from_polygons(cls, polys, min_zoom, max_zoom):
+        runs = {}
+        for z in range(min_zoom, max_zoom + 1):
+            parts = [polygon_runs(poly, z) for poly in polys]
+            runs[z] = _merge_runs(np.concatenate(parts), 1 << z) if parts else np.empty((0, 3), np.int64)
+        return cls(runs)
+
+    def counts(self):
+        return {z: int((r[:, 2] - r[:, 1] + 1).sum()) for z, r in self.runs.items()}
+
+    def total(self):
+        return sum(self.counts().values())
+
+    def keys(self, z):
+        """int64 keys x * 2^z + y of the tiles at zoom z."""
+        r = self.runs[z]
+        lengths = r[:, 2] - r[:, 1] + 1
+        rows = np.repeat(r[:, 0], lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        xs = np.repeat(r[:, 1], lengths) + offsets
+        return xs * (1 << z) + rows
+
+    def minus(self, index):
+        """Plan of the tiles not present in a TileIndex."""
+        runs = {}
+        for z in self.runs:
+            keys = self.keys(z)
+            keys = keys[~np.isin(keys, index.keys(z))]
+            xs, ys = np.divmod(keys, 1 << z)
+            runs[z] = _merge_runs(np.column_stack([ys, xs, xs]), 1 << z)
+        return CoveragePlan(runs)
+
+    def tiles(self):
+        """(z, x, y) of every planned tile, zoom by zoom."""
+        for z, r in self.runs.items():
+            for y, x0, x1 in r.tolist():
+                for x in range(x0, x1 + 1):
+                    yield z, x, y
+
+
+class TileIndex:
+    """Set of the tiles already in a store, built from one scan or query."""
+
+    def __init__(self, keys_by_zoom):
+        self._keys = keys_by_zoom
+
+    @classmethod
+    def scan(cls, store):
+        by_zoom = {}
+        for z, x, y in store.tiles():
+            by_zoom.setdefault(z, []).append(x * (1 << z) + y)
+        return cls({z: np.unique(np.asarray(k, dtype=np.int64)) for z, k in by_zoom.items()})
+
+    def keys(self, z):
+        return self._keys.get(z, np.empty(0, dtype=np.int64))
+
+    def count(self, z=None):
+        if z is not None:
+            return len(self.keys(z))
+        return sum(len(k) for k in self._keys.values())
+
+
+def report(plan, todo, mean_bytes):
+    """Lines describing planned / present / to-fetch tiles and estimated bytes per zoom."""
+    lines = [f'{"zoom":>4} {"planned":>10} {"present":>10} {"to fetch":>10} {"est. MB":>10}']
+    planned = plan.counts()
+    missing = todo.counts()
+    for z in sorted(planned):
+        lines.append(f'{z:>4} {planned[z]:>10} {planned[z] - missing[z]:>10} {missing[z]:>10} '
+                     f'{missing[z] * mean_bytes / 1e6:>10.1f}')
+    total = todo.total()
+    lines.append(f'total: {plan.total()} planned, {total} to fetch, ~{total * mean_bytes / 1e6:.1f} MB '
+                 f'(at {mean_bytes / 1e3:.1f} KB per tile)')
+    return lines
+
+
+def main():
+    from tile_store import open_store
+
+    p = argparse.ArgumentParser(description='Count the tiles covering an area and those still missing.')
+    p.add_argument('area', help='GeoJSON file with polygons or lines')
+    p.add_argument('--min-zoom', type=int, required=True)
+    p.add_argument('--max-zoom', type=int, required=True)
+    p.add_argument('--buffer', type=float, default=100.0, help='corridor width for lines (m)')
+    p.add_argument('--store', type=str, default=None, help='existing tiles directory or .mbtiles file')
+    args = p.parse_args()
+
+    plan = CoveragePlan.from_polygons(load_geojson(args.area, args.buffer), args.min_zoom, args.max_zoom)
+    todo, mean_bytes = plan, 0
+    if args.store:
+        store = open_store(args.store)
+        todo = plan.minus(TileIndex.scan(store))
+        mean_bytes = store.mean_tile_bytes()
+        store.close()
+    print('\n'.join(report(plan, todo, mean_bytes or 15000)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""The tiles:// URL scheme the map page loads local tiles from (served by tile_server.py).
+
+Schemes must be registered before the QApplication is created. This module
+is separate from tile_server so that importing it does not load
+QtWebEngineCore; only register_scheme() does.
+"""
+SCHEME = b'tiles'
+HOST = 'local'
+
+_registered = False
+
+
+def register_scheme():
+    """Register the tiles:// scheme; must run before the QApplication is created."""
+    global _registered
+    from PySide6.QtWebEngineCore import QWebEngineUrlScheme
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme | QWebEngineUrlScheme.Flag.LocalAccessAllowed
+                    | QWebEngineUrlScheme.Flag.CorsEnabled | QWebEngineUrlScheme.Flag.FetchApiAllowed)
+    QWebEngineUrlScheme.registerScheme(scheme)
+    _registered = True
+
+
+def scheme_registered():
+    """Whether register_scheme() ran in this process (handlers need a registered scheme)."""
+    return _registered
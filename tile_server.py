@@ -0,0 +1,311 @@
+"""Serve map tiles to the web view from a local store through a custom URL scheme.
+
+The page requests tiles://local/{z}/{x}/{y}.png (and tiles://local/metadata.json);
+TileSchemeHandler answers from an in-memory LRU cache or looks the tile up
+in a tile_store store on a worker thread. TileService holds the cache, the
+lookup pool, prefetching and statistics.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import shiboken6
+from PySide6 import QtCore
+from PySide6.QtWebEngineCore import QWebEngineUrlRequestJob, QWebEngineUrlSchemeHandler
+
+import perf
+from tile_scheme import HOST, SCHEME, register_scheme  # noqa: F401 (re-exported)
+
+logger = logging.getLogger(__name__)
+
+MAX_LAT = 85.0511287798
+
+CONTENT_TYPES = {'png': b'image/png', 'jpg': b'image/jpeg', 'jpeg': b'image/jpeg', 'webp': b'image/webp',
+                 'pbf': b'application/x-protobuf', 'json': b'application/json'}
+
+
+class LruBytesCache:
+    """Thread-safe LRU cache of byte strings bounded by their total size."""
+
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self._items[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+
+def tiles_in_view(zoom, south, west, north, east, ring=1):
+    """(z, x, y) of the tiles covering a lat/lon box at zoom, grown by `ring` tiles on each side."""
+    z = int(zoom)
+    n = 1 << z
+
+    def tile(lat, lon):
+        lat = math.radians(max(-MAX_LAT, min(MAX_LAT, lat)))
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    x0, y0 = tile(north, west)
+    x1, y1 = tile(south, east)
+    x0, x1 = max(0, x0 - ring), min(n - 1, x1 + ring)
+    y0, y1 = max(0, y0 - ring), min(n - 1, y1 + ring)
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+class TileService:
+    """Cached, threaded tile lookups from a store (DirectoryStore or MBTiles).
+
+    Usage:
+        service = TileService(MBTiles('assets/tiles.mbtiles'))
+        data = service.cached(z, x, y)            # fast path, GUI thread
+        future = service.lookup_async(z, x, y)    # bytes or None
+        service.prefetch_view(zoom, south, west, north, east)
+        service.stats()
+    """
+
+    def __init__(self, store, cache_bytes=64 << 20, workers=4, placeholder=None, max_prefetch=256,
+                 missing_ttl=30.0, max_missing=100_000):
+        self.store = store
+        self.cache = LruBytesCache(cache_bytes)
+        self.placeholder = placeholder
+        self.max_prefetch = int(max_prefetch)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tile-lookup')
+        # separate pool so queued prefetches never delay tiles the page is waiting for
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='tile-prefetch')
+        # tiles the store does not have -> when that was found; remembered so repeats are
+        # answered immediately, but only for missing_ttl seconds (tiles downloaded or built
+        # later in the session show up then) and at most max_missing of them
+        self._missing = OrderedDict()
+        self.missing_ttl = float(missing_ttl)
+        self.max_missing = int(max_missing)
+        self._prefetching = set()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._counts = {'requests': 0, 'hits': 0, 'misses': 0, 'not_found': 0, 'prefetched': 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def cached(self, z, x, y):
+        """Tile bytes when they are in memory (or known missing: b''), else None."""
+        key = (z, x, y)
+        data = self.cache.get(key)
+        if data is not None:
+            self._count('requests')
+            self._count('hits')
+            return data
+        with self._lock:
+            if self._known_missing(key):
+                self._counts['requests'] += 1
+                self._counts['not_found'] += 1
+                return b''
+        return None
+
+    def _known_missing(self, key):
+        # call with self._lock held
+        found = self._missing.get(key)
+        if found is None:
+            return False
+        if time.monotonic() - found > self.missing_ttl:
+            del self._missing[key]
+            return False
+        return True
+
+    def _remember_missing(self, key):
+        with self._lock:
+            self._missing[key] = time.monotonic()
+            self._missing.move_to_end(key)
+            while len(self._missing) > self.max_missing:
+                self._missing.popitem(last=False)
+
+    def forget_missing(self):
+        """Drop the remembered missing tiles, e.g. after tiles were added to the store."""
+        with self._lock:
+            self._missing.clear()
+
+    def _load(self, key):
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        try:
+            with perf.span('tile.read'):
+                data = self.store.get(*key)
+        except Exception:
+            # may be transient: not remembered as missing, the next request reads again
+            logger.exception('Reading tile %s failed', key)
+            return None
+        if data is None:
+            self._remember_missing(key)
+            return None
+        self.cache.put(key, data)
+        return data
+
+    def lookup(self, z, x, y):
+        """Tile bytes from memory or the store; None if the store has no such tile."""
+        data = self.cached(z, x, y)
+        if data is None:
+            self._count('requests')
+            self._count('misses')
+            data = self._load((z, x, y))
+            if data is None:
+                self._count('not_found')
+        return data or None
+
+    def record_latency(self, seconds):
+        """Record the time a request took from arrival to reply."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def lookup_async(self, z, x, y):
+        """Future resolving to lookup(z, x, y) on the lookup pool."""
+        return self._pool.submit(self.lookup, z, x, y)
+
+    def prefetch(self, tiles):
+        """Load tiles into the cache in the background, skipping cached or pending ones."""
+        todo = []
+        with self._lock:
+            for key in tiles:
+                if self._known_missing(key) or key in self._prefetching:
+                    continue
+                todo.append(key)
+        todo = [key for key in todo if key not in self.cache][:self.max_prefetch]
+        with self._lock:
+            self._prefetching.update(todo)
+        for key in todo:
+            self._prefetch_pool.submit(self._prefetch_one, key)
+
+    def _prefetch_one(self, key):
+        try:
+            if self._load(key) is not None:
+                self._count('prefetched')
+        finally:
+            with self._lock:
+                self._prefetching.discard(key)
+
+    def prefetch_view(self, zoom, south, west, north, east, ring=1):
+        """Prefetch the ring of tiles around the visible box, then the zoom levels above and below."""
+        visible = set(tiles_in_view(zoom, south, west, north, east, ring=0))
+        around = [t for t in tiles_in_view(zoom, south, west, north, east, ring=ring) if t not in visible]
+        neighbours = []
+        for dz in (-1, 1):
+            if 0 <= zoom + dz <= 22:
+                neighbours += tiles_in_view(zoom + dz, south, west, north, east, ring=0)
+        self.prefetch(around + neighbours)
+
+    def metadata(self):
+        try:
+            return json.dumps(self.store.metadata()).encode('utf-8')
+        except Exception:
+            logger.exception('Reading tile metadata failed')
+            return b'{}'
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            lat = sorted(self._latencies)
+        served = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / served if served else 0.0
+        counts['mean_ms'] = 1e3 * sum(lat) / len(lat) if lat else 0.0
+        counts['p95_ms'] = 1e3 * lat[int(0.95 * (len(lat) - 1))] if lat else 0.0
+        counts['cached_tiles'] = len(self.cache)
+        counts['cached_bytes'] = self.cache.nbytes
+        return counts
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
+
+
+class TileSchemeHandler(QWebEngineUrlSchemeHandler):
+    """Answers tiles:// requests from a TileService.
+
+    Memory hits are answered directly; everything else is looked up on the
+    service's pool and replied to from the GUI thread. Missing tiles fail
+    with UrlNotFound right away unless the service has a placeholder.
+    """
+
+    # job, bytes or None, content type, start time; emitted from lookup threads
+    _lookupDone = QtCore.Signal(object, object, object, float)
+
+    def __init__(self, service, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self._lookupDone.connect(self._reply, QtCore.Qt.QueuedConnection)
+
+    def requestStarted(self, job):
+        start = time.perf_counter()
+        parts = job.requestUrl().path().strip('/').split('/')
+        if parts == ['metadata.json']:
+            self._reply(job, self.service.metadata(), CONTENT_TYPES['json'], start)
+            return
+        try:
+            z, x = int(parts[0]), int(parts[1])
+            y, _, ext = parts[2].partition('.')
+            y = int(y)
+        except (IndexError, ValueError):
+            job.fail(QWebEngineUrlRequestJob.Error.UrlInvalid)
+            return
+        ctype = CONTENT_TYPES.get(ext, b'application/octet-stream')
+        data = self.service.cached(z, x, y)
+        if data is not None:
+            # memory hit or known missing tile: no thread hop
+            self._reply(job, data or None, ctype, start)
+            return
+        future = self.service.lookup_async(z, x, y)
+        future.add_done_callback(
+            lambda f: f.cancelled() or self._lookupDone.emit(job, f.result(), ctype, start))
+
+    def _reply(self, job, data, ctype, start):
+        # the page may have cancelled the request (deleting the job) meanwhile
+        if not shiboken6.isValid(job):
+            return
+        elapsed = time.perf_counter() - start
+        self.service.record_latency(elapsed)
+        perf.record('tile.request', start, elapsed)
+        if data is None:
+            data = self.service.placeholder
+        if data is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        buf = QtCore.QBuffer(parent=job)
+        buf.setData(QtCore.QByteArray(data))
+        buf.open(QtCore.QIODevice.ReadOnly)
+        job.reply(ctype, buf)
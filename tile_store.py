@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""Tile storage: a {z}/{x}/{y}.png directory tree or a single MBTiles (SQLite) file.
+
+Both stores address tiles by XYZ z/x/y; MBTiles keeps rows in TMS order
+(flipped y) as the specification requires. metadata.json fields map to
+the MBTiles metadata table (see metadata_to_mbtiles).
+
+Identical tiles (blank or ocean tiles are common) are stored once: new
+MBTiles files use the deduplicating map/images layout behind a `tiles`
+view, and DirectoryStore hardlinks a tile to an earlier file with the same
+content digest written in the same session.
+
+Convert between the two layouts:
+  python tile_store.py to-mbtiles assets/tiles assets/tiles.mbtiles
+  python tile_store.py to-dir assets/tiles.mbtiles assets/tiles
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+FORMATS = {'.png': 'png', '.jpg': 'jpg', '.jpeg': 'jpg', '.webp': 'webp', '.pbf': 'pbf'}
+
+
+def tile_digest(data):
+    """Content hash of tile bytes (hex), used for deduplication and change detection."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def write_atomic(path, data):
+    """Write bytes to path through a temporary file in the same directory and a rename."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.' + path.name, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class DirectoryStore:
+    """Tiles as files output/{z}/{x}/{y}{ext}.
+
+    Tiles put with a digest are hardlinked to an earlier file of this
+    session with the same digest instead of being written again.
+    """
+
+    def __init__(self, root, ext='.png'):
+        self.root = Path(root)
+        self.ext = ext
+        # digest -> path of a file with that content, and the reverse
+        self._by_digest = {}
+        self._digest_of = {}
+        self._lock = threading.Lock()
+
+    def path(self, z, x, y):
+        return self.root / str(z) / str(x) / f'{y}{self.ext}'
+
+    def has(self, z, x, y):
+        return self.path(z, x, y).exists()
+
+    def get(self, z, x, y):
+        try:
+            return self.path(z, x, y).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, z, x, y, data, digest=None):
+        path = self.path(z, x, y)
+        with self._lock:
+            # the file is about to change: it can no longer stand for its old digest
+            old = self._digest_of.pop(path, None)
+            if old is not None and self._by_digest.get(old) == path:
+                del self._by_digest[old]
+            source = self._by_digest.get(digest) if digest else None
+        if source is None or not self._link(source, path, len(data)):
+            write_atomic(path, data)
+        if digest:
+            with self._lock:
+                self._by_digest.setdefault(digest, path)
+                self._digest_of[path] = digest
+
+    @staticmethod
+    def _link(source, path, size):
+        # hardlink through a temporary name so an existing tile is replaced atomically
+        try:
+            if source == path or source.stat().st_size != size:
+                return False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name('.' + path.name + '.link')
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            os.link(source, tmp)
+            os.replace(tmp, path)
+            return True
+        except OSError:
+            # no hardlinks on this filesystem, or the source went away
+            return False
+
+    def put_many(self, tiles):
+        for z, x, y, data in tiles:
+            self.put(z, x, y, data)
+
+    def tiles(self, zoom=None):
+        """(z, x, y) of every stored tile, or only those at one zoom level."""
+        if zoom is not None:
+            zdirs = [self.root / str(zoom)] if (self.root / str(zoom)).is_dir() else []
+        else:
+            zdirs = self.root.iterdir() if self.root.is_dir() else []
+        for zdir in zdirs:
+            if not zdir.name.isdigit():
+                continue
+            for xdir in zdir.iterdir():
+                if not xdir.name.isdigit():
+                    continue
+                for f in xdir.iterdir():
+                    if f.suffix == self.ext and f.stem.isdigit():
+                        yield int(zdir.name), int(xdir.name), int(f.stem)
+
+    def items(self):
+        """(z, x, y, data) of every stored tile."""
+        for z, x, y in self.tiles():
+            data = self.get(z, x, y)
+            if data is not None:
+                yield z, x, y, data
+
+    def mean_tile_bytes(self, sample=1000):
+        """Average size of stored tiles from a sample, 0 when empty."""
+        sizes = []
+        for z, x, y in self.tiles():
+            sizes.append(self.path(z, x, y).stat().st_size)
+            if len(sizes) >= sample:
+                break
+        return sum(sizes) / len(sizes) if sizes else 0
+
+    def metadata(self):
+        try:
+            return json.loads((self.root / 'metadata.json').read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return {}
+
+    def set_metadata(self, meta):
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / 'metadata.json').write_text(json.dumps(meta), encoding='utf-8')
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._by_digest.clear()
+            self._digest_of.clear()
+
+
+def metadata_to_mbtiles(meta, fmt='png'):
+    """metadata.json fields as MBTiles metadata (name, value) strings."""
+    out = {'name': meta.get('name', 'GeoReconViewer tiles'), 'format': meta.get('format', fmt),
+           'type': 'baselayer'}
+    if 'bbox' in meta:
+        out['bounds'] = ','.join(str(float(v)) for v in meta['bbox'])
+    if 'min_zoom' in meta:
+        out['minzoom'] = str(int(meta['min_zoom']))
+    if 'max_zoom' in meta:
+        out['maxzoom'] = str(int(meta['max_zoom']))
+    if 'center' in meta:
+        # metadata.json stores [lat, lon]; MBTiles wants lon,lat,zoom
+        lat, lon = meta['center'][:2]
+        zoom = meta.get('suggested_zoom', meta.get('max_zoom', 0))
+        out['center'] = f'{float(lon)},{float(lat)},{int(zoom)}'
+    return out
+
+
+def metadata_from_mbtiles(rows):
+    """Inverse of metadata_to_mbtiles."""
+    meta = {}
+    if 'bounds' in rows:
+        meta['bbox'] = [float(v) for v in rows['bounds'].split(',')]
+    if 'minzoom' in rows:
+        meta['min_zoom'] = int(rows['minzoom'])
+    if 'maxzoom' in rows:
+        meta['max_zoom'] = int(rows['maxzoom'])
+    if 'center' in rows:
+        parts = rows['center'].split(',')
+        meta['center'] = [float(parts[1]), float(parts[0])]
+        if len(parts) > 2:
+            meta['suggested_zoom'] = int(float(parts[2]))
+    for key in ('name', 'format'):
+        if key in rows:
+            meta[key] = rows[key]
+    return meta
+
+
+class MBTiles:
+    """Tiles in one SQLite file following the MBTiles 1.3 schema.
+
+    Writes are buffered and committed batch_size tiles per transaction. One
+    connection is shared between threads behind a lock, so downloader
+    workers can put tiles directly.
+
+    New files use the deduplicating layout (map rows pointing at images by
+    content digest, read through a `tiles` view); files with a plain
+    `tiles` table keep it.
+
+    Usage:
+        with MBTiles('tiles.mbtiles', 'w') as store:
+            store.put(z, x, y, png_bytes)
+        data = MBTiles('tiles.mbtiles').get(z, x, y)
+    """
+
+    def __init__(self, path, mode='r', batch_size=500):
+        self.path = Path(path)
+        self.batch_size = int(batch_size)
+        if mode == 'r':
+            if not self.path.exists():
+                raise FileNotFoundError(self.path)
+            self._db = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript('''
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+                CREATE UNIQUE INDEX IF NOT EXISTS metadata_name ON metadata (name);
+            ''')
+            if self._tiles_type() is None:
+                self._db.executescript('''
+                    CREATE TABLE map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);
+                    CREATE UNIQUE INDEX map_index ON map (zoom_level, tile_column, tile_row);
+                    CREATE INDEX map_tile_id ON map (tile_id);
+                    CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+                    CREATE VIEW tiles AS
+                        SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+                               map.tile_row AS tile_row, images.tile_data AS tile_data
+                        FROM map JOIN images ON images.tile_id = map.tile_id;
+                ''')
+        self.dedup = self._tiles_type() == 'view'
+        self._lock = threading.Lock()
+        # (z, x, y) -> (data, digest or None)
+        self._pending = {}
+        self._written = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _tiles_type(self):
+        row = self._db.execute("SELECT type FROM sqlite_master WHERE name = 'tiles'").fetchone()
+        return row and row[0]
+
+    @staticmethod
+    def _row(z, y):
+        # XYZ y counts from the top, TMS tile_row from the bottom
+        return (1 << z) - 1 - y
+
+    def has(self, z, x, y):
+        with self._lock:
+            if (z, x, y) in self._pending:
+                return True
+            cur = self._db.execute('SELECT 1 FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?',
+                                   (z, x, self._row(z, y)))
+            return cur.fetchone() is not None
+
+    def get(self, z, x, y):
+        """Tile bytes at XYZ z/x/y, or None."""
+        with self._lock:
+            pending = self._pending.get((z, x, y))
+            if pending is not None:
+                return pending[0]
+            cur = self._db.execute('SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?',
+                                   (z, x, self._row(z, y)))
+            row = cur.fetchone()
+        return None if row is None else bytes(row[0])
+
+    def put(self, z, x, y, data, digest=None):
+        with self._lock:
+            self._pending[(z, x, y)] = (bytes(data), digest)
+            if len(self._pending) >= self.batch_size:
+                self._commit()
+
+    def put_many(self, tiles):
+        for z, x, y, data in tiles:
+            self.put(z, x, y, data)
+
+    def _commit(self):
+        if not self._pending:
+            return
+        if not self.dedup:
+            rows = [(z, x, self._row(z, y), sqlite3.Binary(d)) for (z, x, y), (d, _) in self._pending.items()]
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) '
+                                     'VALUES (?, ?, ?, ?)', rows)
+            self._pending.clear()
+            return
+        images = {}
+        rows = []
+        for (z, x, y), (data, digest) in self._pending.items():
+            digest = digest or tile_digest(data)
+            images[digest] = data
+            rows.append((z, x, self._row(z, y), digest))
+        with self._db:
+            self._db.executemany('INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)',
+                                 [(k, sqlite3.Binary(d)) for k, d in images.items()])
+            self._db.executemany('INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) '
+                                 'VALUES (?, ?, ?, ?)', rows)
+        # replaced rows may have left their old images unreferenced; pruned on close
+        self._written = True
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def _select(self, columns, page, zoom=None):
+        # keyset pagination: no long-lived cursor on the shared connection
+        self.flush()
+        last = (-1, -1, -1)
+        where = '' if zoom is None else f'zoom_level = {int(zoom)} AND '
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f'SELECT zoom_level, tile_column, tile_row{columns} FROM tiles '
+                    f'WHERE {where}(zoom_level, tile_column, tile_row) > (?, ?, ?) '
+                    'ORDER BY zoom_level, tile_column, tile_row LIMIT ?', last + (page,)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = tuple(rows[-1][:3])
+
+    def tiles(self, zoom=None):
+        """(z, x, y) of every stored tile, or only those at one zoom level."""
+        for z, x, row in self._select('', 10000, zoom):
+            yield z, x, self._row(z, row)
+
+    def items(self):
+        """(z, x, y, data) of every stored tile."""
+        for z, x, row, data in self._select(', tile_data', 500):
+            yield z, x, self._row(z, row), bytes(data)
+
+    def mean_tile_bytes(self):
+        """Average size of stored tiles, 0 when empty."""
+        self.flush()
+        with self._lock:
+            size = self._db.execute('SELECT AVG(LENGTH(tile_data)) FROM tiles').fetchone()[0]
+        return size or 0
+
+    def metadata(self):
+        """The metadata table converted to metadata.json fields."""
+        with self._lock:
+            rows = dict(self._db.execute('SELECT name, value FROM metadata').fetchall())
+        return metadata_from_mbtiles(rows)
+
+    def set_metadata(self, meta, fmt='png'):
+        rows = metadata_to_mbtiles(meta, fmt)
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)', rows.items())
+
+    def close(self):
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._commit()
+                if self._written:
+                    with self._db:
+                        self._db.execute('DELETE FROM images WHERE tile_id NOT IN (SELECT tile_id FROM map)')
+            finally:
+                self._db.close()
+                self._db = None
+
+
+def open_store(path, mode='r', ext='.png'):
+    """MBTiles for *.mbtiles paths, DirectoryStore otherwise."""
+    if Path(path).suffix == '.mbtiles':
+        return MBTiles(path, mode)
+    return DirectoryStore(path, ext)
+
+
+def copy_tiles(src, dst, fmt='png'):
+    """Copy every tile and the metadata from one store to another; returns the tile count."""
+    n = 0
+    for z, x, y, data in src.items():
+        dst.put(z, x, y, data, tile_digest(data))
+        n += 1
+    meta = src.metadata()
+    if meta:
+        if isinstance(dst, MBTiles):
+            dst.set_metadata(meta, fmt)
+        else:
+            dst.set_metadata(meta)
+    dst.flush()
+    return n
+
+
+def main():
+    p = argparse.ArgumentParser(description='Convert tiles between a directory tree and MBTiles.')
+    sub = p.add_subparsers(dest='command', required=True)
+    a = sub.add_parser('to-mbtiles', help='directory tree -> MBTiles')
+    a.add_argument('src')
+    a.add_argument('dst')
+    a.add_argument('--ext', default='.png', help='tile file extension in the directory tree')
+    b = sub.add_parser('to-dir', help='MBTiles -> directory tree')
+    b.add_argument('src')
+    b.add_argument('dst')
+    b.add_argument('--ext', default=None, help='tile file extension (default: from the MBTiles format)')
+    args = p.parse_args()
+
+    if args.command == 'to-mbtiles':
+        src = DirectoryStore(args.src, args.ext)
+        with MBTiles(args.dst, 'w') as dst:
+            n = copy_tiles(src, dst, FORMATS.get(args.ext, args.ext.lstrip('.')))
+    else:
+        with MBTiles(args.src) as src:
+            ext = args.ext or '.' + src.metadata().get('format', 'png')
+            n = copy_tiles(src, DirectoryStore(args.dst, ext))
+    print(f'Copied {n} tiles from {args.src} to {args.dst}')
+
+
+if __name__ == '__main__':
+    main()
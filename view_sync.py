@@ -0,0 +1,143 @@
+"""Linked navigation between the 3D view and the web map.
+
+Map pans/zooms move the 3D camera over the same ground point with a
+matching ground width; camera moves recenter the map and update a view
+cone. Both directions are coalesced: the 3D view reports camera changes at
+most once per painted frame, the page at most once per animation frame,
+and each side applies only the latest pending update on a short timer.
+Updates caused by the other side are not echoed back.
+"""
+import math
+
+import numpy as np
+from PySide6 import QtCore
+
+# one update per ~60 Hz frame at most
+FRAME_MS = 16
+
+
+def _look(azimuth, elevation):
+    # unit vector from the camera towards the orbit center, scene axes (pyqtgraph's orbit camera)
+    az, el = math.radians(azimuth), math.radians(elevation)
+    return -np.array([math.cos(el) * math.cos(az), math.cos(el) * math.sin(az), math.sin(el)])
+
+
+def camera_to_map(georef, norm, camera):
+    """Map view for a 3D camera: dict with center [lat, lon], width_m, heading (deg) and cone [[lat, lon]] * 3.
+
+    norm is the viewer's (center, factor) with scene = (model - center) * factor.
+    """
+    center, factor = norm
+    linear = georef.local_to_enu[:3, :3]
+    metres = float(np.abs(np.linalg.det(linear))) ** (1.0 / 3.0)
+    half_fov = math.radians(camera['fov']) / 2.0
+    target = camera['center'] / factor + center
+    look = _look(camera['azimuth'], camera['elevation'])
+    eye = target - look * camera['distance'] / factor
+    # heading of the horizontal look direction, clockwise from north
+    east, north, _ = linear @ np.array([look[0], look[1], 0.0])
+    heading = math.degrees(math.atan2(east, north)) % 360.0
+    width = 2.0 * camera['distance'] * math.tan(half_fov) / factor
+    # cone: eye and two rays at heading -/+ half the field of view, reaching past the target
+    reach = max(np.hypot(*(target - eye)[:2]), width / 2.0) * 1.2
+    side = []
+    for a in (-half_fov, half_fov):
+        c, s = math.cos(a), math.sin(a)
+        d = np.array([c * look[0] - s * look[1], s * look[0] + c * look[1], 0.0])
+        n = np.linalg.norm(d)
+        if n == 0:
+            d = np.array([1.0, 0.0, 0.0])
+            n = 1.0
+        side.append(eye + d / n * reach)
+    lat, lon, _ = georef.local_to_wgs84(np.array([target, eye] + side))
+    return {'center': [float(lat[0]), float(lon[0])], 'width_m': width * metres, 'heading': heading,
+            'cone': [[float(a), float(b)] for a, b in zip(lat[1:], lon[1:])]}
+
+
+def map_to_camera(georef, norm, camera, lat, lon, width_m):
+    """Scene center and distance that put the camera over lat/lon with width_m metres in view.
+
+    The new center keeps the height of the current one.
+    """
+    center, factor = norm
+    metres = float(np.abs(np.linalg.det(georef.local_to_enu[:3, :3]))) ** (1.0 / 3.0)
+    current = camera['center'] / factor + center
+    _, _, alt = georef.local_to_wgs84(current.reshape(1, 3))
+    target = georef.wgs84_to_local(np.array([lat]), np.array([lon]), alt)[0]
+    scene = (target - center) * factor
+    scene[2] = camera['center'][2]
+    half_fov = math.radians(camera['fov']) / 2.0
+    distance = width_m / metres * factor / 2.0 / math.tan(half_fov)
+    return scene, distance
+
+
+class ViewSync(QtCore.QObject):
+    """Keeps a ModelViewer and the map (through a MapBridge) on the same place while linked.
+
+    Usage:
+        sync = ViewSync(viewer, bridge)
+        sync.set_georef(georef)   # None disables syncing
+        sync.set_linked(True)
+    """
+
+    def __init__(self, viewer, bridge, parent=None):
+        super().__init__(parent)
+        self.viewer = viewer
+        self.bridge = bridge
+        self.georef = None
+        self.linked = False
+        self._map_view = None
+        # camera state this object set itself; its cameraChanged is not sent back
+        self._applied = None
+        self._to_map = QtCore.QTimer(self, singleShot=True, interval=FRAME_MS)
+        self._to_map.timeout.connect(self._send_camera)
+        self._to_camera = QtCore.QTimer(self, singleShot=True, interval=FRAME_MS)
+        self._to_camera.timeout.connect(self._apply_map_view)
+        viewer.cameraChanged.connect(self._on_camera_changed)
+        bridge.mapMoved.connect(self._on_map_moved)
+
+    def set_georef(self, georef):
+        self.georef = georef
+
+    def set_linked(self, linked):
+        self.linked = bool(linked)
+        self.bridge.send_view_sync({'op': 'link', 'enabled': self.linked})
+        if self.linked:
+            self._on_camera_changed()
+
+    def _ready(self):
+        return self.linked and self.georef is not None and self.viewer.scene_normalization() is not None
+
+    def _on_camera_changed(self):
+        if self._ready() and not self._to_map.isActive():
+            self._to_map.start()
+
+    def _send_camera(self):
+        camera = self.viewer.camera()
+        if not self._ready() or camera is None:
+            return
+        if self._applied is not None and self._same(camera, self._applied):
+            return
+        self._applied = None
+        msg = camera_to_map(self.georef, self.viewer.scene_normalization(), camera)
+        msg['op'] = 'camera'
+        self.bridge.send_view_sync(msg)
+
+    def _on_map_moved(self, lat, lon, width_m):
+        self._map_view = (lat, lon, width_m)
+        if self._ready() and not self._to_camera.isActive():
+            self._to_camera.start()
+
+    def _apply_map_view(self):
+        camera = self.viewer.camera()
+        if not self._ready() or camera is None or self._map_view is None or self._map_view[2] <= 0:
+            return
+        center, distance = map_to_camera(self.georef, self.viewer.scene_normalization(), camera, *self._map_view)
+        self._map_view = None
+        self.viewer.set_camera(center=center, distance=distance)
+        self._applied = self.viewer.camera()
+
+    @staticmethod
+    def _same(a, b):
+        return (np.allclose(a['center'], b['center']) and math.isclose(a['distance'], b['distance'])
+                and a['azimuth'] == b['azimuth'] and a['elevation'] == b['elevation'])
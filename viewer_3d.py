@@ -1,4 +1,5 @@
 import sys
+import time
 from pathlib import Path
 
 try:
@@ -12,102 +13,381 @@ except Exception as e:
 from PySide6 import QtCore, QtWidgets
 import logging
 
+import perf
+from load_worker import PointSampleJob
+from spatial import cull_aabbs, frustum_planes, normalization, ray_from_pixel, split_into_chunks, transform_box
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
 # custom interactive GL view with right-button drag
 class InteractiveGLView(gl.GLViewWidget):
+    # emitted with (level, triangle count) when the displayed LOD level changes
+    lodLevelChanged = QtCore.Signal(int, int)
+    # left click without dragging, in widget pixels
+    clicked = QtCore.Signal(float, float)
+    # the camera moved; emitted at most once per painted frame
+    cameraChanged = QtCore.Signal()
+    # emitted with the new quality level, see quality_level
+    qualityChanged = QtCore.Signal(int)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._last_pos = None
+        self._press_pos = None
+        # per LOD level: (items, aabb mins, aabb maxs) in scene coordinates
+        self._levels = []
+        self._lod = None
+        self._lod_scale = 1.0
+        self._lod_radius = 0.0
+        self.active_lod_level = -1
+        self.culling = True
+        self.visible_chunks = 0
+        # right-drag pan accumulated between frames, applied in paintGL
+        self._pan_pending = [0.0, 0.0]
+        self._painted_camera = None
+        # adaptive interaction quality: while the camera is dragged or zoomed, frames drop
+        # edges (level 1) and then draw LOD levels quality_level - 1 coarser, until
+        # they fit in target_frame_ms; full quality returns idle_ms after the last event
+        self.adaptive_quality = True
+        self.target_frame_ms = 1000.0 / 30
+        self.idle_ms = 250
+        self.quality_level = 0
+        # paintGL time, smoothed over recent frames
+        self.frame_ms = 0.0
+        self._drag_level = 1
+        self._settle_frames = 0
+        self._edges_off = []
+        self._next_frame = 0.0
+        self._idle_timer = QtCore.QTimer(self, singleShot=True)
+        self._idle_timer.timeout.connect(self._end_interaction)
+        self._frame_timer = QtCore.QTimer(self, singleShot=True)
+        self._frame_timer.timeout.connect(self._deferred_update)
+
+    def set_chunk_levels(self, levels, lod=None, scale=1.0, radius=0.0):
+        """Register the scene's chunked geometry for per-frame LOD selection and culling.
+
+        levels holds one (items, mins, maxs) chunk set per LOD level; without a
+        lod only levels[0] is used. scale converts mesh units to scene units and
+        radius is the model's bounding sphere radius in scene units.
+        """
+        self._levels = [(list(items), np.asarray(mins, dtype=float).reshape(-1, 3),
+                         np.asarray(maxs, dtype=float).reshape(-1, 3)) for items, mins, maxs in levels]
+        self._lod = lod
+        self._lod_scale = float(scale)
+        self._lod_radius = float(radius)
+        self.active_lod_level = -1
+        present = {id(item) for items, _, _ in self._levels for item in items}
+        self._edges_off = [item for item in self._edges_off if id(item) in present]
+        self._update_visibility()
+
+    def set_lod(self, lod, levels, scale, radius):
+        self.set_chunk_levels(levels, lod=lod, scale=scale, radius=radius)
+
+    @property
+    def lod(self):
+        return self._lod
+
+    def clear_chunks(self):
+        self._levels = []
+        self._lod = None
+        self.active_lod_level = -1
+        self.visible_chunks = 0
+        self._edges_off = []
+
+    def pixel_world_size(self):
+        """Scene-space size of one screen pixel at the near side of the model."""
+        dist = float(self.opts.get('distance', 40))
+        fov = float(self.opts.get('fov', 60))
+        depth = max(dist - self._lod_radius, 0.1 * dist, 1e-6)
+        width = max(self.width(), 1)
+        # pyqtgraph's fov is horizontal
+        return 2.0 * depth * np.tan(np.deg2rad(fov) / 2.0) / width
+
+    def _update_visibility(self):
+        if not self._levels:
+            return
+        level = 0
+        if self._lod is not None:
+            level = self._lod.select(self.pixel_world_size() / self._lod_scale)
+            level = min(level + max(self.quality_level - 1, 0), len(self._levels) - 1)
+        if level != self.active_lod_level:
+            self.active_lod_level = level
+            if self._lod is not None:
+                self.lodLevelChanged.emit(level, self._lod.triangle_counts[level])
+
+        items, mins, maxs = self._levels[level]
+        if self.culling:
+            visible = cull_aabbs(frustum_planes(self.opts, self.width(), self.height()), mins, maxs)
+        else:
+            visible = np.ones(len(items), dtype=bool)
+        self.visible_chunks = int(visible.sum())
+        for i, (level_items, _, _) in enumerate(self._levels):
+            for j, item in enumerate(level_items):
+                want = i == level and bool(visible[j])
+                # setVisible schedules a repaint, so only touch items that change
+                if item.visible() != want:
+                    item.setVisible(want)
+        if self.quality_level:
+            for j in np.flatnonzero(visible):
+                item = items[j]
+                if item.opts.get('drawEdges'):
+                    item.opts['drawEdges'] = False
+                    self._edges_off.append(item)
+
+    def set_quality_level(self, level):
+        """0 draws full quality; 1 hides edges; 1 + k also draws the LOD level k steps coarser."""
+        level = max(0, min(int(level), self.max_quality_level()))
+        if level == self.quality_level:
+            return
+        self.quality_level = level
+        # the next frame is not representative (newly shown items are parsed on first paint)
+        self._settle_frames = 1
+        self.frame_ms = 0.0
+        if level == 0:
+            self._restore_edges()
+        self.qualityChanged.emit(level)
+
+    def set_adaptive_quality(self, on, target_frame_ms=None):
+        self.adaptive_quality = on
+        if target_frame_ms is not None:
+            self.target_frame_ms = float(target_frame_ms)
+        if not on and self.quality_level:
+            self._idle_timer.stop()
+            self._end_interaction()
+
+    def max_quality_level(self):
+        return len(self._levels) if self._lod is not None else 1
+
+    def _restore_edges(self):
+        for item in self._edges_off:
+            item.opts['drawEdges'] = True
+            if item.vertexes is not None and item.edges is None:
+                # first painted while edges were off: parse again to build the edge arrays
+                item.meshDataChanged()
+        self._edges_off = []
+
+    def _interaction_tick(self):
+        # called for each input event that moves the camera
+        if not self.adaptive_quality:
+            return
+        if self.quality_level == 0:
+            # start where the previous drag settled
+            self.set_quality_level(max(1, self._drag_level))
+        self._idle_timer.start(self.idle_ms)
+
+    def _end_interaction(self):
+        self._drag_level = self.quality_level
+        self._frame_timer.stop()
+        self.set_quality_level(0)
+        super().update()
+
+    def _frame_done(self, seconds):
+        """Adjust the quality level from the time paintGL took.
+
+        This is CPU time: pyqtgraph draws from client-side arrays, which the
+        driver copies during the draw calls, so it follows the geometry drawn.
+        """
+        if self._settle_frames:
+            self._settle_frames -= 1
+            return
+        ms = 1e3 * seconds
+        self.frame_ms = ms if self.frame_ms == 0.0 else 0.7 * self.frame_ms + 0.3 * ms
+        if self.quality_level == 0:
+            return
+        if self.frame_ms > self.target_frame_ms and self.quality_level < self.max_quality_level():
+            self.set_quality_level(self.quality_level + 1)
+        elif self.frame_ms < 0.5 * self.target_frame_ms and self.quality_level > 1:
+            self.set_quality_level(self.quality_level - 1)
+
+    def frame_interval(self):
+        """Seconds between display refreshes of the screen the view is on."""
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None else 60.0
+        return 1.0 / max(rate, 1.0)
+
+    def update(self, *args):
+        # while degraded, repaint at most once per display refresh: requests arriving
+        # sooner wait for the next slot (the camera changes they carry accumulate)
+        # (GLViewWidget.__init__ calls update before quality_level exists)
+        if args or not getattr(self, 'quality_level', 0):
+            return super().update(*args)
+        wait = self._next_frame - time.perf_counter()
+        if wait <= 0:
+            super().update()
+        elif not self._frame_timer.isActive():
+            self._frame_timer.start(max(1, int(np.ceil(wait * 1000))))
+
+    def _deferred_update(self):
+        super().update()
+
+    def camera_state(self):
+        """(center x, y, z, distance, azimuth, elevation, fov) of the orbit camera."""
+        c = self.opts.get('center', (0, 0, 0))
+        try:
+            center = (c.x(), c.y(), c.z())
+        except AttributeError:
+            center = tuple(c)
+        return tuple(float(v) for v in center) + tuple(
+            float(self.opts.get(k, d)) for k, d in (('distance', 40), ('azimuth', 0), ('elevation', 0), ('fov', 60)))
+
+    def paintGL(self, *args, **kwargs):
+        start = time.perf_counter()
+        self._next_frame = start + self.frame_interval()
+        with perf.span('frame'):
+            if self._pan_pending != [0.0, 0.0]:
+                dx, dy = self._pan_pending
+                self._pan_pending = [0.0, 0.0]
+                self._apply_pan(dx, dy)
+            with perf.span('frame.visibility'):
+                self._update_visibility()
+            super().paintGL(*args, **kwargs)
+        self._frame_done(time.perf_counter() - start)
+        state = self.camera_state()
+        if state != self._painted_camera:
+            self._painted_camera = state
+            self.cameraChanged.emit()
+
+    def visible_triangles(self):
+        """Triangles in the mesh items currently shown."""
+        n = 0
+        for item in self.items:
+            md = getattr(item, 'opts', {}).get('meshdata') if isinstance(item, gl.GLMeshItem) else None
+            if md is not None and item.visible():
+                n += md.faceCount()
+        return n
+
+    def ray_at(self, x, y):
+        """Scene-space ray (origin, unit direction) through widget pixel (x, y)."""
+        return ray_from_pixel(self.opts, self.width(), self.height(), x, y)
 
     def mousePressEvent(self, ev):
         # store last pos on right-button press
         if ev.buttons() == QtCore.Qt.RightButton:
             self._last_pos = ev.position() if hasattr(ev, 'position') else ev.pos()
+        if ev.button() == QtCore.Qt.LeftButton:
+            self._press_pos = ev.position() if hasattr(ev, 'position') else ev.pos()
         super().mousePressEvent(ev)
 
     def mouseMoveEvent(self, ev):
+        if ev.buttons() != QtCore.Qt.NoButton:
+            self._interaction_tick()
         if ev.buttons() == QtCore.Qt.RightButton and self._last_pos is not None:
             cur = ev.position() if hasattr(ev, 'position') else ev.pos()
-            dx = cur.x() - self._last_pos.x()
-            dy = cur.y() - self._last_pos.y()
-            # perform pan: map pixel delta to world translation using distance-based scale
+            # mouse events can outpace frames: accumulate and pan once in paintGL
+            self._pan_pending[0] += cur.x() - self._last_pos.x()
+            self._pan_pending[1] += cur.y() - self._last_pos.y()
+            self.update()
+            self._last_pos = cur
+        super().mouseMoveEvent(ev)
+
+    def _apply_pan(self, dx, dy):
+        # perform pan: map pixel delta to world translation using distance-based scale
+        try:
+            dist = float(self.opts.get('distance', 40))
+        except Exception:
+            dist = 40.0
+        # map pixel delta to world translation based on camera orientation
+        factor = dist * 0.002
+        move_x = -dx * factor
+        move_y = dy * factor
+        try:
+            # compute current center
+            c = self.opts.get('center', (0, 0, 0))
+            try:
+                center = np.array([c.x(), c.y(), c.z()], dtype=float)
+            except Exception:
+                center = np.array(tuple(c), dtype=float)
+
+            # camera angles (degrees -> radians)
+            az = np.deg2rad(self.opts.get('azimuth', 0.0))
+            el = np.deg2rad(self.opts.get('elevation', 0.0))
+
+            # approximate camera position in world coords (spherical around center)
+            camx = center[0] + dist * np.cos(el) * np.cos(az)
+            camy = center[1] + dist * np.cos(el) * np.sin(az)
+            camz = center[2] + dist * np.sin(el)
+            cam = np.array([camx, camy, camz], dtype=float)
+
+            # forward vector (from camera to center)
+            forward = center - cam
+            fnorm = np.linalg.norm(forward)
+            if fnorm == 0:
+                forward = np.array([0, 0, 1], dtype=float)
+            else:
+                forward = forward / fnorm
+
+            world_up = np.array([0.0, 0.0, 1.0], dtype=float)
+            right = np.cross(forward, world_up)
+            rnorm = np.linalg.norm(right)
+            if rnorm == 0:
+                right = np.array([1.0, 0.0, 0.0], dtype=float)
+            else:
+                right = right / rnorm
+
+            up_cam = np.cross(right, forward)
+            unorm = np.linalg.norm(up_cam)
+            if unorm == 0:
+                up_cam = np.array([0.0, 0.0, 1.0], dtype=float)
+            else:
+                up_cam = up_cam / unorm
+
+            translation = right * move_x + up_cam * move_y
+
+            new_center = center + translation
             try:
-                dist = float(self.opts.get('distance', 40))
+                self.opts['center'] = pg.Vector(new_center[0], new_center[1], new_center[2])
             except Exception:
-                dist = 40.0
-            # map pixel delta to world translation based on camera orientation
-            factor = dist * 0.002
-            move_x = -dx * factor
-            move_y = dy * factor
+                self.opts['center'] = tuple(new_center.tolist())
+        except Exception:
+            # fallback to simple pan
             try:
-                # compute current center
-                c = self.opts.get('center', (0, 0, 0))
-                try:
-                    center = np.array([c.x(), c.y(), c.z()], dtype=float)
-                except Exception:
-                    center = np.array(tuple(c), dtype=float)
-
-                # camera angles (degrees -> radians)
-                az = np.deg2rad(self.opts.get('azimuth', 0.0))
-                el = np.deg2rad(self.opts.get('elevation', 0.0))
-
-                # approximate camera position in world coords (spherical around center)
-                camx = center[0] + dist * np.cos(el) * np.cos(az)
-                camy = center[1] + dist * np.cos(el) * np.sin(az)
-                camz = center[2] + dist * np.sin(el)
-                cam = np.array([camx, camy, camz], dtype=float)
-
-                # forward vector (from camera to center)
-                forward = center - cam
-                fnorm = np.linalg.norm(forward)
-                if fnorm == 0:
-                    forward = np.array([0, 0, 1], dtype=float)
-                else:
-                    forward = forward / fnorm
-
-                world_up = np.array([0.0, 0.0, 1.0], dtype=float)
-                right = np.cross(forward, world_up)
-                rnorm = np.linalg.norm(right)
-                if rnorm == 0:
-                    right = np.array([1.0, 0.0, 0.0], dtype=float)
-                else:
-                    right = right / rnorm
-
-                up_cam = np.cross(right, forward)
-                unorm = np.linalg.norm(up_cam)
-                if unorm == 0:
-                    up_cam = np.array([0.0, 0.0, 1.0], dtype=float)
-                else:
-                    up_cam = up_cam / unorm
-
-                translation = right * move_x + up_cam * move_y
-
-                new_center = center + translation
-                try:
-                    self.opts['center'] = pg.Vector(new_center[0], new_center[1], new_center[2])
-                except Exception:
-                    self.opts['center'] = tuple(new_center.tolist())
-                # trigger redraw
-                try:
-                    self.update()
-                except Exception:
-                    pass
+                self.pan(move_x, move_y, 0)
             except Exception:
-                # fallback to simple pan
-                try:
-                    self.pan(move_x, move_y, 0)
-                except Exception:
-                    pass
-            self._last_pos = cur
-        super().mouseMoveEvent(ev)
+                pass
+
+    def wheelEvent(self, ev):
+        self._interaction_tick()
+        super().wheelEvent(ev)
 
     def mouseReleaseEvent(self, ev):
         if ev.button() == QtCore.Qt.RightButton:
             self._last_pos = None
+        if ev.button() == QtCore.Qt.LeftButton and self._press_pos is not None:
+            pos = ev.position() if hasattr(ev, 'position') else ev.pos()
+            # a click, not the end of an orbit drag
+            if abs(pos.x() - self._press_pos.x()) + abs(pos.y() - self._press_pos.y()) <= 3:
+                self.clicked.emit(float(pos.x()), float(pos.y()))
+            self._press_pos = None
         super().mouseReleaseEvent(ev)
 
+class TimedMeshItem(gl.GLMeshItem):
+    """GLMeshItem whose first paint (vertex array preparation and upload) is timed as 'gl.upload'."""
+
+    def meshDataChanged(self):
+        self._uploaded = False
+        super().meshDataChanged()
+
+    def paint(self):
+        if self._uploaded or not perf.enabled():
+            self._uploaded = True
+            return super().paint()
+        self._uploaded = True
+        md = self.opts.get('meshdata')
+        with perf.span('gl.upload', faces=md.faceCount() if md is not None else 0):
+            return super().paint()
+
+
 class ModelViewer(QtWidgets.QWidget):
+    lodLevelChanged = QtCore.Signal(int, int)
+    # (triangle index, hit point in model coordinates)
+    picked = QtCore.Signal(int, object)
+    # the 3D camera moved (at most once per frame)
+    cameraChanged = QtCore.Signal()
+    # meshes above this size are split into frustum-culled chunks
+    chunk_triangles = 65536
+    # points drawn for a point cloud overview, and again for the zoomed-in detail
+    point_budget = 1_000_000
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle('3D Model Viewer - Minimal')
@@ -117,6 +397,9 @@ class ModelViewer(QtWidgets.QWidget):
             try:
                 self.glw = InteractiveGLView()
                 self.glw.opts['distance'] = 40
+                self.glw.lodLevelChanged.connect(self.lodLevelChanged)
+                self.glw.clicked.connect(self._pick)
+                self.glw.cameraChanged.connect(self.cameraChanged)
                 # visible container
                 container = QtWidgets.QFrame()
                 container.setFrameShape(QtWidgets.QFrame.Box)
@@ -145,47 +428,536 @@ class ModelViewer(QtWidgets.QWidget):
             layout.addWidget(QtWidgets.QLabel('pyqtgraph/OpenGL not available - 3D disabled'))
             self.glw = None
 
-    def set_mesh(self, vertices, faces):
+        # picking: BVH over the full-resolution mesh and its model->scene normalization
+        self._bvh = None
+        self._norm = None
+        self._pick_marker = None
+        # (min, max) of the model in its own coordinates
+        self._bounds = None
+
+        # performance overlay, see set_perf_overlay
+        self._perf_label = None
+        self._perf_timer = QtCore.QTimer(self)
+        self._perf_timer.setInterval(500)
+        self._perf_timer.timeout.connect(self._update_perf_overlay)
+
+        # progressive (streamed) mesh state, see begin_stream
+        self._stream_items = []
+        self._stream_bounds = []
+        self._stream_buf = None
+        self._stream_count = 0
+        self._stream_origin = None
+        self._stream_min = None
+        self._stream_max = None
+
+        # multi-model scene, see begin_scene: key -> (items, mins, maxs)
+        self._scene_models = {}
+
+        # point cloud, see set_point_cloud; detail is re-sampled when the camera zooms in
+        self._cloud = None
+        self._cloud_item = None
+        self._detail_item = None
+        self._detail_box = None
+        self._detail_job = None
+        self._detail_timer = QtCore.QTimer(self, singleShot=True, interval=250)
+        self._detail_timer.timeout.connect(self._refine_points)
+        if self.glw is not None:
+            self.glw.cameraChanged.connect(self._on_camera_for_points)
+
+    def _clear_items(self):
+        if self.glw is not None:
+            self.glw.clear_chunks()
+        try:
+            for item in list(self.glw.items):
+                try:
+                    self.glw.removeItem(item)
+                except Exception:
+                    pass
+        except Exception:
+            pass
+        self._stream_items = []
+        self._stream_bounds = []
+        self._scene_models = {}
+        self._cloud = None
+        self._cloud_item = None
+        self._detail_item = None
+        self._detail_box = None
+        if self._detail_job is not None:
+            self._detail_job.cancel()
+            self._detail_job = None
+        self._bvh = None
+        self._norm = None
+        self._pick_marker = None
+        self._bounds = None
+
+    def set_mesh(self, vertices, faces, bounds=None):
         """Set mesh directly from arrays/lists of vertices and faces.
         vertices: Nx3 array-like, faces: Mx3 array-like (0-based indices)
+        bounds: optional known (min, max) of the vertices (e.g. from a model bundle)
         """
         if not HAS_3D or self.glw is None:
             raise RuntimeError('3D view not available')
-        v = np.array(vertices)
-        f = np.array(faces)
+        v = np.asarray(vertices)
+        f = np.asarray(faces)
         if v.size == 0 or f.size == 0:
             raise ValueError('Empty vertices or faces')
 
-        # center and normalize similar to load_obj
-        minv = v.min(axis=0)
-        maxv = v.max(axis=0)
-        center = (minv + maxv) / 2.0
-        scale = (maxv - minv).max()
-        if scale == 0:
-            scale = 1.0
-        v2 = (v - center) / scale * 10.0
+        # center and normalize similar to load_obj, as an item transform (no vertex copy)
+        with perf.span('mesh.normalize', vertices=len(v)):
+            vmin, vmax = bounds if bounds is not None else (v.min(axis=0), v.max(axis=0))
+            center, factor = normalization(vmin, vmax)
 
         # remove previous items
+        self._clear_items()
+        self._norm = (center, factor)
+        self._bounds = (vmin, vmax)
+
+        self.glw.set_chunk_levels([self._add_chunked_mesh(v, f, center, factor)])
         try:
-            for item in list(self.glw.items):
-                try:
-                    self.glw.removeItem(item)
-                except Exception:
-                    pass
+            self.glw.opts['center'] = pg.Vector(0,0,0)
+            self.glw.setCameraPosition(distance=40)
+        except Exception:
+            try:
+                self.glw.setCameraPosition(distance=40)
+            except Exception:
+                pass
+
+    def set_lod(self, lod, bounds=None):
+        """Show a LodPyramid; the view picks the level from the camera every frame.
+
+        Level 0 is the full-resolution mesh, so this replaces set_mesh's item.
+        bounds: optional known (min, max) of level 0.
+        """
+        if not HAS_3D or self.glw is None:
+            raise RuntimeError('3D view not available')
+        if bounds is not None:
+            minv, maxv = bounds
+        else:
+            v0 = np.asarray(lod.levels[0][0])
+            minv = v0.min(axis=0)
+            maxv = v0.max(axis=0)
+        center, factor = normalization(minv, maxv)
+        bvh = self._bvh
+        self._clear_items()
+        # the pyramid's level 0 is the mesh the BVH was built for
+        self._bvh = bvh
+        self._norm = (center, factor)
+        self._bounds = (minv, maxv)
+        levels = []
+        for v, f in lod.levels:
+            levels.append(self._add_chunked_mesh(np.asarray(v), np.asarray(f), center, factor, visible=False))
+        radius = np.linalg.norm(maxv - minv) / 2.0 * factor
+        self.glw.set_lod(lod, levels, factor, radius)
+
+    @perf.timed('mesh.build')
+    def _add_chunked_mesh(self, vertices, faces, center, factor, visible=True):
+        """Add a mesh as spatial chunks (one GL item each); returns (items, mins, maxs).
+
+        Vertices are handed to MeshData as they are and the normalization
+        (v - center) * factor becomes the item transform. Only coordinates far
+        from the origin relative to the model size are re-centered first, to
+        keep float32 precision on the GPU.
+        """
+        recenter = np.abs(center).max() * factor > 1000.0
+        items, mins, maxs = [], [], []
+        for v, f, lo, hi in split_into_chunks(vertices, faces, self.chunk_triangles):
+            offset = np.zeros(3)
+            if recenter:
+                offset = center
+                v = (v - center).astype(np.float32)
+            with perf.span('mesh.meshdata', faces=len(f)):
+                meshdata = gl.MeshData(vertexes=v, faces=f)
+            with perf.span('mesh.item'):
+                item = TimedMeshItem(meshdata=meshdata, smooth=False, drawFaces=True, drawEdges=True, edgeColor=(0,0,0,1))
+                item.translate(*(offset - center))
+                item.scale(factor, factor, factor)
+                item.setVisible(visible)
+                self.glw.addItem(item)
+            items.append(item)
+            mins.append((lo - center) * factor)
+            maxs.append((hi - center) * factor)
+        return items, mins, maxs
+
+    def set_bvh(self, bvh):
+        """Enable picking on the current model with a TriangleBVH over its full-resolution mesh."""
+        self._bvh = bvh
+
+    def pick(self, x, y):
+        """Intersect the ray through widget pixel (x, y) with the model.
+
+        Returns (triangle index, point in model coordinates) or None.
+        """
+        if self._bvh is None or self._norm is None or self.glw is None:
+            return None
+        origin, direction = self.glw.ray_at(x, y)
+        center, factor = self._norm
+        # scene = (model - center) * factor; the scale is uniform so the direction is unchanged
+        hit = self._bvh.intersect(origin / factor + center, direction)
+        if hit is None:
+            return None
+        triangle, _, point = hit
+        return triangle, point
+
+    def _pick(self, x, y):
+        hit = self.pick(x, y)
+        if hit is None:
+            return
+        triangle, point = hit
+        center, factor = self._norm
+        scene = ((point - center) * factor).reshape(1, 3)
+        try:
+            if self._pick_marker is None:
+                self._pick_marker = gl.GLScatterPlotItem(pos=scene, size=12, color=(1.0, 0.8, 0.0, 1.0))
+                self._pick_marker.setGLOptions('additive')
+                self.glw.addItem(self._pick_marker)
+            else:
+                self._pick_marker.setData(pos=scene)
+        except Exception:
+            pass
+        self.picked.emit(triangle, point)
+
+    def model_bounds(self):
+        """(min, max) corners of the current model in its own coordinates, or None."""
+        return self._bounds
+
+    def scene_normalization(self):
+        """(center, factor) with scene = (model - center) * factor for the current model, or None."""
+        return self._norm
+
+    def camera(self):
+        """Orbit camera as a dict (center in scene coordinates, distance, azimuth, elevation, fov), or None."""
+        if self.glw is None:
+            return None
+        x, y, z, distance, azimuth, elevation, fov = self.glw.camera_state()
+        return {'center': np.array([x, y, z]), 'distance': distance, 'azimuth': azimuth,
+                'elevation': elevation, 'fov': fov}
+
+    def set_camera(self, center=None, distance=None):
+        """Move the orbit center (scene coordinates) and/or the camera distance."""
+        if self.glw is None:
+            return
+        if center is not None:
+            self.glw.opts['center'] = pg.Vector(*(float(c) for c in center))
+        if distance is not None:
+            self.glw.opts['distance'] = float(distance)
+        self.glw.update()
+
+    def lod_triangle_budgets(self):
+        """Triangle count of every LOD level of the current model ([] without LOD)."""
+        if self.glw is None or self.glw.lod is None:
+            return []
+        return self.glw.lod.triangle_counts
+
+    def active_lod_level(self):
+        return -1 if self.glw is None else self.glw.active_lod_level
+
+    def set_adaptive_quality(self, on, target_frame_ms=None):
+        """Draw cheaper frames while the camera is dragged (see InteractiveGLView.quality_level).
+
+        target_frame_ms is the frame time the degradation aims for.
+        """
+        if self.glw is not None:
+            self.glw.set_adaptive_quality(on, target_frame_ms)
+
+    def set_perf_overlay(self, on):
+        """Show FPS, frame time percentiles, triangle count and memory over the 3D view.
+
+        Turning the overlay on also turns on perf instrumentation, which stays
+        on afterwards so a trace can still be exported.
+        """
+        if self.glw is None:
+            return
+        if not on:
+            self._perf_timer.stop()
+            if self._perf_label is not None:
+                self._perf_label.hide()
+            return
+        perf.enable()
+        if self._perf_label is None:
+            self._perf_label = QtWidgets.QLabel(self.glw)
+            self._perf_label.setStyleSheet(
+                'background: rgba(0, 0, 0, 160); color: white; font-family: monospace; padding: 4px;')
+            self._perf_label.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+            self._perf_label.move(8, 8)
+        self._update_perf_overlay()
+        self._perf_label.show()
+        self._perf_label.raise_()
+        self._perf_timer.start()
+
+    def _update_perf_overlay(self):
+        frames = perf.frame_stats()
+        triangles = self.glw.visible_triangles()
+        rss = perf.rss_bytes()
+        perf.gauge('viewer.triangles', triangles)
+        lines = [f'{frames["fps"]:.1f} fps',
+                 f'frame p50 {frames["p50_ms"]:.1f}  p95 {frames["p95_ms"]:.1f}  p99 {frames["p99_ms"]:.1f} ms',
+                 f'{triangles:,} triangles ({self.glw.visible_chunks} chunks)']
+        if self.glw.quality_level:
+            lines.append(f'interaction quality {self.glw.quality_level}, '
+                         f'frame {self.glw.frame_ms:.1f} / {self.glw.target_frame_ms:.1f} ms')
+        if rss is not None:
+            perf.gauge('process.rss_mb', rss / 2 ** 20)
+            lines.append(f'{rss / 2 ** 20:.0f} MB resident')
+        self._perf_label.setText('\n'.join(lines))
+        self._perf_label.adjustSize()
+
+    def begin_stream(self):
+        """Start a progressive mesh: clear the scene and accept chunks through append_chunk.
+
+        Chunks are shown as soon as they arrive. Instead of rewriting vertices,
+        normalization is a transform on the chunk items, recomputed from the
+        bounding box of everything received so far.
+        """
+        if not HAS_3D or self.glw is None:
+            raise RuntimeError('3D view not available')
+        self._clear_items()
+        self._stream_buf = np.empty((0, 3), dtype=np.float32)
+        self._stream_count = 0
+        self._stream_origin = None
+        self._stream_min = None
+        self._stream_max = None
+        try:
+            self.glw.opts['center'] = pg.Vector(0,0,0)
+            self.glw.setCameraPosition(distance=40)
         except Exception:
             pass
 
-        meshdata = gl.MeshData(vertexes=v2, faces=f)
-        mesh_item = gl.GLMeshItem(meshdata=meshdata, smooth=False, drawFaces=True, drawEdges=True, edgeColor=(0,0,0,1))
-        self.glw.addItem(mesh_item)
+    def append_chunk(self, vertices, faces):
+        """Add a chunk of a streamed mesh. Face indices are global across chunks."""
+        if self._stream_buf is None:
+            self.begin_stream()
+        v = np.asarray(vertices)
+        f = np.asarray(faces)
+        if len(v):
+            n = self._stream_count + len(v)
+            if n > len(self._stream_buf):
+                grown = np.empty((max(n, 2 * len(self._stream_buf)), 3), dtype=np.float32)
+                grown[:self._stream_count] = self._stream_buf[:self._stream_count]
+                self._stream_buf = grown
+            self._stream_buf[self._stream_count:n] = v
+            self._stream_count = n
+            if self._stream_origin is None:
+                # chunk vertices are stored relative to this point to keep float32 precision
+                self._stream_origin = (v.min(axis=0) + v.max(axis=0)) / 2.0
+            vmin = v.min(axis=0)
+            vmax = v.max(axis=0)
+            self._stream_min = vmin if self._stream_min is None else np.minimum(self._stream_min, vmin)
+            self._stream_max = vmax if self._stream_max is None else np.maximum(self._stream_max, vmax)
+
+        if len(f):
+            f = f.reshape(-1, 3)
+            bad = (f >= self._stream_count).any(axis=1) | (f < 0).any(axis=1)
+            if bad.any():
+                logging.warning('Dropping %d faces referencing undefined vertices', int(bad.sum()))
+                f = f[~bad]
+        if len(f):
+            # compact the chunk to the vertices it references
+            used, inv = np.unique(f, return_inverse=True)
+            local = self._stream_buf[used]
+            local -= self._stream_origin
+            with perf.span('mesh.meshdata', faces=len(f)):
+                meshdata = gl.MeshData(vertexes=local, faces=inv.astype(np.uint32).reshape(-1, 3))
+            with perf.span('mesh.item'):
+                item = TimedMeshItem(meshdata=meshdata, smooth=False, drawFaces=True, drawEdges=True, edgeColor=(0,0,0,1))
+                self.glw.addItem(item)
+            self._stream_items.append(item)
+            self._stream_bounds.append((local.min(axis=0), local.max(axis=0)))
+
+        if self._stream_min is not None:
+            self._apply_stream_transform()
+
+    def end_stream(self):
+        """Finish a streamed mesh and release the accumulated vertex buffer."""
+        if self._stream_min is not None:
+            self._apply_stream_transform()
+        self._stream_buf = None
+        self._stream_count = 0
+
+    def _apply_stream_transform(self):
+        # same normalization as set_mesh: center the bbox and fit it in a 10-unit cube
+        center, s = normalization(self._stream_min, self._stream_max)
+        self._norm = (center, s)
+        self._bounds = (self._stream_min, self._stream_max)
+        offset = self._stream_origin - center
+        for item in self._stream_items:
+            item.resetTransform()
+            item.translate(*offset)
+            item.scale(s, s, s)
+        if self._stream_bounds:
+            lo = np.array([b[0] for b in self._stream_bounds])
+            hi = np.array([b[1] for b in self._stream_bounds])
+            self.glw.set_chunk_levels([(self._stream_items, (lo + offset) * s, (hi + offset) * s)])
+
+    def begin_scene(self, minv, maxv):
+        """Start a multi-model scene spanning [minv, maxv] (frame coordinates); see scene_manager.py.
+
+        Models are then added and removed by key, each with its own
+        local -> frame matrix, and normalized to the scene as a whole.
+        """
+        if not HAS_3D or self.glw is None:
+            raise RuntimeError('3D view not available')
+        self._clear_items()
+        minv = np.asarray(minv, dtype=np.float64)
+        maxv = np.asarray(maxv, dtype=np.float64)
+        self._norm = normalization(minv, maxv)
+        self._bounds = (minv, maxv)
+        self._update_scene_levels()
         try:
             self.glw.opts['center'] = pg.Vector(0,0,0)
             self.glw.setCameraPosition(distance=40)
         except Exception:
+            pass
+
+    @perf.timed('mesh.build')
+    def add_scene_model(self, key, vertices, faces, matrix=None):
+        """Show a model of the scene; matrix (4x4) maps its coordinates to the scene frame."""
+        if self._norm is None:
+            raise RuntimeError('begin_scene first')
+        self.remove_scene_model(key)
+        center, factor = self._norm
+        to_scene = np.diag([factor, factor, factor, 1.0])
+        to_scene[:3, 3] = -center * factor
+        if matrix is not None:
+            to_scene = to_scene @ np.asarray(matrix, dtype=np.float64)
+        items, mins, maxs = [], [], []
+        for v, f, lo, hi in split_into_chunks(np.asarray(vertices), np.asarray(faces), self.chunk_triangles):
+            # every chunk around its own center, so float32 keeps georeferenced precision
+            mid = (np.asarray(lo, dtype=np.float64) + hi) / 2.0
+            shift = np.eye(4)
+            shift[:3, 3] = mid
+            with perf.span('mesh.meshdata', faces=len(f)):
+                meshdata = gl.MeshData(vertexes=(v - mid).astype(np.float32), faces=f)
+            with perf.span('mesh.item'):
+                item = TimedMeshItem(meshdata=meshdata, smooth=False, drawFaces=True, drawEdges=True, edgeColor=(0,0,0,1))
+                item.setTransform(pg.Transform3D(*(to_scene @ shift).ravel()))
+                item.setVisible(False)
+                self.glw.addItem(item)
+            box = transform_box(to_scene, lo, hi)
+            items.append(item)
+            mins.append(box[0])
+            maxs.append(box[1])
+        self._scene_models[key] = (items, mins, maxs)
+        self._update_scene_levels()
+
+    def remove_scene_model(self, key):
+        """Remove a model added with add_scene_model (no-op if it is not shown)."""
+        entry = self._scene_models.pop(key, None)
+        if entry is None:
+            return
+        for item in entry[0]:
             try:
-                self.glw.setCameraPosition(distance=40)
+                self.glw.removeItem(item)
             except Exception:
                 pass
+        self._update_scene_levels()
+
+    def scene_model_keys(self):
+        return list(self._scene_models)
+
+    def _update_scene_levels(self):
+        items, mins, maxs = [], [], []
+        for model_items, model_mins, model_maxs in self._scene_models.values():
+            items += model_items
+            mins += model_mins
+            maxs += model_maxs
+        self.glw.set_chunk_levels([(items, mins, maxs)])
+
+    def set_point_cloud(self, cloud, points, colors=None):
+        """Show a ply_loader.PointCloud from an overview sample (cloud.sample() of point_budget points).
+
+        The sample's bounds set the normalization. When the camera zooms in on
+        part of the cloud, up to point_budget more points are sampled from the
+        box around the orbit center in the background and drawn over the
+        overview.
+        """
+        if not HAS_3D or self.glw is None:
+            raise RuntimeError('3D view not available')
+        points = np.asarray(points)
+        if len(points) == 0:
+            raise ValueError('Empty point cloud')
+        with perf.span('points.normalize', points=len(points)):
+            vmin = points.min(axis=0)
+            vmax = points.max(axis=0)
+            center, factor = normalization(vmin, vmax)
+        self._clear_items()
+        self._norm = (center, factor)
+        self._bounds = (vmin, vmax)
+        self._cloud = cloud
+        self._cloud_item = self._add_points(points, colors)
+        try:
+            self.glw.opts['center'] = pg.Vector(0,0,0)
+            self.glw.setCameraPosition(distance=40)
+        except Exception:
+            pass
+
+    def _add_points(self, points, colors):
+        center, factor = self._norm
+        if colors is None:
+            color = (0.85, 0.85, 0.85, 1.0)
+        else:
+            color = np.empty((len(colors), 4), dtype=np.float32)
+            color[:, :3] = np.asarray(colors, dtype=np.float32) / 255.0
+            color[:, 3] = 1.0
+        with perf.span('points.item', points=len(points)):
+            # positions relative to the center keep float32 precision; the scale is an item transform
+            item = gl.GLScatterPlotItem(pos=(points - center).astype(np.float32), color=color, size=2, pxMode=True)
+            item.scale(factor, factor, factor)
+            self.glw.addItem(item)
+        return item
+
+    def point_cloud_counts(self):
+        """(overview points, detail points) currently drawn; (0, 0) without a point cloud."""
+        def count(item):
+            return 0 if item is None or item.pos is None else len(item.pos)
+        return count(self._cloud_item), count(self._detail_item)
+
+    def _on_camera_for_points(self):
+        if self._cloud is not None:
+            self._detail_timer.start()
+
+    def _refine_points(self):
+        if self._cloud is None:
+            return
+        camera = self.camera()
+        center, factor = self._norm
+        lo, hi = self._bounds
+        focus = camera['center'] / factor + center
+        half = camera['distance'] * np.tan(np.deg2rad(camera['fov']) / 2.0) / factor
+        if 2.0 * half >= 0.5 * float((hi - lo).max()):
+            # the overview is dense enough at this distance
+            if self._detail_job is not None:
+                self._detail_job.cancel()
+                self._detail_job = None
+            if self._detail_item is not None:
+                self.glw.removeItem(self._detail_item)
+                self._detail_item = None
+                self._detail_box = None
+            return
+        if self._detail_box is not None:
+            box_lo, box_hi = self._detail_box
+            # the current detail still covers the view and is not much coarser than it could be
+            if (focus - half >= box_lo).all() and (focus + half <= box_hi).all() and \
+                    2.0 * half >= 0.25 * float((box_hi - box_lo).max()):
+                return
+        if self._detail_job is not None:
+            self._detail_job.cancel()
+        # a margin around the view so small pans do not trigger another scan
+        box = (focus - 2.0 * half, focus + 2.0 * half)
+        job = PointSampleJob(self._cloud, self.point_budget, *box)
+        job.signals.finished.connect(self._on_points_refined)
+        self._detail_job = job
+        QtCore.QThreadPool.globalInstance().start(job)
+
+    def _on_points_refined(self, points, colors):
+        if self._detail_job is None or self.sender() is not self._detail_job.signals:
+            return
+        job, self._detail_job = self._detail_job, None
+        self._detail_box = (job.lo, job.hi)
+        if self._detail_item is not None:
+            self.glw.removeItem(self._detail_item)
+            self._detail_item = None
+        if len(points):
+            self._detail_item = self._add_points(points, colors)
 
 
 if __name__ == '__main__':